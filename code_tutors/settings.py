@@ -10,13 +10,24 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from django.contrib.messages import constants as messages
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def optional_float(name, default):
+    """Return an environment variable as a number, or None if it is set to 'off', 'none' or nothing."""
+    value = os.environ.get(name, default)
+    if isinstance(value, str) and value.strip().lower() in ('', 'off', 'none'):
+        return None
+    return float(value)
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -43,11 +54,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tutorials.middleware.TracingMiddleware',
+    'tutorials.middleware.AccessLogMiddleware',
+    'tutorials.middleware.MetricsMiddleware',
+    'tutorials.middleware.SlowQueryMiddleware',
+    'tutorials.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tutorials.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +73,7 @@ ROOT_URLCONF = 'code_tutors.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'tutorials.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,14 +92,224 @@ WSGI_APPLICATION = 'code_tutors.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Set CODE_TUTORS_DB_PROFILE to choose how SQLite connections are opened:
+# 'production' puts the database in WAL mode, so reads carry on while a write
+# commits, applies the SQLITE_PRAGMAS to every new connection and begins
+# transactions IMMEDIATE, so a writer waits up to SQLITE_BUSY_TIMEOUT ms for
+# the lock instead of failing with "database is locked" when it upgrades from
+# reading; 'default' uses SQLite's own settings. `python manage.py
+# sqlite_benchmark` compares their read and write throughput. Connections are
+# kept for CODE_TUTORS_DB_CONN_MAX_AGE seconds (0 closes them after each
+# request), by default 60 with the production profile and 0 with the other,
+# and PRAGMA optimize is run every SQLITE_OPTIMIZE_INTERVAL seconds.
+
+SQLITE_BUSY_TIMEOUT = 5000
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    'journal_mode': 'WAL',
+    # Safe from corruption in WAL mode; only the last commits can be lost on power failure
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative sizes are in KiB, so 64 MiB of page cache per connection
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_PROFILES = {
+    'default': {},
+    'production': {
+        'init_command': '; '.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+    },
+}
+
+DATABASE_PROFILE = os.environ.get('CODE_TUTORS_DB_PROFILE', 'production')
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': DATABASE_PROFILES[DATABASE_PROFILE],
+        'CONN_MAX_AGE': int(os.environ.get('CODE_TUTORS_DB_CONN_MAX_AGE', 60 if DATABASE_PROFILE == 'production' else 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+SQLITE_OPTIMIZE_INTERVAL = 3600
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory is private to each process. Set CODE_TUTORS_CACHE to 'file' or
+# 'database' to share one cache between all worker processes; the database
+# cache needs its table, made by `python manage.py createcachetable`.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'code-tutors',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CODE_TUTORS_CACHE_DIR', Path(tempfile.gettempdir()) / 'code_tutors_cache'),
+    },
+    'database': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'code_tutors_cache',
+    },
+}
+
+CACHE_BACKEND = os.environ.get('CODE_TUTORS_CACHE', 'locmem')
+# Whether every worker process sees the same cache, and so each other's deletions
+CACHE_SHARED = CACHE_BACKEND != 'locmem'
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': 300,
+    },
+}
+
+# Each process keeps up to CACHE_LOCAL_MAX_ENTRIES cached reads in memory in
+# front of the cache above, for at most CACHE_LOCAL_TTL seconds. Processes see
+# each other's invalidations through the mtime of the CACHE_VERSION_STAMP file.
+CACHE_LOCAL_MAX_ENTRIES = 1000
+CACHE_LOCAL_TTL = 5
+CACHE_VERSION_STAMP = os.environ.get(
+    'CODE_TUTORS_CACHE_STAMP', Path(tempfile.gettempdir()) / 'code_tutors_cache.stamp'
+)
+
+# Signed-in users are loaded from the cache when it is shared (a worker would
+# otherwise keep a user another worker saved, such as with a new password); a
+# role change made without saving the user (such as a bulk update) is seen
+# within CACHE_USER_TTL seconds
+CACHE_USER_TTL = 60
+
+
+# Sessions
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+# Set CODE_TUTORS_SESSIONS to choose where sessions are kept:
+# 'cached_db' reads them from the cache and writes through to the database,
+# so it needs a shared cache (see CODE_TUTORS_CACHE): with local memory, a
+# worker would go on reading a session another worker has since changed or
+# ended. It is the default with a shared cache, and 'db' otherwise.
+# 'signed_cookies' keeps them in the browser, so any node can serve any
+# request with no session storage at all; 'db' always uses the database.
+# Expired database sessions are removed by `python manage.py purge_sessions`.
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSIONS = os.environ.get('CODE_TUTORS_SESSIONS', 'db' if CACHE_BACKEND == 'locmem' else 'cached_db')
+if SESSIONS == 'cached_db' and CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured("'cached_db' sessions need a shared cache; set CODE_TUTORS_CACHE to 'file' or 'database'")
+
+SESSION_ENGINE = SESSION_ENGINES[SESSIONS]
+
+
+# SQL instrumentation
+# Every response carries a Server-Timing header with its query count and
+# database time, also logged on the tutorials.sql logger. With SQL_STRICT (as
+# in the tests), a request that runs the same query more than
+# SQL_REPEATED_QUERY_LIMIT times fails, exposing N+1 query patterns.
+
+SQL_STRICT = False
+SQL_REPEATED_QUERY_LIMIT = 10
+
+# Slow query log
+# Statements taking at least SLOW_QUERY_THRESHOLD_MS (None, or 'off' in
+# CODE_TUTORS_SLOW_QUERY_MS, turns the log off)
+# are appended to SLOW_QUERY_LOG with redacted parameters, the view that ran
+# them and their query plan. Past SLOW_QUERY_LOG_MAX_BYTES the file is moved
+# aside, keeping one older file; `python manage.py slow_queries` summarises both.
+
+SLOW_QUERY_THRESHOLD_MS = optional_float('CODE_TUTORS_SLOW_QUERY_MS', 100)
+SLOW_QUERY_LOG = os.environ.get('CODE_TUTORS_SLOW_QUERY_LOG', Path(tempfile.gettempdir()) / 'code_tutors_slow_queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+# Request profiling
+# Admins profile a request by adding ?profile=cprofile or ?profile=sample, and
+# PROFILE_SAMPLE_RATE of all requests are profiled with the stack sampler.
+# The newest PROFILE_MAX_STORED profiles are kept in PROFILE_DIR and listed at
+# /profiles/.
+
+PROFILE_DIR = os.environ.get('CODE_TUTORS_PROFILE_DIR', Path(tempfile.gettempdir()) / 'code_tutors_profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('CODE_TUTORS_PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_INTERVAL = 0.002
+PROFILE_MAX_STORED = 200
+
+# Metrics
+# Request latency and status, SQL, cached reads and template render times are
+# served at /metrics in the Prometheus text format, to admins or to scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>". Each worker process writes
+# its counts to its own file in METRICS_DIR every METRICS_FLUSH_INTERVAL
+# seconds, and /metrics adds the files up, so all the workers must share it.
+
+METRICS_DIR = os.environ.get('CODE_TUTORS_METRICS_DIR', Path(tempfile.gettempdir()) / 'code_tutors_metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('CODE_TUTORS_METRICS_TOKEN')
+
+# Tracing
+# Traces time the middleware, the view, each SQL query and each template
+# rendered. TRACE_SAMPLE_RATE of requests are traced from the start and, while
+# TRACE_SLOW_MS is set (None, or 'off' in CODE_TUTORS_TRACE_SLOW_MS, turns it
+# off), every other request is recorded too but kept only if it took at least
+# that long; recording adds under 2% to a request, as the TRACING_BENCHMARK
+# test checks. Kept traces are written
+# through the tutorials.traces logger to TRACE_FILE, one OTLP/JSON
+# ExportTraceServiceRequest per line, as the OpenTelemetry Collector's
+# otlpjsonfile receiver reads them.
+
+TRACE_SAMPLE_RATE = float(os.environ.get('CODE_TUTORS_TRACE_SAMPLE_RATE', 0.01))
+TRACE_SLOW_MS = optional_float('CODE_TUTORS_TRACE_SLOW_MS', 500)
+TRACE_FILE = os.environ.get('CODE_TUTORS_TRACE_FILE', Path(tempfile.gettempdir()) / 'code_tutors_traces.jsonl')
+
+# Logging
+# The tutorials loggers write JSON lines, each with the id, user, role and view
+# of the request being served, to stderr and to LOG_FILE. Lines are written by
+# a listener thread, so requests never wait on the disk. Every worker appends
+# to LOG_FILE and TRACE_FILE and none rotates them: rotate them with logrotate
+# (or by moving them aside), and each worker reopens them. tutorials.access
+# logs every request and tutorials.audit every message shown to a user.
+
+LOG_FILE = os.environ.get('CODE_TUTORS_LOG_FILE', Path(tempfile.gettempdir()) / 'code_tutors.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'structured': {
+            'class': 'tutorials.structured_logging.QueueFileHandler',
+            'filename': LOG_FILE,
+            'console': True,
+        },
+        'traces': {
+            'class': 'tutorials.structured_logging.QueueFileHandler',
+            'filename': TRACE_FILE,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'tutorials': {
+            'handlers': ['structured'],
+            'level': os.environ.get('CODE_TUTORS_LOG_LEVEL', 'INFO'),
+        },
+        'tutorials.traces': {
+            'handlers': ['traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,6 +351,9 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Tests run against a dummy cache so cached reads never leak between tests
+TEST_RUNNER = 'code_tutors.test_runner.TestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -132,6 +362,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # User model for authentication and login purposes
 AUTH_USER_MODEL = 'tutorials.User'
 
+# ModelBackend stays listed so the sessions it signed in remain valid
+AUTHENTICATION_BACKENDS = [
+    'tutorials.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Login URL for redirecting users from login protected views
 LOGIN_URL = 'log_in'
 
@@ -139,6 +375,9 @@ LOGIN_URL = 'log_in'
 REDIRECT_URL_WHEN_LOGGED_IN = 'dashboard'
 
 # Convert Django ERROR messages to Bootstrap DANGER messages
+# Every message shown to a user is also written to the audit log
+MESSAGE_STORAGE = 'tutorials.structured_logging.AuditedMessageStorage'
+
 MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
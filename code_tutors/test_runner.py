@@ -0,0 +1,61 @@
+"""Test runner for the code_tutors project."""
+import logging.config
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with caching and tracing disabled and repeated queries treated as errors.
+
+    Tests of cached reads opt back in with ``override_settings(CACHES=...)``,
+    and tests of tracing with ``override_settings(TRACE_SAMPLE_RATE=1)``.
+    The app's logs, such as the per-request SQL and access logs, are silenced,
+    also when Django is set up again as the load test server starts; tests of
+    them use ``assertLogs``. Request profiles, the slow query log, the metrics
+    files and the log and trace files are kept in a temporary directory.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._temp_dir = tempfile.mkdtemp(prefix='code_tutors_tests')
+        quiet_logging = {
+            **settings.LOGGING,
+            'handlers': {
+                'structured': {
+                    **settings.LOGGING['handlers']['structured'],
+                    'filename': os.path.join(self._temp_dir, 'code_tutors.log'),
+                    'console': False,
+                },
+                'traces': {
+                    **settings.LOGGING['handlers']['traces'],
+                    'filename': os.path.join(self._temp_dir, 'traces.jsonl'),
+                },
+            },
+            'loggers': {
+                **settings.LOGGING['loggers'],
+                'tutorials': {**settings.LOGGING['loggers']['tutorials'], 'level': 'WARNING'},
+            },
+        }
+        self._test_settings = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            CACHE_LOCAL_MAX_ENTRIES=0,
+            CACHE_VERSION_STAMP=None,
+            SQL_STRICT=True,
+            LOGGING=quiet_logging,
+            PROFILE_DIR=os.path.join(self._temp_dir, 'profiles'),
+            SLOW_QUERY_LOG=os.path.join(self._temp_dir, 'slow_queries.jsonl'),
+            METRICS_DIR=os.path.join(self._temp_dir, 'metrics'),
+            TRACE_SAMPLE_RATE=0,
+            TRACE_SLOW_MS=None,
+        )
+        self._test_settings.enable()
+        logging.config.dictConfig(quiet_logging)
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -44,7 +44,11 @@ urlpatterns = [
 
     path('lesson-request/<int:id>/', views.LessonRequestDetails, name='lesson_request_details'),
     path('update-request/<int:request_id>/<str:action>/', views.update_request_status, name='update_request_status'),
+    path('auto-assign/', views.auto_assign_requests, name='auto_assign_requests'),
     path('manage_lessons/', views.ManageLessons.as_view(), name='manage_lessons'),
+    path('profiles/', views.RequestProfiles.as_view(), name='request_profiles'),
+    path('profiles/<str:profile_id>/', views.RequestProfile.as_view(), name='request_profile'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     #Student views
     path('offered_skill_list/', views.SkillListView.as_view(), name = 'offered_skill_list'),
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class TutorialsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tutorials'
+
+    def ready(self):
+        from tutorials.signals import (
+            connect_status_counters, connect_invoice_repricing, connect_candidate_index, connect_cache_invalidation,
+            connect_query_cache, connect_query_tracing, connect_sqlite_upkeep, connect_profile_pruning,
+        )
+        connect_status_counters()
+        connect_invoice_repricing()
+        connect_candidate_index()
+        connect_cache_invalidation()
+        connect_query_cache()
+        connect_query_tracing()
+        connect_sqlite_upkeep()
+        connect_profile_pruning()
@@ -0,0 +1,151 @@
+"""Bulk assignment of waiting lesson requests to tutors."""
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from tutorials import caching
+from tutorials.models import UserType, StudentRequest, Enrollment, Invoice, TutorCandidate
+
+# Most ongoing enrollments a tutor may hold after an assignment run
+DEFAULT_CAPACITY = 10
+
+OBJECTIVES = ('price', 'load')
+
+# Enrollment defaults, as used when an admin assigns a tutor by hand
+ENROLLMENT_WEEKS = 12
+START_DELAY = timedelta(days=2)
+
+Assignment = namedtuple('Assignment', ['request', 'tutor_id', 'price_per_hour', 'amount'])
+
+
+def waiting_requests():
+    """Return the pending lesson requests that have no tutor yet, oldest first."""
+    return StudentRequest.objects.filter(
+        status='pending',
+        enrollments__isnull=True,
+    ).select_related('student', 'skill').order_by('created_at', 'pk')
+
+
+def plan_assignments(requests=None, capacity=DEFAULT_CAPACITY, objective='price'):
+    """Match lesson requests to tutors who offer the skill, without writing anything.
+
+    A tutor is never given more than ``capacity`` ongoing enrollments. With
+    the ``price`` objective each request goes to the cheapest tutor with room
+    left; with ``load`` it goes to the least busy one, so lessons are spread
+    evenly. Requests for the skills with the fewest tutors are placed first,
+    so tutors of rare skills are not used up by common ones.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}, expected one of {', '.join(OBJECTIVES)}.")
+    requests = list(waiting_requests() if requests is None else requests)
+
+    candidates = defaultdict(list)
+    loads = {}
+    rows = TutorCandidate.objects.filter(
+        skill_id__in={request.skill_id for request in requests},
+        tutor__user_type=UserType.TUTOR,
+        tutor__is_active=True,
+    ).values_list('skill_id', 'tutor_id', 'price_per_hour', 'ongoing_enrollments')
+    for skill_id, tutor_id, price_per_hour, ongoing in rows:
+        candidates[skill_id].append((tutor_id, price_per_hour))
+        loads[tutor_id] = ongoing
+
+    if objective == 'price':
+        rank = lambda candidate: (candidate[1], loads[candidate[0]], candidate[0])
+    else:
+        rank = lambda candidate: (loads[candidate[0]], candidate[1], candidate[0])
+
+    assignments = []
+    unassigned = []
+    for request in sorted(requests, key=lambda request: len(candidates[request.skill_id])):
+        available = [candidate for candidate in candidates[request.skill_id] if loads[candidate[0]] < capacity]
+        if not available:
+            unassigned.append(request)
+            continue
+        tutor_id, price_per_hour = min(available, key=rank)
+        loads[tutor_id] += 1
+        amount = Invoice.calculate_price(ENROLLMENT_WEEKS, request.frequency, request.duration, price_per_hour)
+        assignments.append(Assignment(request, tutor_id, price_per_hour, amount))
+
+    assigned_tutors = {assignment.tutor_id for assignment in assignments}
+    return AssignmentPlan(
+        assignments, unassigned, {tutor_id: loads[tutor_id] for tutor_id in assigned_tutors}, capacity,
+    )
+
+
+class AssignmentPlan:
+    """The outcome of plan_assignments(), which can be reported or applied."""
+
+    def __init__(self, assignments, unassigned, tutor_loads, capacity=DEFAULT_CAPACITY):
+        self.assignments = assignments
+        self.unassigned = unassigned
+        self.tutor_loads = tutor_loads
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.assignments)
+
+    @property
+    def total_cost(self):
+        """Return the sum of the invoice amounts the plan would create."""
+        return sum((assignment.amount for assignment in self.assignments), Decimal('0.00'))
+
+    @property
+    def load_spread(self):
+        """Return the difference between the busiest and the least busy assigned tutor."""
+        if not self.tutor_loads:
+            return 0
+        return max(self.tutor_loads.values()) - min(self.tutor_loads.values())
+
+    def apply(self):
+        """Create the planned enrollments and their invoices, and approve the requests, in one transaction.
+
+        Requests that were given a tutor or decided since the plan was made
+        are skipped, as are assignments that would now take a tutor over the
+        capacity. Returns the created enrollments.
+        """
+        now = timezone.now()
+        start_time = now + START_DELAY
+        with transaction.atomic():
+            still_waiting = set(waiting_requests().filter(
+                pk__in=[assignment.request.pk for assignment in self.assignments],
+            ).values_list('pk', flat=True))
+            loads = TutorCandidate.ongoing_counts({assignment.tutor_id for assignment in self.assignments})
+            assignments = []
+            for assignment in self.assignments:
+                if assignment.request.pk not in still_waiting or loads.get(assignment.tutor_id, 0) >= self.capacity:
+                    continue
+                loads[assignment.tutor_id] = loads.get(assignment.tutor_id, 0) + 1
+                assignments.append(assignment)
+
+            StudentRequest.objects.filter(
+                pk__in=[assignment.request.pk for assignment in assignments],
+            ).update(status='approved')
+            for assignment in assignments:
+                assignment.request.status = 'approved'
+            enrollments = Enrollment.objects.bulk_create([
+                Enrollment(
+                    approved_request=assignment.request,
+                    tutor_id=assignment.tutor_id,
+                    current_term=assignment.request.first_term,
+                    week_count=ENROLLMENT_WEEKS,
+                    start_time=start_time,
+                    status='ongoing',
+                ) for assignment in assignments
+            ])
+            Invoice.objects.bulk_create([
+                Invoice(
+                    enrollment=enrollment,
+                    amount=assignment.amount,
+                    issued_date=now,
+                    payment_status='unpaid',
+                    due_date=start_time,
+                ) for enrollment, assignment in zip(enrollments, assignments)
+            ])
+            # update() and bulk_create() send no signals, so refresh the candidate index and cached reads here
+            TutorCandidate.refresh_loads({assignment.tutor_id for assignment in assignments})
+            transaction.on_commit(lambda: caching.bump_version(caching.STUDENT_REQUEST))
+        return enrollments
@@ -0,0 +1,30 @@
+"""Authentication backends for the tutorials app."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from tutorials import caching
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that loads the signed-in user from the cache rather than the users table.
+
+    Only a cache shared by every worker is used (see ``CACHE_SHARED``), as
+    dropping a user from one process's local memory leaves it in the others.
+    Cached users are dropped whenever a user is saved or deleted (see
+    ``tutorials.signals``), and in any case expire after ``CACHE_USER_TTL``
+    seconds, which bounds how long a role changed by a bulk update can be
+    seen stale.
+    """
+
+    def get_user(self, user_id):
+        if not settings.CACHE_SHARED:
+            return super().get_user(user_id)
+        user = caching.get_user(user_id)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            caching.set_user(user)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,405 @@
+"""Two-tier cache for rarely changing reads, invalidated by per-entity versions.
+
+Every cached value is stored under a key that embeds the current version of
+each entity it was computed from. Saving or deleting a row of one of those
+entities bumps its version (see ``tutorials.signals``), so later reads miss
+and recompute instead of serving stale data; the old entries simply expire.
+
+Reads go through a bounded LRU tier private to the process before the shared
+cache configured in ``CACHES``. Each process keeps the versions it has seen
+in that local tier too, and only asks the shared cache for them again once
+the version stamp file changes (every bump touches it) or after
+``CACHE_LOCAL_TTL`` seconds, which bounds how stale a local read can be.
+Values served from the local tier are shared by every request of the
+process, so they must be treated as read-only.
+
+Recomputation is single-flight: a miss takes a lock in the shared cache, and
+while one caller recomputes the others are given the last value computed for
+the same read (even for an older version) or, if there is none, wait for the
+new one. Entries are refreshed a little before they expire, earlier the longer
+they took to compute, so a hot read rarely misses at all. If the database is
+locked or otherwise fails during a recompute, the last value is served.
+"""
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import OperationalError
+from tutorials import metrics
+
+CACHE_ALIAS = 'default'
+KEY_PREFIX = 'tutorials'
+
+SKILL = 'skill'
+STUDENT_REQUEST = 'student_request'
+TUTOR_SKILL = 'tutor_skill'
+USER = 'user'
+# Every entity cached reads are computed from, all bumped when the data is purged
+ENTITIES = (SKILL, STUDENT_REQUEST, TUTOR_SKILL, USER)
+
+DEFAULT_LOCAL_MAX_ENTRIES = 1000
+DEFAULT_LOCAL_TTL = 5
+DEFAULT_USER_TTL = 60
+
+# Seconds a recompute may hold its lock, and that other callers wait for it
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+# Seconds an expired value is kept to be served while it is recomputed
+STALE_TTL = 600
+# Higher values refresh entries earlier before they expire
+EARLY_REFRESH_BETA = 1.0
+
+_MISSING = object()
+
+
+class LocalCache:
+    """A bounded, thread-safe LRU cache private to one process, whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _LocalTier:
+    """The process's local values and local versions."""
+
+    def __init__(self):
+        max_entries = getattr(settings, 'CACHE_LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES)
+        ttl = getattr(settings, 'CACHE_LOCAL_TTL', DEFAULT_LOCAL_TTL)
+        self.values = LocalCache(max_entries, ttl)
+        self.versions = LocalCache(max_entries, ttl)
+        self.stamp_path = getattr(settings, 'CACHE_VERSION_STAMP', None)
+        self.stamp = self.read_stamp()
+
+    def read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check_stamp(self):
+        """Forget the local versions if a process has bumped one since the stamp was last read."""
+        stamp = self.read_stamp()
+        if stamp != self.stamp:
+            self.versions.clear()
+            self.stamp = stamp
+
+    def touch_stamp(self):
+        if not self.stamp_path:
+            return
+        try:
+            with open(self.stamp_path, 'a'):
+                now = time.time_ns()
+                os.utime(self.stamp_path, ns=(now, now))
+        except OSError:
+            # Other processes still pick the new version up once their local versions expire
+            pass
+        self.stamp = self.read_stamp()
+
+    def count(self, name, outcome):
+        # The metrics registry is shared by the process's threads and takes its own lock
+        metrics.inc(metrics.CACHE_READS, read=name, tier='local', outcome=outcome)
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def get_local_tier():
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = _LocalTier()
+    return _local
+
+
+def clear_local_tier():
+    """Drop the process's local tier, so it is rebuilt from the current settings."""
+    global _local
+    _local = None
+
+
+def _settings_changed(setting, **kwargs):
+    if setting in ('CACHES', 'CACHE_LOCAL_MAX_ENTRIES', 'CACHE_LOCAL_TTL', 'CACHE_VERSION_STAMP'):
+        clear_local_tier()
+
+
+setting_changed.connect(_settings_changed)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(entity):
+    return f'{KEY_PREFIX}:version:{entity}'
+
+
+def _new_version():
+    # Time based, so a version key evicted from the cache never restarts at a version already used
+    return time.time_ns()
+
+
+def get_versions(*entities):
+    """Return {entity: version} for the given entities."""
+    local = get_local_tier()
+    local.check_stamp()
+    versions = {}
+    for entity in entities:
+        version = local.versions.get(entity)
+        if version is not None:
+            versions[entity] = version
+    missing = [entity for entity in entities if entity not in versions]
+    if missing:
+        cache = get_cache()
+        keys = {_version_key(entity): entity for entity in missing}
+        found = {keys[key]: version for key, version in cache.get_many(keys).items()}
+        for key, entity in keys.items():
+            if entity not in found:
+                cache.add(key, _new_version(), timeout=None)
+                found[entity] = cache.get(key) or 0
+            local.versions.set(entity, found[entity])
+        versions.update(found)
+    return versions
+
+
+def bump_version(*entities):
+    """Invalidate every cached value computed from the given entities, in every process."""
+    cache = get_cache()
+    local = get_local_tier()
+    for entity in entities:
+        try:
+            cache.incr(_version_key(entity))
+        except ValueError:
+            cache.set(_version_key(entity), _new_version(), timeout=None)
+        local.versions.delete(entity)
+    local.touch_stamp()
+
+
+def _count(name, outcome):
+    # Counted in the process's metrics, which every process writes to its own file, not in the shared cache
+    metrics.inc(metrics.CACHE_READS, read=name, tier='shared', outcome=outcome)
+
+
+def _needs_refresh(entry):
+    """Return whether an entry has expired, or is chosen for early refresh as its expiry nears."""
+    _value, expires, duration = entry
+    # XFetch: recompute early with a probability that grows as expiry approaches
+    return time.time() - duration * EARLY_REFRESH_BETA * math.log(1 - random.random()) >= expires
+
+
+def _wait_for(key):
+    """Wait for another caller to store a recomputed entry, returning None if it does not in time."""
+    cache = get_cache()
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached(name, entities, compute, vary_on=(), timeout=None, local=True, serve_previous=True):
+    """Return the cached result of ``compute()``, computing and storing it on a miss.
+
+    ``name`` identifies the read, ``entities`` are the entities its result
+    depends on and ``vary_on`` any further values (such as filters) that
+    select a different result. ``timeout`` defaults to the shared cache's own.
+    With ``local=False`` the local tier is skipped, so every caller gets its
+    own copy of the value. With ``serve_previous=False`` a value computed
+    before an invalidation is never served, even while recomputing.
+    """
+    versions = get_versions(*entities)
+    base = f'{KEY_PREFIX}:{name}'
+    if vary_on:
+        # Hashed, as values such as cursors are user supplied and of any length
+        base += ':' + hashlib.md5(repr(tuple(vary_on)).encode(), usedforsecurity=False).hexdigest()
+    key = ':'.join([base, *(f'{entity}{versions[entity]}' for entity in sorted(versions))])
+
+    local_tier = get_local_tier()
+    if local:
+        value = local_tier.values.get(key, _MISSING)
+        if value is not _MISSING:
+            local_tier.count(name, 'hits')
+            return value
+        local_tier.count(name, 'misses')
+
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is not None and not _needs_refresh(entry):
+        _count(name, 'hits')
+        if local:
+            local_tier.values.set(key, entry[0])
+        return entry[0]
+
+    latest_key = f'{base}:latest' if serve_previous else None
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        # Another caller is recomputing; serve the last value rather than pile on
+        stale = entry or (latest_key and cache.get(latest_key))
+        if stale is not None:
+            _count(name, 'stale')
+            return stale[0]
+        entry = _wait_for(key)
+        if entry is not None:
+            _count(name, 'hits')
+            if local:
+                local_tier.values.set(key, entry[0])
+            return entry[0]
+    try:
+        _count(name, 'misses')
+        started = time.monotonic()
+        try:
+            value = compute()
+        except OperationalError:
+            # Such as "database is locked"; the last value is better than an error page
+            stale = entry or (latest_key and cache.get(latest_key))
+            if stale is None:
+                raise
+            _count(name, 'stale')
+            return stale[0]
+        duration = time.monotonic() - started
+
+        if timeout is None:
+            timeout = cache.default_timeout
+        if timeout is None:
+            entry, stored_for = (value, math.inf, duration), None
+        else:
+            entry, stored_for = (value, time.time() + timeout, duration), timeout + STALE_TTL
+        cache.set_many({key: entry, latest_key: entry} if latest_key else {key: entry}, stored_for)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    if local:
+        local_tier.values.set(key, value)
+    return value
+
+
+def user_key(user_id):
+    # Versioned by USER, so bumping it (as a purge does) drops every cached user at once
+    version = get_versions(USER)[USER]
+    return f'{KEY_PREFIX}:user:{version}:{user_id}'
+
+
+def get_user(user_id):
+    """Return the cached user with the given primary key, or None."""
+    user = get_cache().get(user_key(user_id))
+    _count('users', 'misses' if user is None else 'hits')
+    return user
+
+
+def set_user(user):
+    """Cache a user for at most ``CACHE_USER_TTL`` seconds, the longest a missed invalidation can go unseen."""
+    get_cache().set(user_key(user.pk), user, getattr(settings, 'CACHE_USER_TTL', DEFAULT_USER_TTL))
+
+
+def forget_user(user_id):
+    get_cache().delete(user_key(user_id))
+
+
+CACHED_READS = ('skill_catalog', 'current_tutors', 'application_counts', 'querysets', 'users')
+OUTCOMES = ('hits', 'misses', 'stale')
+
+
+TIERS = {'local': ('hits', 'misses'), 'shared': OUTCOMES}
+
+
+def _read_counts():
+    """Return {(name, tier, outcome): count} of the cached reads of every process."""
+    counts = {}
+    for (metric, labels), value in metrics.collect().counters.items():
+        if metric == metrics.CACHE_READS:
+            labels = dict(labels)
+            key = (labels['read'], labels['tier'], labels['outcome'])
+            counts[key] = counts.get(key, 0) + value
+    return counts
+
+
+def _baseline_path():
+    # Not a .json file, so it is not taken for a process's metrics
+    return metrics.metrics_dir() / 'cache_stats.baseline'
+
+
+def _read_baseline():
+    snapshot = metrics.read_snapshot(_baseline_path()) or []
+    return {(name, tier, outcome): count for name, tier, outcome, count in snapshot}
+
+
+def get_stats(names=CACHED_READS):
+    """Return {name: {'local': {'hits': n, 'misses': n}, 'shared': {...}}} for the given cached reads.
+
+    The counts are the CACHE_READS metrics of every process since
+    ``reset_stats()``, as last written to METRICS_DIR, so those of the web
+    server's workers are seen by any process. Shared counts only cover the
+    reads the local tier could not serve; their ``stale`` count is of reads
+    given the last value while it was recomputed.
+    """
+    counts = _read_counts()
+    baseline = _read_baseline()
+    return {
+        name: {
+            tier: {
+                outcome: counts.get((name, tier, outcome), 0) - baseline.get((name, tier, outcome), 0)
+                for outcome in outcomes
+            }
+            for tier, outcomes in TIERS.items()
+        }
+        for name in names
+    }
+
+
+def reset_stats(names=CACHED_READS):
+    """Count the cached reads from zero again; the metrics themselves, being counters, carry on."""
+    counts = _read_counts()
+    baseline = _read_baseline()
+    baseline.update({
+        (name, tier, outcome): counts.get((name, tier, outcome), 0)
+        for name in names for tier, outcomes in TIERS.items() for outcome in outcomes
+    })
+    metrics.write_snapshot(_baseline_path(), [[*key, count] for key, count in baseline.items()])
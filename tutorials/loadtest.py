@@ -0,0 +1,245 @@
+"""Concurrent HTTP load testing of the app, served in-process by a threaded WSGI server."""
+import random
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.urls import reverse
+from tutorials.models import User, Skill, StudentRequest, Enrollment, Invoice
+from tutorials.percentiles import percentile
+
+# A page requested in the load, as its URL name, the role requesting it and how often it is picked
+Route = namedtuple('Route', ['name', 'role', 'weight'])
+
+ANONYMOUS = 'anonymous'
+ADMIN = 'admin'
+STUDENT = 'student'
+TUTOR = 'tutor'
+
+ROUTES = [
+    Route('home', ANONYMOUS, 5),
+    Route('log_in', ANONYMOUS, 3),
+    Route('sign_up', ANONYMOUS, 1),
+    Route('tutor_signup', ANONYMOUS, 1),
+    Route('dashboard', STUDENT, 10),
+    Route('offered_skill_list', STUDENT, 8),
+    Route('your_requests', STUDENT, 5),
+    Route('your_enrollments', STUDENT, 5),
+    Route('my_tickets', STUDENT, 3),
+    Route('invoice', STUDENT, 2),
+    Route('student_request_form', STUDENT, 2),
+    Route('submit_ticket', STUDENT, 1),
+    Route('profile', STUDENT, 1),
+    Route('password', STUDENT, 1),
+    Route('manage_applications', ADMIN, 5),
+    Route('manage_tutors', ADMIN, 3),
+    Route('manage_students', ADMIN, 3),
+    Route('manage_lessons', ADMIN, 3),
+    Route('manage_tickets', ADMIN, 2),
+    Route('lesson_request_details', ADMIN, 2),
+    Route('request_profiles', ADMIN, 1),
+    Route('tutor_enrollments', TUTOR, 5),
+]
+
+# URL names left out of the load, and why
+EXCLUDED = {
+    'log_out': 'ends the session the clients share',
+    'update_request_status': 'changes lesson requests',
+    'delete_your_request': 'accepts only POST',
+    'auto_assign_requests': 'assigns tutors on POST and only redirects on GET',
+    'tutor_application_success': 'renders a template that does not exist',
+    'request_profile': 'needs a stored profile',
+    'metrics': 'scraped by monitoring, not browsed',
+}
+
+SERVER_TIMING = re.compile(r'db;dur=(?P<duration>[\d.]+);desc="(?P<queries>\d+) queries"')
+
+# One response, as its route name, status (0 if the request failed), seconds, queries, database milliseconds and size
+Sample = namedtuple('Sample', ['name', 'status', 'seconds', 'queries', 'db_ms', 'size'])
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log each request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadServer:
+    """Serve the app on a free localhost port in background threads, for the length of a with block."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadedWSGIServer((host, port), QuietRequestHandler, allow_reuse_address=False)
+        self.server.set_app(get_internal_wsgi_application())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class Client:
+    """A browser session against the load server, keeping its cookies between requests."""
+
+    def __init__(self, address):
+        self.address = address
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, body=None):
+        """Make a request, returning its Sample with an empty route name."""
+        headers = {'Host': 'localhost'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={morsel.value}' for key, morsel in self.cookies.items())
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            body = urlencode(body)
+        connection = HTTPConnection(*self.address, timeout=60)
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except OSError:
+            return Sample('', 0, time.perf_counter() - started, 0, 0.0, 0)
+        finally:
+            connection.close()
+        seconds = time.perf_counter() - started
+        for cookie in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(cookie)
+        timing = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+        queries, db_ms = (int(timing['queries']), float(timing['duration'])) if timing else (0, 0.0)
+        return Sample('', response.status, seconds, queries, db_ms, len(content))
+
+    def log_in(self, username, password):
+        """Log in through the log in form, raising ValueError if the credentials are refused."""
+        self.request('GET', reverse('log_in'))
+        sample = self.request('POST', reverse('log_in'), {
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.cookies[settings.CSRF_COOKIE_NAME].value,
+        })
+        if sample.status != 302:
+            raise ValueError(f"Could not log in as {username}.")
+
+
+def route_arguments(users):
+    """Return the URL arguments of the routes that need them, given the user of each role.
+
+    Routes whose objects do not exist for these users are left out.
+    """
+    arguments = {}
+    enrollment = Enrollment.objects.filter(approved_request__student=users[STUDENT]).order_by('pk').first()
+    if enrollment:
+        arguments['submit_ticket'] = [enrollment.pk]
+    invoice = Invoice.objects.filter(enrollment__approved_request__student=users[STUDENT]).order_by('pk').first()
+    if invoice:
+        arguments['invoice'] = [invoice.enrollment_id]
+    skill = Skill.objects.order_by('pk').first()
+    if skill:
+        arguments['student_request_form'] = [skill.pk]
+    lesson_request = StudentRequest.objects.order_by('pk').first()
+    if lesson_request:
+        arguments['lesson_request_details'] = [lesson_request.pk]
+    return arguments
+
+
+def routes_for(arguments):
+    """Return the routes that can be requested, with their paths."""
+    needed = {'submit_ticket', 'invoice', 'student_request_form', 'lesson_request_details'}
+    return [
+        (route, reverse(route.name, args=arguments.get(route.name, [])))
+        for route in ROUTES if route.name not in needed or route.name in arguments
+    ]
+
+
+def run_load(address, credentials, concurrency=10, duration=10.0, requests=None, seed=None):
+    """Drive a weighted mix of the routes from ``concurrency`` clients, returning (samples, elapsed seconds).
+
+    ``credentials`` maps each signed-in role to its (username, password). Each
+    client logs in as every role before the load starts, then requests routes
+    until ``duration`` seconds pass or ``requests`` are made between them.
+    """
+    users = {role: User.objects.get(username=username) for role, (username, _password) in credentials.items()}
+    routes = routes_for(route_arguments(users))
+    weights = [route.weight for route, _path in routes]
+
+    clients = []
+    for _ in range(concurrency):
+        signed_in = {ANONYMOUS: Client(address)}
+        for role, (username, password) in credentials.items():
+            signed_in[role] = Client(address)
+            signed_in[role].log_in(username, password)
+        clients.append(signed_in)
+
+    samples = []
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.perf_counter() + duration
+
+    def worker(signed_in, rng):
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            route, path = rng.choices(routes, weights)[0]
+            sample = signed_in[route.role].request('GET', path)._replace(name=route.name)
+            with lock:
+                samples.append(sample)
+
+    seeds = random.Random(seed)
+    threads = [
+        threading.Thread(target=worker, args=(signed_in, random.Random(seeds.random())))
+        for signed_in in clients
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarise(samples, elapsed):
+    """Return {route name: statistics} and the statistics of all the samples, under 'total'."""
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample.name].append(sample)
+    groups['total'] = list(samples)
+    report = {}
+    for name, group in groups.items():
+        latencies = [sample.seconds * 1000 for sample in group]
+        report[name] = {
+            'requests': len(group),
+            'rps': round(len(group) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'error_rate': round(sum(1 for sample in group if not 0 < sample.status < 400) / len(group), 4) if group else 0.0,
+            'queries': round(sum(sample.queries for sample in group) / len(group), 2) if group else 0.0,
+            'db_ms': round(sum(sample.db_ms for sample in group) / len(group), 2) if group else 0.0,
+        }
+    return report
+
+
+def compare(previous, current, metrics=('p95_ms', 'rps', 'error_rate', 'queries')):
+    """Return {route name: {metric: (previous, current)}} for the routes in both reports."""
+    return {
+        name: {metric: (previous[name][metric], stats[metric]) for metric in metrics}
+        for name, stats in current.items() if name in previous
+    }
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from tutorials.assignment import DEFAULT_CAPACITY, OBJECTIVES, plan_assignments
+from tutorials.models import User
+
+
+class Command(BaseCommand):
+    """Assign every waiting lesson request to a tutor in one run."""
+    help = "Match pending lesson requests without a tutor to tutors who offer the skill"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=DEFAULT_CAPACITY,
+            help='Most ongoing enrollments a tutor may hold.',
+        )
+        parser.add_argument(
+            '--objective',
+            choices=OBJECTIVES,
+            default='price',
+            help='Minimise the total price, or spread lessons evenly across tutors.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the plan and its cost without creating anything.',
+        )
+
+    def handle(self, *args, **options):
+        plan = plan_assignments(capacity=options['capacity'], objective=options['objective'])
+
+        if options['dry_run']:
+            tutors = User.objects.in_bulk({assignment.tutor_id for assignment in plan.assignments})
+            for assignment in plan.assignments:
+                request = assignment.request
+                self.stdout.write(
+                    f"Request {request.pk} ({request.student.username}, {request.skill.language} {request.skill.level}) "
+                    f"-> {tutors[assignment.tutor_id].username} at £{assignment.price_per_hour}/h: £{assignment.amount}"
+                )
+            for request in plan.unassigned:
+                self.stdout.write(self.style.WARNING(f"Request {request.pk}: no tutor with capacity left"))
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Dry run: {len(plan)} request(s) assigned, {len(plan.unassigned)} left waiting. "
+                f"Total cost £{plan.total_cost}, load spread {plan.load_spread}."
+            )
+            return
+
+        enrollments = plan.apply()
+        skipped = len(plan) - len(enrollments)
+        cost = sum((enrollment.invoice.amount for enrollment in enrollments), Decimal('0.00'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(enrollments)} request(s) assigned, {len(plan.unassigned) + skipped} left waiting. Total cost £{cost}."
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"{skipped} planned assignment(s) skipped: the request was decided or the tutor filled up meanwhile."
+            ))
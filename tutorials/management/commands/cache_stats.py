@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from tutorials import caching
+
+
+class Command(BaseCommand):
+    """Report how often the cached reads are served from each cache tier.
+
+    The counts are added up from the metrics files every worker writes, so
+    they lag a worker by up to METRICS_FLUSH_INTERVAL seconds.
+    """
+    help = "Show hit and miss counts of the cached reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after reporting them.',
+        )
+
+    def handle(self, *args, **options):
+        for name, tiers in caching.get_stats().items():
+            for tier, counts in tiers.items():
+                total = counts['hits'] + counts['misses']
+                ratio = counts['hits'] / total if total else 0
+                self.stdout.write(
+                    f"{name} ({tier}): {counts['hits']} hits, {counts['misses']} misses ({ratio:.0%} hit rate)"
+                )
+        if options['reset']:
+            caching.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Cache counters reset."))
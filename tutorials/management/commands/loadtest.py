@@ -0,0 +1,77 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from tutorials import loadtest
+
+
+class Command(BaseCommand):
+    """Load test the app served in-process, reporting latency, throughput, errors and queries per page.
+
+    Clients log in as the seeded admin, student and tutor, then request a
+    weighted mix of the pages. The report can be saved as JSON and compared
+    with that of an earlier run.
+    """
+    help = "Load test every page from concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of concurrent clients.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run the load for.')
+        parser.add_argument('--requests', type=int, help='Stop after this many requests in total.')
+        parser.add_argument('--admin', default='@johndoe', help='Username of the admin to log in as.')
+        parser.add_argument('--student', default='@charlie', help='Username of the student to log in as.')
+        parser.add_argument('--tutor', default='@janedoe', help='Username of the tutor to log in as.')
+        parser.add_argument('--password', default='Password123', help='Password of the users logged in as.')
+        parser.add_argument('--seed', type=int, help='Seed for the choice of pages, to repeat a run.')
+        parser.add_argument('--output', help='Save the report as JSON to this file.')
+        parser.add_argument('--compare', help='Compare with the JSON report of an earlier run.')
+
+    def handle(self, *args, **options):
+        credentials = {
+            role: (options[role], options['password'])
+            for role in (loadtest.ADMIN, loadtest.STUDENT, loadtest.TUTOR)
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)['endpoints']
+
+        with loadtest.LoadServer() as server:
+            try:
+                samples, elapsed = loadtest.run_load(
+                    server.address,
+                    credentials,
+                    concurrency=options['concurrency'],
+                    duration=options['duration'],
+                    requests=options['requests'],
+                    seed=options['seed'],
+                )
+            except (ValueError, loadtest.User.DoesNotExist) as error:
+                raise CommandError(f"{error} Seed the database, or pass the users to log in as.")
+        report = loadtest.summarise(samples, elapsed)
+
+        self.write_report(report)
+        if previous is not None:
+            self.write_comparison(loadtest.compare(previous, report))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({
+                    'concurrency': options['concurrency'],
+                    'elapsed': round(elapsed, 3),
+                    'endpoints': report,
+                }, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report saved to {options['output']}."))
+
+    def write_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<26}{'requests':>9}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'queries':>9}"
+        )
+        for name, stats in sorted(report.items(), key=lambda item: (item[0] == 'total', item[0])):
+            self.stdout.write(
+                f"{name:<26}{stats['requests']:>9}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+                f"{stats['p99_ms']:>9.1f}{stats['error_rate']:>8.1%}{stats['queries']:>9.1f}"
+            )
+
+    def write_comparison(self, changes):
+        self.stdout.write("\nChange since the earlier run:")
+        for name, metrics in sorted(changes.items(), key=lambda item: (item[0] == 'total', item[0])):
+            described = ', '.join(f"{metric} {before:g} -> {after:g}" for metric, (before, after) in metrics.items())
+            self.stdout.write(f"{name:<26}{described}")
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from tutorials.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    """Delete expired sessions in small batches, once or repeatedly in the background."""
+    help = "Delete expired sessions from the session table in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of sessions deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help='Seconds to wait between batches, leaving the database to other writers.',
+        )
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='Keep running, purging again after this many seconds.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = purge_expired_sessions(batch_size=options['batch_size'], pause=options['pause'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
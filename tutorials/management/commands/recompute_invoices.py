@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from tutorials.models import Invoice
+
+
+class Command(BaseCommand):
+    """Recalculate the stored amount of every invoice."""
+    help = "Recalculate stored invoice amounts from enrollments and tutor prices"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of invoices read and written per batch.',
+        )
+
+    def handle(self, *args, **options):
+        changed = Invoice.objects.recompute_amounts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed invoice amounts, {changed} changed."))
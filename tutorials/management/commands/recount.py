@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from tutorials.models import StatusCount
+from tutorials.models.counters import StatusCountedModel
+
+
+class Command(BaseCommand):
+    """Reconcile the status counters with the tables they count."""
+    help = "Recount rows per status and repair any drifted counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drifted counters, without repairing them.',
+        )
+
+    def handle(self, *args, **options):
+        models = [
+            model for model in apps.get_app_config('tutorials').get_models()
+            if issubclass(model, StatusCountedModel)
+        ]
+        stored = StatusCount.get_counts(*models)
+        drifted = 0
+
+        for model in models:
+            actual = StatusCount.tally(model)
+            statuses = sorted(set(actual) | set(stored[model]))
+            for status in statuses:
+                if actual[status] != stored[model][status]:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(
+                        f"{model.__name__}[{status}]: counter {stored[model][status]}, actual {actual[status]}"
+                    ))
+            if not options['check']:
+                StatusCount.recount(model)
+
+        if options['check']:
+            self.stdout.write(f"{drifted} drifted counter(s) found.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Recount complete, {drifted} counter(s) repaired."))
@@ -0,0 +1,70 @@
+import json
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from tutorials.scaling import scaling_report
+
+DUMMY_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    """Report how each page's render time and size grow as the tables grow.
+
+    The tables are seeded at each size in a throwaway test database, so the
+    configured database is left untouched. Pages are rendered with caching
+    off, unless --with-cache is given, so the work of building them is timed.
+    """
+    help = "Measure every page at growing table sizes and flag faster than logarithmic growth"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Table sizes to measure the pages at.',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Requests timed per page at each size.')
+        parser.add_argument('--with-cache', action='store_true', help='Render the pages with caching on.')
+        parser.add_argument('--output', help='Save the report as JSON to this file.')
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'DEBUG': False}
+        if not options['with_cache']:
+            overrides.update(CACHES=DUMMY_CACHE, CACHE_LOCAL_MAX_ENTRIES=0, CACHE_VERSION_STAMP=None)
+        sql_logger = logging.getLogger('tutorials.sql')
+        sql_level = sql_logger.level
+        sql_logger.setLevel(logging.WARNING)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                report = scaling_report(
+                    options['sizes'],
+                    repeat=options['repeat'],
+                    progress=lambda size: self.stdout.write(f"Measured the pages at {size} rows."),
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            sql_logger.setLevel(sql_level)
+
+        sizes = sorted(options['sizes'])
+        self.write_report(report, sizes)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'sizes': sizes, 'endpoints': report}, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report saved to {options['output']}."))
+
+    def write_report(self, report, sizes):
+        columns = ''.join(f"{f'ms@{size}':>12}" for size in sizes)
+        self.stdout.write(f"\n{'endpoint':<26}{columns}{'latency':>14}{'bytes':>14}")
+        for name, stats in sorted(report.items()):
+            latencies = ''.join(f"{latency:>12.1f}" for latency in stats['latency_ms'])
+            line = f"{name:<26}{latencies}{stats['latency_growth']:>14}{stats['bytes_growth']:>14}"
+            self.stdout.write(self.style.WARNING(line) if stats['flagged'] else line)
+        flagged = [name for name, stats in report.items() if stats['flagged']]
+        if flagged:
+            self.stdout.write(self.style.WARNING(f"Growing faster than logarithmically: {', '.join(sorted(flagged))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No page grows faster than logarithmically."))
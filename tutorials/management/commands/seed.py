@@ -1,16 +1,18 @@
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from tutorials.models import (
     User, UserType, Skill, SkillLevel, TutorSkill,
     StudentRequest, Term, Frequency, Enrollment,
-    EnrollmentDays, Day, Invoice
+    Day, TutorCandidate
 )
+from tutorials.purge import purge
 from django.utils import timezone
 from faker import Faker
 from datetime import timedelta
+from itertools import islice
 import random
 from django.db import transaction
 from decimal import Decimal
-from datetime import time
 
 user_fixtures = [
     {'username': '@johndoe', 'email': 'john.doe@duck_admin.com', 'first_name': 'John', 'last_name': 'Doe', 'user_type': 'Admin'},
@@ -22,70 +24,114 @@ class Command(BaseCommand):
     """Build automation command to seed the database."""
     USER_COUNT = 100
     DEFAULT_PASSWORD = 'Password123'
+    BATCH_SIZE = 1000
+    # Exponent of the Zipf distribution of skill popularity: the n-th most popular skill is picked 1/n**s as often
+    SKILL_POPULARITY_EXPONENT = 1.1
+    # Popular skills drawn for a student before falling back to one they have not requested yet
+    SKILL_DRAW_ATTEMPTS = 10
     help = 'Seeds the database with sample data'
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.faker = Faker('en_GB')
+        self.random = random.Random()
         self.existing_emails = set()
-        self.existing_usernames = set()
+        self.username_counters = {}
         self.tutors = []
         self.students = []
         self.skills = []
-        
+        self.skill_weights = []
+        self.skill_tutors = {}
+        self.requested_pairs = set()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=self.USER_COUNT,
+            help='Total number of users, including the fixed sample users.',
+        )
+        parser.add_argument(
+            '--tutors',
+            type=int,
+            help='Number of tutors among the users (default: 20%% of users).',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='Number of lesson requests (default: 5 to 10 per student).',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed, for a reproducible dataset.',
+        )
+
     def clear_data(self):
         """Clear existing data."""
         self.stdout.write('\nClearing existing data...')
 
-        User.objects.all().delete()
-        TutorSkill.objects.all().delete()
-        StudentRequest.objects.all().delete()
-        Day.objects.all().delete()
-        Enrollment.objects.all().delete()
-        EnrollmentDays.objects.all().delete()
-        Invoice.objects.all().delete()
+        # Seeding refills the file straight away, so there is nothing to vacuum
+        purge(vacuum=False)
 
         self.stdout.write('\nExisting data cleared.')
 
     def handle(self, *args, **options):
+        if options['seed'] is not None:
+            self.random.seed(options['seed'])
+            self.faker.seed_instance(options['seed'])
+
         self.clear_data()
 
-        self.create_users()
-        self.create_skills()
-        self.create_tutor_skills()
-        self.create_student_requests()
-        self.create_days()
-        self.create_enrollments()
+        with transaction.atomic():
+            self.create_users(options['users'], options['tutors'])
+            self.create_skills()
+            self.create_tutor_skills()
+            self.create_days()
+            self.create_student_requests(options['requests'])
+            # Tutor skills and enrollments were bulk inserted, which sends no signals
+            TutorCandidate.rebuild()
         self.stdout.write('\nSeeding complete.')
 
-    def create_users(self):
-        self.generate_user_fixtures()
-        self.generate_random_users()
-
-        self.tutors = list(User.objects.filter(user_type=UserType.TUTOR))
-        self.students = list(User.objects.filter(user_type=UserType.STUDENT))
+    def bulk_insert(self, model, objs):
+        """Insert a stream of unsaved rows in batches. Returns the saved rows of each batch in turn."""
+        objs = iter(objs)
+        while batch := list(islice(objs, self.BATCH_SIZE)):
+            yield model.objects.bulk_create(batch)
+
+    def create_users(self, user_count, tutor_count=None):
+        self.stdout.write('Creating users...')
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(self.DEFAULT_PASSWORD)
+        random_count = max(0, user_count - len(user_fixtures))
+        if tutor_count is None:
+            user_types = [self.assign_user_type() for _ in range(random_count)]
+        else:
+            # The sample tutor is one of them
+            tutor_count = min(max(tutor_count - 1, 0), random_count)
+            user_types = [UserType.TUTOR] * tutor_count + [
+                self.assign_other_user_type() for _ in range(random_count - tutor_count)
+            ]
+            self.random.shuffle(user_types)
 
-    def generate_user_fixtures(self):
         for data in user_fixtures:
-            self.try_create_user(data)
-            if data['email']:
-                self.existing_emails.add(data['email'])
-            if data['username']:
-                self.existing_usernames.add(data['username'])
-
-    def generate_random_users(self):
-        user_count = User.objects.count()
-        while user_count < self.USER_COUNT:
-            self.stdout.write(f"Seeding user {user_count}/{self.USER_COUNT}", ending='\r')
-            self.generate_user()
-            user_count = User.objects.count()
-        self.stdout.write("\nUser seeding complete.")
-
-    def generate_user(self):
+            self.existing_emails.add(data['email'])
+            self.username_counters[data['username']] = 1
+        users = (self.build_user(data, password) for data in [
+            *user_fixtures,
+            *(self.generate_user(user_type) for user_type in user_types),
+        ])
+        for batch in self.bulk_insert(User, users):
+            self.stdout.write(f"Seeded {len(batch)} users", ending='\r')
+
+        self.tutors = list(User.objects.filter(user_type=UserType.TUTOR).values_list('id', flat=True))
+        self.students = list(User.objects.filter(user_type=UserType.STUDENT).values_list('id', flat=True))
+        self.stdout.write(f"\nUser seeding complete: {User.objects.count()} users, {len(self.tutors)} tutors, {len(self.students)} students.")
+
+    def generate_user(self, user_type):
         first_name = self.faker.first_name()
         last_name = self.faker.last_name()
         username = self.create_unique_username(first_name, last_name)
-        user_type = self.assign_user_type()
 
         if (user_type == UserType.STUDENT):
             email = self.create_unique_email(first_name, last_name, "@student.com")
@@ -93,58 +139,50 @@ class Command(BaseCommand):
             email = self.create_unique_email(first_name, last_name, "@tutor.com")
         elif (user_type == UserType.ADMIN):
             email = self.create_unique_email(first_name, last_name, "@admin.com")
-        
-        self.try_create_user({
+
+        return {
             'username': username,
             'email': email,
             'first_name': first_name,
             'last_name': last_name,
             'user_type': user_type
-        })
-
-    def try_create_user(self, data):
-        try:
-            self.create_user(data)
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Error creating user {data['username']}: {str(e)}\n"))
-    
-    def create_user(self, data):
-            # Generate a random datetime within the last 2 months
-            now = timezone.now()
-            created_days_ago = random.randint(0, 60)
-            created_time = now - timedelta(days=created_days_ago)
-            created_time = created_time.replace(
-                hour=random.randint(0, 23),
-                minute=random.randint(0, 59),
-                second=random.randint(0, 59)
-            )
-            
-            # Generate updated_at within a range after created_at
-            update_days_after = random.randint(0, 30)  # Can be updated up to 30 days after creation
-            updated_time = created_time + timedelta(days=update_days_after)
-            updated_time = updated_time.replace(
-                hour=random.randint(0, 23),
-                minute=random.randint(0, 59),
-                second=random.randint(0, 59)
-            )
-            
-            data['created_at'] = created_time
-            data['updated_at'] = updated_time
-            
-            User.objects.create_user(
-                username=data['username'],
-                email=data['email'],
-                password=self.DEFAULT_PASSWORD,
-                first_name=data['first_name'],
-                last_name=data['last_name'],
-                user_type=data['user_type'],
-                created_at=data['created_at'],
-                updated_at=data['updated_at']
-            )
+        }
+
+    def build_user(self, data, password):
+        """Return an unsaved user with the shared password hash and random timestamps."""
+        # Generate a random datetime within the last 2 months
+        now = timezone.now()
+        created_days_ago = self.random.randint(0, 60)
+        created_time = now - timedelta(days=created_days_ago)
+        created_time = created_time.replace(
+            hour=self.random.randint(0, 23),
+            minute=self.random.randint(0, 59),
+            second=self.random.randint(0, 59)
+        )
+
+        # Generate updated_at within a range after created_at
+        update_days_after = self.random.randint(0, 30)  # Can be updated up to 30 days after creation
+        updated_time = created_time + timedelta(days=update_days_after)
+        updated_time = updated_time.replace(
+            hour=self.random.randint(0, 23),
+            minute=self.random.randint(0, 59),
+            second=self.random.randint(0, 59)
+        )
+
+        return User(
+            username=data['username'],
+            email=User.objects.normalize_email(data['email']),
+            password=password,
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            user_type=data['user_type'],
+            created_at=created_time,
+            updated_at=updated_time,
+        )
 
     def assign_user_type(self):
         """Assign a user type with 60% chance for Student, 20% for Tutor, and 20% for Admin."""
-        rand_num = random.random()  # Generates a float between 0 and 1
+        rand_num = self.random.random()  # Generates a float between 0 and 1
         if rand_num < 0.6:
             return 'Student'  # 60% chance
         elif rand_num < 0.8:
@@ -152,17 +190,15 @@ class Command(BaseCommand):
         else:
             return 'Admin'    # 20% chance (0.8 to 1.0)
 
-    def create_unique_username(self, first_name, last_name):
-        base_username = '@' + first_name.lower() + last_name.lower()
-        username = base_username
-        counter = 1
+    def assign_other_user_type(self):
+        """Assign a non-tutor user type in the same 3:1 Student to Admin ratio as assign_user_type()."""
+        return 'Student' if self.random.random() < 0.75 else 'Admin'
 
-        while username in self.existing_usernames:
-            username = f"{base_username}{counter}"
-            counter += 1
-
-        self.existing_usernames.add(username)
-        return username
+    def create_unique_username(self, first_name, last_name):
+        base_username = '@' + ''.join(char for char in (first_name + last_name).lower() if char.isalnum())
+        counter = self.username_counters.get(base_username, 0)
+        self.username_counters[base_username] = counter + 1
+        return f"{base_username}{counter}" if counter else base_username
 
     def create_unique_email(self, first_name, last_name, domain='@gmail.com'):
         base_email = f"{first_name.lower()}.{last_name.lower()}{domain}"
@@ -183,17 +219,26 @@ class Command(BaseCommand):
             'Java', 'Python', 'JavaScript', 'Scala', 'Ruby', 'Go', 'C++', 'C', 'Swift', 'Perl', 'Rust',
         ]
         levels = [SkillLevel.BEGINNER, SkillLevel.INTERMEDIATE, SkillLevel.ADVANCED]
-        self.skills = []
-
-        for language in languages:
-            for level in levels:
-                skill, created = Skill.objects.get_or_create(language=language, level=level)
-                self.skills.append(skill)
+        existing = {(skill.language, skill.level): skill for skill in Skill.objects.all()}
+        Skill.objects.bulk_create([
+            Skill(language=language, level=level)
+            for language in languages for level in levels
+            if (language, level) not in existing
+        ])
+        self.skills = list(Skill.objects.filter(language__in=languages))
+
+        # Rank the skills at random and weight them by Zipf's law, so a few skills are in high demand
+        self.random.shuffle(self.skills)
+        self.skill_weights = [
+            1 / rank ** self.SKILL_POPULARITY_EXPONENT for rank in range(1, len(self.skills) + 1)
+        ]
+        self.stdout.write(f'{len(self.skills)} skills available.')
 
-                if created:
-                    self.stdout.write(f'Created skill: {skill.language} ({skill.level})')
-                else:
-                    self.stdout.write(f'Skill already exists: {skill.language} ({skill.level})')
+    def sample_skills(self, k):
+        """Pick k distinct skills, favouring the popular ones."""
+        keys = [self.random.random() ** (1 / weight) for weight in self.skill_weights]
+        ranked = sorted(range(len(self.skills)), key=keys.__getitem__, reverse=True)
+        return [self.skills[index] for index in ranked[:k]]
 
     def create_tutor_skills(self):
         self.stdout.write('Assigning skills to tutors...')
@@ -202,71 +247,78 @@ class Command(BaseCommand):
             self.stdout.write(('No tutors found to assign skills to.'))
             return
 
-        for tutor in self.tutors:
-            assigned_skills = random.sample(self.skills, k=random.randint(7, 10))  # Each tutor gets 3-5 random skills
-            for skill in assigned_skills:
-                tutor_skill_data = {
-                    'tutor': tutor,
-                    'skill': skill,
-                    'price_per_hour': self.generate_hourly_price() 
-                }
-            
-                try:
-                    with transaction.atomic():
-                        TutorSkill.objects.create(**tutor_skill_data)
-                        self.stdout.write(f'Assigned: {skill.language} ({skill.level}) to {tutor.username}')
-                    
-                except Exception as e:
-                        self.stdout.write(f'Could not assign {skill.language} ({skill.level}) to {tutor.username}: {e}')
+        self.skill_tutors = {skill.id: [] for skill in self.skills}
+        tutor_skills = (
+            TutorSkill(tutor_id=tutor_id, skill=skill, price_per_hour=self.generate_hourly_price())
+            for tutor_id in self.tutors
+            for skill in self.sample_skills(k=min(len(self.skills), self.random.randint(7, 10)))
+        )
+        count = 0
+        for batch in self.bulk_insert(TutorSkill, tutor_skills):
+            for tutor_skill in batch:
+                self.skill_tutors[tutor_skill.skill_id].append(tutor_skill.tutor_id)
+            count += len(batch)
+        self.stdout.write(f'Assigned {count} skills to tutors.')
 
     def generate_hourly_price(self):
-        price = Decimal(random.uniform(20, 150)).quantize(Decimal('0.01'))
+        price = Decimal(self.random.uniform(20, 150)).quantize(Decimal('0.01'))
         return price
 
-    def create_student_requests(self):
+    def create_student_requests(self, request_count=None):
         self.stdout.write('Creating student requests...')
 
         # Check for required data
         if not self.students:
             self.stdout.write('No students found to assign requests to.')
             return
-        
+
         if not self.skills:
             self.stdout.write('No skills found to assign to requests.')
             return
 
+        if request_count is None:
+            request_count = sum(self.random.randint(5, 10) for _ in self.students)
+        # A student may request each skill only once
+        self.requested_pairs = set(StudentRequest.objects.values_list('student_id', 'skill_id'))
+        request_count = min(request_count, len(self.students) * len(self.skills) - len(self.requested_pairs))
+
+        requests = (self.generate_student_request() for _ in range(request_count))
+        created = enrolled = 0
+        for batch in self.bulk_insert(StudentRequest, requests):
+            created += len(batch)
+            enrolled += self.create_enrollments([request for request in batch if request.status == 'approved'])
+            self.stdout.write(f"Seeded {created}/{request_count} requests", ending='\r')
+        self.stdout.write(f'\nCreated {created} requests and {enrolled} enrollments for the approved ones.')
+
+    def generate_student_request(self):
         # Possible values for request fields
         durations = [30, 60, 90]
         terms = [Term.SEPTEMBER_CHRISTMAS, Term.JANUARY_EASTER, Term.MAY_JULY]
         frequencies = [Frequency.WEEKLY, Frequency.BI_WEEKLY]
-
-        # Generate student requests
-        for student in self.students:
-            k = min(len(self.skills), random.randint(5, 10))  # Ensure valid sampling
-            requested_skills = random.sample(self.skills, k=k)
-
-            statuses = ['pending', 'rejected', 'approved']
-            
-            random.shuffle(statuses)
-            
-            for skill in requested_skills:
-                status = statuses[random.randint(0, 2)]  # Randomly choose from 'pending', 'rejected', 'approved'
-                
-                student_request_data = {
-                    'student': student,
-                    'skill': skill,
-                    'duration': random.choice(durations),
-                    'first_term': random.choice(terms),
-                    'frequency': random.choice(frequencies),
-                    'status': status,  
-                }
-                
-                try:
-                    with transaction.atomic():
-                        StudentRequest.objects.create(**student_request_data)
-                        self.stdout.write(f'Student: {student.username} requested: {skill.language} ({skill.level}) with status {status}')
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error creating request for {student.username}: {e}'))
+        statuses = ['pending', 'rejected', 'approved']
+
+        student_id, skill = self.draw_request_pair()
+        self.requested_pairs.add((student_id, skill.id))
+        return StudentRequest(
+            student_id=student_id,
+            skill=skill,
+            duration=self.random.choice(durations),
+            first_term=self.random.choice(terms),
+            frequency=self.random.choice(frequencies),
+            status=self.random.choice(statuses),
+        )
+
+    def draw_request_pair(self):
+        """Return a student and a skill, by popularity, that the student has not requested yet."""
+        while True:
+            student_id = self.random.choice(self.students)
+            for _ in range(self.SKILL_DRAW_ATTEMPTS):
+                skill = self.random.choices(self.skills, weights=self.skill_weights)[0]
+                if (student_id, skill.id) not in self.requested_pairs:
+                    return student_id, skill
+            remaining = [skill for skill in self.skills if (student_id, skill.id) not in self.requested_pairs]
+            if remaining:
+                return student_id, self.random.choice(remaining)
 
     def create_days(self):
         self.stdout.write('Creating days...')
@@ -274,45 +326,26 @@ class Command(BaseCommand):
         day_names = [
             'Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'
         ]
+        existing = set(Day.objects.values_list('day_name', flat=True))
+        Day.objects.bulk_create([Day(day_name=day_name) for day_name in day_names if day_name not in existing])
 
-        for day_name in day_names:
-                day, created = Day.objects.get_or_create(day_name=day_name)
-                if created:
-                    self.stdout.write(f'Created day: {day_name}')
-                else:
-                    self.stdout.write(f'Day already exists: {day_name}')
-
-
-    def create_enrollments(self):
-        self.stdout.write('Creating enrollments for approved requests...')
-
-        approved_requests = StudentRequest.objects.filter(status='approved')
-        if not approved_requests.exists():
-            self.stdout.write('No approved requests found to create enrollments for.')
-            return
-
+    def create_enrollments(self, approved_requests):
+        """Enroll each approved request with a random tutor who teaches the skill. Returns the number created."""
+        enrollments = []
         for req in approved_requests:
             # Find a tutor who teaches this skill
-            tutor_skills = TutorSkill.objects.filter(skill=req.skill)
-            if not tutor_skills.exists():
-                self.stdout.write(f'No tutors found who teach {req.skill} for request {req.id}. Skipping enrollment.')
+            tutors = self.skill_tutors.get(req.skill_id)
+            if not tutors:
                 continue
 
-            chosen_tutor_skill = random.choice(tutor_skills)
-            tutor = chosen_tutor_skill.tutor
-            start_time = timezone.now() + timedelta(days=random.randint(1, 30), hours=random.randint(0, 23))
-
-            enrollment_data = {
-                'approved_request': req,
-                'current_term': req.first_term,
-                'tutor': tutor,
-                'week_count': random.randint(1,13),
-                'start_time': start_time,
-                'status': 'ongoing'
-            }
-            try:
-                with transaction.atomic():
-                    Enrollment.objects.create(**enrollment_data)
-                    self.stdout.write(f'Created enrollment for request {req.id}')
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error creating enrollment for request {req.id}: {e}'))
\ No newline at end of file
+            start_time = timezone.now() + timedelta(days=self.random.randint(1, 30), hours=self.random.randint(0, 23))
+            enrollments.append(Enrollment(
+                approved_request=req,
+                current_term=req.first_term,
+                tutor_id=self.random.choice(tutors),
+                week_count=self.random.randint(1,13),
+                start_time=start_time,
+                status='ongoing'
+            ))
+        Enrollment.objects.bulk_create(enrollments)
+        return len(enrollments)
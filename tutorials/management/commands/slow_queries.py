@@ -0,0 +1,51 @@
+import json
+from django.core.management.base import BaseCommand
+from tutorials import slow_queries
+
+
+class Command(BaseCommand):
+    """Summarise the slow query log by query shape.
+
+    Each shape is listed with how often it was slow, its p95, maximum and
+    total time and the view that ran it most, the most total time first.
+    """
+    help = "Summarise the slow query log by query shape"
+
+    # Characters of each query shape shown in the table
+    SHAPE_WIDTH = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Slow query log to read, by default SLOW_QUERY_LOG.')
+        parser.add_argument('--limit', type=int, default=20, help='Number of query shapes to list.')
+        parser.add_argument('--view', help='Only count the statements run by this view.')
+        parser.add_argument('--plans', action='store_true', help='Show the full query and plan of each shape.')
+        parser.add_argument('--json', action='store_true', help='Write the summaries as JSON.')
+
+    def handle(self, *args, **options):
+        entries = slow_queries.read_entries(options['log'])
+        if options['view']:
+            entries = [logged for logged in entries if logged['view'] == options['view']]
+        summaries = slow_queries.aggregate(entries)[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(summaries, indent=2))
+            return
+        if not summaries:
+            self.stdout.write("No slow queries logged.")
+            return
+
+        self.stdout.write(f"{'count':>7}{'p95 ms':>10}{'max ms':>10}{'total ms':>11}  {'view':<28}shape")
+        for summary in summaries:
+            view = next(iter(summary['views']))
+            shape = summary['shape']
+            if len(shape) > self.SHAPE_WIDTH:
+                shape = shape[:self.SHAPE_WIDTH - 3] + '...'
+            self.stdout.write(
+                f"{summary['count']:>7}{summary['p95_ms']:>10.1f}{summary['max_ms']:>10.1f}"
+                f"{summary['total_ms']:>11.1f}  {view:<28}{shape}"
+            )
+            if options['plans']:
+                self.stdout.write(f"    {summary['shape']}")
+                self.stdout.write(f"    params: {summary['params']}")
+                for line in summary['plan'] or ['(no plan)']:
+                    self.stdout.write(f"    plan: {line}")
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tutorials import sqlite
+
+
+class Command(BaseCommand):
+    """Measure concurrent read and write throughput of SQLite under each database profile.
+
+    Each profile gets a fresh database file, on which reader threads look up
+    rows while writer threads read and update rows in transactions, as the
+    views do. Errors are operations that failed, such as with "database is
+    locked".
+    """
+    help = "Compare SQLite read and write throughput under the database profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles', nargs='+', default=list(settings.DATABASE_PROFILES),
+            help='Database profiles to compare, the first being the baseline.',
+        )
+        parser.add_argument('--readers', type=int, default=8, help='Number of reading threads.')
+        parser.add_argument('--writers', type=int, default=2, help='Number of writing threads.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds to run each profile for.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the rows read and written.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown database profiles: {', '.join(sorted(unknown))}.")
+
+        results = {}
+        for profile in options['profiles']:
+            self.stdout.write(f"Running {profile} for {options['duration']:g}s...")
+            results[profile] = sqlite.benchmark(
+                profile,
+                readers=options['readers'],
+                writers=options['writers'],
+                duration=options['duration'],
+                seed=options['seed'],
+            )
+
+        self.stdout.write(
+            f"{'profile':<14}{'reads/s':>10}{'read p95':>10}{'read err':>10}"
+            f"{'writes/s':>10}{'write p95':>11}{'write err':>11}"
+        )
+        for profile, result in results.items():
+            reads, writes = result['reads'], result['writes']
+            self.stdout.write(
+                f"{profile:<14}{reads['per_second']:>10.1f}{reads['p95_ms']:>10.2f}{reads['errors']:>10}"
+                f"{writes['per_second']:>10.1f}{writes['p95_ms']:>11.2f}{writes['errors']:>11}"
+            )
+
+        baseline, *others = options['profiles']
+        for profile in others:
+            changes = ', '.join(
+                f"{kind} x{results[profile][kind]['per_second'] / results[baseline][kind]['per_second']:.2f}"
+                for kind in ('reads', 'writes')
+                if results[baseline][kind]['per_second']
+            )
+            self.stdout.write(f"{profile} against {baseline}: {changes or 'no baseline throughput'}")
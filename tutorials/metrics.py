@@ -0,0 +1,312 @@
+"""Request, database, cache and template metrics, shared between worker processes and exposed to Prometheus.
+
+Each process counts into its own in-memory registry and writes it to a
+per-process JSON file in ``METRICS_DIR`` at most every
+``METRICS_FLUSH_INTERVAL`` seconds. The ``/metrics`` view adds up the files of
+every process, so any worker can serve the totals without a metrics server.
+A process that finds a file left under its pid by an earlier process carries
+on from its counts, and the files of processes that have exited are folded
+into the counts of the process collecting them and removed, so no counter
+ever goes down. Moving counts between files is done under a lock on the
+directory that readers share, so none sees them twice or not at all.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.template.backends.base import BaseEngine
+from django.template.backends.django import DjangoTemplates
+from tutorials.tracing import TracedEngine
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where the files of exited processes are kept
+    fcntl = None
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# Upper bounds in seconds of the histogram buckets, as in the Prometheus clients
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_DURATION = 'code_tutors_request_duration_seconds'
+RESPONSES = 'code_tutors_responses_total'
+DB_QUERIES = 'code_tutors_db_queries_total'
+DB_DURATION = 'code_tutors_db_duration_seconds_total'
+CACHE_READS = 'code_tutors_cache_reads_total'
+TEMPLATE_DURATION = 'code_tutors_template_render_seconds'
+
+METRICS = {
+    REQUEST_DURATION: (HISTOGRAM, 'Time to respond to a request, by URL name and method.'),
+    RESPONSES: (COUNTER, 'Responses sent, by URL name and status code.'),
+    DB_QUERIES: (COUNTER, 'SQL queries run by requests, by URL name.'),
+    DB_DURATION: (COUNTER, 'Time spent running the SQL queries of requests, by URL name.'),
+    CACHE_READS: (COUNTER, 'Cached reads, by name, cache tier and outcome.'),
+    TEMPLATE_DURATION: (HISTOGRAM, 'Time to render a template, by template name.'),
+}
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """The counters and histograms of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._resumed = False
+        self.counters = {}
+        self.histograms = {}
+
+    def reset(self):
+        """Forget every count, and any file of an earlier process with this pid."""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self._resumed = True
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, labels_key(labels))
+        bucket = next((index for index, bound in enumerate(BUCKETS) if value <= bound), len(BUCKETS))
+        with self._lock:
+            counts, total = self.histograms.get(key, ([0] * (len(BUCKETS) + 1), 0.0))
+            counts[bucket] += 1
+            self.histograms[key] = (counts, total + value)
+
+    def snapshot(self):
+        """Return the counts as a JSON-serialisable dict."""
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, dict(labels), list(counts), total]
+                    for (name, labels), (counts, total) in self.histograms.items()
+                ],
+            }
+
+    def merge(self, snapshot):
+        """Add the counts of a snapshot to this registry."""
+        for name, labels, value in snapshot['counters']:
+            self.inc(name, value, **labels)
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, labels_key(labels))
+            with self._lock:
+                own, own_total = self.histograms.get(key, ([0] * (len(BUCKETS) + 1), 0.0))
+                self.histograms[key] = ([a + b for a, b in zip(own, counts)], own_total + total)
+
+    def flush(self):
+        """Write the counts to this process's file."""
+        with self._flush_lock:
+            path = process_file()
+            if not self._resumed:
+                self._resumed = True
+                with directory_lock():
+                    previous = read_snapshot(path)
+                if previous is not None:
+                    self.merge(previous)
+            write_snapshot(path, self.snapshot())
+            self._last_flush = time.monotonic()
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def metrics_dir():
+    return Path(settings.METRICS_DIR)
+
+
+def process_file():
+    return metrics_dir() / f'{os.getpid()}.json'
+
+
+def read_snapshot(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    """Replace the file at ``path`` with a snapshot as JSON, in one step even when other threads write it too."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=path.parent, prefix=f'{path.name}.', suffix='.tmp', delete=False) as file:
+        json.dump(snapshot, file)
+    os.replace(file.name, path)
+
+
+@contextmanager
+def directory_lock(shared=False):
+    """Hold the lock on METRICS_DIR, shared to read the files or exclusive to move counts between them."""
+    if fcntl is None:
+        yield
+        return
+    directory = metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / 'lock', 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def process_exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # Running as another user
+        return False
+    return False
+
+
+def retire_exited_processes():
+    """Fold the files of processes that have exited into this process's counts, and remove them."""
+    if fcntl is None:
+        return
+    exited = [
+        path for path in metrics_dir().glob('*.json')
+        if path.stem.isdigit() and int(path.stem) != os.getpid() and process_exited(int(path.stem))
+    ]
+    if not exited:
+        return
+    with directory_lock():
+        retired = []
+        for path in exited:
+            # Checked again under the lock, as a new process given the same pid resumes from the file under it
+            snapshot = read_snapshot(path)
+            if snapshot is not None and process_exited(int(path.stem)):
+                registry.merge(snapshot)
+                retired.append(path)
+        if retired:
+            registry.flush()
+            for path in retired:
+                path.unlink(missing_ok=True)
+
+
+def collect():
+    """Return a registry of the counts of every process, this one's as of now."""
+    registry.flush()
+    retire_exited_processes()
+    total = Registry()
+    with directory_lock(shared=True):
+        for path in sorted(metrics_dir().glob('*.json')):
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                total.merge(snapshot)
+    return total
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def exposition(collected):
+    """Return the counts of a registry in the Prometheus text format."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == COUNTER:
+            for (metric, labels), value in sorted(collected.counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            continue
+        for (metric, labels), (counts, total) in sorted(collected.histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels((*labels, ("le", str(bound))))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _flush_at_exit():
+    if registry.counters or registry.histograms:
+        try:
+            registry.flush()
+        except Exception:
+            # Settings may be gone as the interpreter shuts down
+            pass
+
+
+atexit.register(_flush_at_exit)
+
+
+class TimedTemplate:
+    """A template of the Django backend whose renders are timed."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            name = self.template.origin.template_name or '<string>'
+            observe(TEMPLATE_DURATION, time.perf_counter() - started, template=name)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, recording how long each page's template takes to render.
+
+    Its engine is a TracedEngine, so templates rendered while a request is
+    traced, including those they include, are also spans of the trace.
+    """
+
+    def __init__(self, params):
+        # As DjangoTemplates.__init__, which has no way to choose the engine class
+        params = params.copy()
+        options = params.pop('OPTIONS').copy()
+        options.setdefault('autoescape', True)
+        options.setdefault('debug', settings.DEBUG)
+        options.setdefault('file_charset', 'utf-8')
+        options['libraries'] = self.get_templatetag_libraries(options.get('libraries', {}))
+        BaseEngine.__init__(self, params)
+        self.engine = TracedEngine(self.dirs, self.app_dirs, **options)
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
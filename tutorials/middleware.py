@@ -0,0 +1,390 @@
+"""Middleware for the tutorials app."""
+import logging
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+from tutorials import metrics, profiling, slow_queries, tracing
+from tutorials.structured_logging import request_context
+from tutorials.models import UserType
+
+logger = logging.getLogger('tutorials.sql')
+access_logger = logging.getLogger('tutorials.access')
+
+# Lists of IN (...) placeholders vary in length with the number of values
+IN_LIST_PATTERN = re.compile(r'IN \((?:%s, )*%s\)')
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+# How many of a request's most repeated query shapes are logged
+LOGGED_SHAPES = 5
+
+# The URL name given to requests that match no URL
+UNMATCHED = '<unmatched>'
+
+# Request ids passed in by a proxy are used only if they look like one
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RepeatedQueryError(Exception):
+    """Raised in strict mode when one request runs the same query shape too many times."""
+
+
+def query_shape(sql):
+    """Return the SQL with whitespace and IN lists normalised, so repeats of one query compare equal."""
+    return IN_LIST_PATTERN.sub('IN (...)', ' '.join(sql.split()))
+
+
+class QueryStats:
+    """Execute wrapper that counts the queries, database time and query shapes of one request.
+
+    With a ``limit``, running any one shape more often raises RepeatedQueryError.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        shape = query_shape(sql)
+        self.shapes[shape] += 1
+        if self.limit is not None and self.shapes[shape] > self.limit:
+            raise RepeatedQueryError(
+                f"Query run {self.shapes[shape]} times in one request, more than the limit of {self.limit}: {shape}"
+            )
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+    def repeated(self, top=None):
+        """Return {shape: runs} for the shapes run more than once, most repeated first."""
+        return {shape: runs for shape, runs in self.shapes.most_common(top) if runs > 1}
+
+
+def trace_query(execute, sql, params, many, context):
+    """Execute wrapper running each statement in a span of the trace being recorded, if there is one.
+
+    The statement is kept as it ran; ``shape_statements`` normalises it once the trace is to be exported.
+    """
+    if tracing.current_trace.get() is None:
+        return execute(sql, params, many, context)
+    with tracing.span(
+        f"db {sql.split(None, 1)[0].upper()}",
+        tracing.SPAN_KIND_CLIENT,
+        **{'db.system': context['connection'].vendor, 'db.statement': sql},
+    ):
+        return execute(sql, params, many, context)
+
+
+def install_query_tracing(connection, **kwargs):
+    """Trace the statements run through a database connection while a request is recorded.
+
+    The wrapper stays installed, rather than being added around each recorded
+    request, as that would cost every request recorded for tail sampling.
+    """
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+def shape_statements(trace):
+    """Replace the statements in the query spans of a trace by their shapes."""
+    for each in trace.spans:
+        if 'db.statement' in each.attributes:
+            each.attributes['db.statement'] = query_shape(each.attributes['db.statement'])
+
+
+def view_label(request):
+    """Return the name of the view serving a request, as its class and method or its function, or None."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None)
+    if view_class is not None:
+        return f'{view_class.__name__}.{request.method.lower()}'
+    return match.func.__name__
+
+
+def traced_view(handler):
+    """Wrap the handler that resolves the URL and calls the view in a span named after the view."""
+    def call(request):
+        with tracing.span('view') as opened:
+            try:
+                return handler(request)
+            finally:
+                if opened is not None:
+                    opened.name = view_label(request) or opened.name
+    return call
+
+
+class TracingMiddleware:
+    """Record traces of a sample of requests, and of every slow one.
+
+    ``TRACE_SAMPLE_RATE`` of the requests are chosen to be traced as they
+    arrive. While ``TRACE_SLOW_MS`` is set every other request is recorded
+    too, but only exported if it took at least that long, so no slow request
+    goes unexplained. Being first, it wraps each middleware after it and the
+    view in spans of their own: Django wraps every middleware in
+    convert_exception_to_response, which leaves it as ``__wrapped__``, and the
+    handler at the end of the chain calls the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        owner = self
+        while True:
+            handler = owner.get_response
+            inner = getattr(handler, '__wrapped__', None)
+            if not hasattr(inner, 'get_response'):
+                owner.get_response = traced_view(handler)
+                break
+            owner.get_response = tracing.traced(f'middleware {type(inner).__name__}', handler)
+            owner = inner
+
+    def __call__(self, request):
+        head = random.random() < settings.TRACE_SAMPLE_RATE
+        slow_ms = settings.TRACE_SLOW_MS
+        if not head and slow_ms is None:
+            return self.get_response(request)
+
+        trace = tracing.Trace()
+        token = tracing.current_trace.set(trace)
+        try:
+            with tracing.span(request.method, tracing.SPAN_KIND_SERVER) as root:
+                response = self.get_response(request)
+        finally:
+            tracing.current_trace.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            root.name = f'{request.method} {match.route}'
+        root.error = response.status_code >= 500
+        root.attributes.update({
+            'http.request.method': request.method,
+            'url.path': request.path,
+            'http.route': match.route if match is not None else None,
+            'http.response.status_code': response.status_code,
+            'request.id': response.get('X-Request-ID'),
+        })
+        if head or root.duration_ms >= slow_ms:
+            shape_statements(trace)
+            tracing.export(trace)
+        return response
+
+
+class AccessLogMiddleware:
+    """Give each request a correlation id and log it to the access log once it is answered.
+
+    The id is taken from an ``X-Request-ID`` header set by a proxy, or made
+    up, and returned in the response's own ``X-Request-ID``. It is put in
+    ``request_context`` with the user and view, once they are known, so every
+    line logged while serving the request carries them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        context = {'request_id': request_id, 'user_id': None, 'role': None, 'view': UNMATCHED}
+        token = request_context.set(context)
+        try:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            response['X-Request-ID'] = request_id
+            access_logger.info(
+                f"{request.method} {request.path} {response.status_code}",
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
+            return response
+        finally:
+            request_context.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = request_context.get()
+        context['view'] = request.resolver_match.view_name
+        user = request.user
+        if user.is_authenticated:
+            context['user_id'] = user.pk
+            context['role'] = user.user_type
+
+
+class MetricsMiddleware:
+    """Count each request's latency and status, and the queries counted by QueryInstrumentationMiddleware.
+
+    Requests are labelled with their URL name rather than their path, so the
+    number of series stays fixed. It comes after TracingMiddleware and
+    AccessLogMiddleware, so its latency covers the rest of the middleware and
+    the view, but not the time those two take to trace and log the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else UNMATCHED
+        metrics.observe(metrics.REQUEST_DURATION, duration, view=view, method=request.method)
+        metrics.inc(metrics.RESPONSES, view=view, status=str(response.status_code))
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.inc(metrics.DB_QUERIES, stats.count, view=view)
+            metrics.inc(metrics.DB_DURATION, stats.duration, view=view)
+        metrics.registry.flush_if_due()
+        return response
+
+
+class SlowQueryLog:
+    """Execute wrapper that collects the statements slower than ``threshold`` seconds, with their plans.
+
+    The view is read from the request as each slow statement finishes, so
+    statements run before the URL is resolved are put down to the path.
+    """
+
+    def __init__(self, threshold, request):
+        self.threshold = threshold
+        self.request = request
+        self.entries = []
+
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match is not None else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            plan = None if many else slow_queries.explain(context['connection'], sql, params)
+            self.entries.append(slow_queries.entry(query_shape(sql), params, duration, self.view(), plan))
+        return result
+
+
+class SlowQueryMiddleware:
+    """Log the statements slower than ``SLOW_QUERY_THRESHOLD_MS`` to the slow query log.
+
+    It comes just before QueryInstrumentationMiddleware, so its execute
+    wrapper is outside the one that times the request's queries, and reading
+    a query plan does not add to the reported database time. The entries are
+    written once the response is ready.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is None:
+            return self.get_response(request)
+
+        log = SlowQueryLog(threshold / 1000, request)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(log))
+                return self.get_response(request)
+        finally:
+            if log.entries:
+                slow_queries.append_entries(log.entries)
+
+
+class QueryInstrumentationMiddleware:
+    """Measure the SQL each request runs.
+
+    The query count and database time are sent in a Server-Timing header and
+    logged with the most repeated query shapes as fields of a line on the
+    ``tutorials.sql`` logger, and left on the request as ``query_stats`` for
+    MetricsMiddleware. When ``SQL_STRICT`` is set, a request that runs
+    one query shape more than ``SQL_REPEATED_QUERY_LIMIT`` times fails with
+    RepeatedQueryError, which turns N+1 query patterns into test failures.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        strict = getattr(settings, 'SQL_STRICT', False)
+        stats = QueryStats(limit=settings.SQL_REPEATED_QUERY_LIMIT if strict else None)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            request.query_stats = stats
+            response = self.get_response(request)
+
+        duration_ms = stats.duration * 1000
+        response['Server-Timing'] = f'db;dur={duration_ms:.2f};desc="{stats.count} queries"'
+        logger.info(
+            f"{request.method} {request.path}: {stats.count} queries in {duration_ms:.2f}ms",
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': round(duration_ms, 2),
+                'repeated': stats.repeated(LOGGED_SHAPES),
+            },
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile the requests admins ask for, and a random sample of all requests.
+
+    An admin asks for a profile with a ``profile`` query parameter or an
+    ``X-Profile`` header, set to ``cprofile`` (the default) or ``sample``; the
+    response's ``X-Profile-URL`` header links to the stored profile. Requests
+    from anyone else ignore both. ``PROFILE_SAMPLE_RATE`` of all requests are
+    profiled with the stack sampler, which costs too little to notice at a
+    low rate. Being after AuthenticationMiddleware, it profiles the view with
+    its queries and templates.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def requested_mode(self, request):
+        """Return the profiling mode an admin asked for, or None."""
+        mode = request.GET.get('profile') or request.headers.get('X-Profile')
+        if not mode:
+            return None
+        user = request.user
+        if not user.is_authenticated or user.user_type != UserType.ADMIN:
+            return None
+        return mode if mode in profiling.MODES else profiling.CPROFILE
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        sampled = mode is None and random.random() < settings.PROFILE_SAMPLE_RATE
+        if sampled:
+            mode = profiling.SAMPLE
+        if mode is None:
+            return self.get_response(request)
+
+        with profiling.Capture(mode) as capture:
+            response = self.get_response(request)
+        profile_id = profiling.save_profile(capture, request, response, sampled)
+        if not sampled:
+            response['X-Profile-URL'] = reverse('request_profile', args=[profile_id])
+        return response
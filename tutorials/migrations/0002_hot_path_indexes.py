@@ -0,0 +1,62 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tutorials', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['created_at'], name='enrollment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['status', 'created_at'], name='enrollment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendingtutor',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['id'], name='pending_tutor_unapproved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentrequest',
+            index=models.Index(fields=['created_at'], name='request_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentrequest',
+            index=models.Index(fields=['duration'], name='request_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentrequest',
+            index=models.Index(fields=['status', 'created_at'], name='request_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='request_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at'], name='ticket_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status', 'created_at'], name='ticket_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'Pending')), fields=['created_at'], name='ticket_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'last_name', 'first_name'], name='user_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'is_active', 'last_name', 'first_name'], name='user_type_active_name_idx'),
+        ),
+    ]
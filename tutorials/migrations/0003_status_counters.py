@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:23
+
+import tutorials.models.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_rows(apps, schema_editor):
+    """Fill the counters from the rows already in the database."""
+    StatusCount = apps.get_model('tutorials', 'StatusCount')
+    labels = {
+        'studentrequest': ('status',),
+        'enrollment': ('status',),
+        'pendingtutor': ('is_approved',),
+        'user': ('user_type', 'is_active'),
+    }
+    for model_name, fields in labels.items():
+        model = apps.get_model('tutorials', model_name)
+        for *values, count in model.objects.order_by().values_list(*fields).annotate(rows=Count('pk')):
+            if model_name == 'user':
+                status = values[0] if values[1] else f'{values[0]}:inactive'
+            elif model_name == 'pendingtutor':
+                status = 'approved' if values[0] else 'pending'
+            else:
+                status = values[0]
+            StatusCount.objects.create(entity=f'tutorials.{model_name}', status=status, count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorials', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', tutorials.models.models.StatusCountedUserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entity', 'status'), name='unique_entity_status')],
+            },
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
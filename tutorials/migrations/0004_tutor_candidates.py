@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def index_existing_tutor_skills(apps, schema_editor):
+    """Fill the candidate index from the tutor skills already in the database."""
+    TutorCandidate = apps.get_model('tutorials', 'TutorCandidate')
+    TutorSkill = apps.get_model('tutorials', 'TutorSkill')
+    Enrollment = apps.get_model('tutorials', 'Enrollment')
+    ongoing = dict(
+        Enrollment.objects.filter(status='ongoing').order_by().values_list('tutor_id').annotate(rows=Count('pk'))
+    )
+    TutorCandidate.objects.bulk_create(
+        [
+            TutorCandidate(
+                skill_id=skill_id,
+                tutor_id=tutor_id,
+                price_per_hour=price_per_hour,
+                ongoing_enrollments=ongoing.get(tutor_id, 0),
+            )
+            for skill_id, tutor_id, price_per_hour in TutorSkill.objects.values_list('skill_id', 'tutor_id', 'price_per_hour')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorials', '0003_status_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TutorCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_per_hour', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('ongoing_enrollments', models.IntegerField(default=0)),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='tutorials.skill')),
+                ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidacies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['skill', 'ongoing_enrollments', 'price_per_hour'], name='candidate_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('skill', 'tutor'), name='unique_candidate_skill_tutor')],
+            },
+        ),
+        migrations.RunPython(index_existing_tutor_skills, migrations.RunPython.noop),
+    ]
@@ -15,3 +15,5 @@ from .models import Invoice
 from .models import PendingTutor
 from .models import Ticket
 from .models import TicketStatus
+from .counters import StatusCount
+from .candidates import TutorCandidate
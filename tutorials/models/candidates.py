@@ -0,0 +1,113 @@
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import User, UserType, Skill, TutorSkill, Enrollment, EnrollmentDays
+
+
+class TutorCandidateQuerySet(models.QuerySet):
+    """QuerySet for ranking the tutors who could teach a lesson request."""
+
+    def for_request(self, lesson_request):
+        """Return the tutors offering the requested skill, best candidates first.
+
+        Candidates are ranked by how many ongoing lessons they teach, then by
+        their price for the skill, which ``candidate_rank_idx`` returns in
+        order. Each is annotated with ``clashing_days``, the number of their
+        ongoing lessons on the days of this request's own lessons; only a
+        request that already has a tutor has days, so it just breaks ties
+        when the tutor is being changed.
+        """
+        requested_days = EnrollmentDays.objects.filter(
+            enrollment__approved_request=lesson_request,
+        ).values('day_name')
+        clashes = EnrollmentDays.objects.filter(
+            enrollment__tutor=OuterRef('tutor'),
+            enrollment__status='ongoing',
+            day_name__in=requested_days,
+        ).exclude(
+            enrollment__approved_request=lesson_request,
+        ).order_by().values('enrollment__tutor').annotate(clashes=Count('pk')).values('clashes')
+        return self.filter(
+            skill_id=lesson_request.skill_id,
+            tutor__user_type=UserType.TUTOR,
+        ).annotate(
+            clashing_days=Coalesce(Subquery(clashes), Value(0)),
+        ).select_related('tutor').order_by(
+            'ongoing_enrollments', 'price_per_hour', 'clashing_days', 'tutor__last_name', 'tutor__first_name', 'tutor_id',
+        )
+
+
+class TutorCandidate(models.Model):
+    """Precomputed skill -> tutor index used to rank tutors for lesson requests.
+
+    There is one row per TutorSkill, carrying the tutor's price for the skill
+    and their number of ongoing enrollments. Rows are kept current by the
+    signal handlers in ``tutorials.signals``; ``rebuild`` repopulates the
+    index after bulk writes that bypass them.
+    """
+
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='candidates')
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='candidacies')
+    price_per_hour = models.DecimalField(max_digits=6, decimal_places=2)
+    ongoing_enrollments = models.IntegerField(default=0)
+
+    objects = TutorCandidateQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['skill', 'tutor'], name='unique_candidate_skill_tutor')
+        ]
+        indexes = [
+            models.Index(fields=['skill', 'ongoing_enrollments', 'price_per_hour'], name='candidate_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tutor} for {self.skill}"
+
+    @staticmethod
+    def ongoing_counts(tutor_ids=None):
+        """Return {tutor_id: number of ongoing enrollments}, for all or the given tutors."""
+        enrollments = Enrollment.objects.filter(status='ongoing')
+        if tutor_ids is not None:
+            enrollments = enrollments.filter(tutor_id__in=tutor_ids)
+        return dict(enrollments.order_by().values_list('tutor_id').annotate(ongoing=Count('pk')))
+
+    @classmethod
+    def refresh_tutor_skill(cls, tutor_skill, moved_from=None):
+        """Add or update the index row of a tutor's skill, removing that of the (tutor, skill) it was ``moved_from``."""
+        if moved_from is not None:
+            tutor_id, skill_id = moved_from
+            cls.objects.filter(tutor_id=tutor_id, skill_id=skill_id).delete()
+        ongoing = cls.ongoing_counts([tutor_skill.tutor_id]).get(tutor_skill.tutor_id, 0)
+        cls.objects.update_or_create(
+            skill_id=tutor_skill.skill_id,
+            tutor_id=tutor_skill.tutor_id,
+            defaults={'price_per_hour': tutor_skill.price_per_hour, 'ongoing_enrollments': ongoing},
+        )
+
+    @classmethod
+    def refresh_loads(cls, tutor_ids):
+        """Update the ongoing enrollment count of the given tutors' index rows."""
+        tutor_ids = set(tutor_ids)
+        counts = cls.ongoing_counts(tutor_ids)
+        for tutor_id in tutor_ids:
+            cls.objects.filter(tutor_id=tutor_id).update(ongoing_enrollments=counts.get(tutor_id, 0))
+
+    @classmethod
+    def rebuild(cls):
+        """Repopulate the whole index from TutorSkill and Enrollment."""
+        counts = cls.ongoing_counts()
+        cls.objects.all().delete()
+        cls.objects.bulk_create(
+            (
+                cls(
+                    skill_id=skill_id,
+                    tutor_id=tutor_id,
+                    price_per_hour=price_per_hour,
+                    ongoing_enrollments=counts.get(tutor_id, 0),
+                )
+                for skill_id, tutor_id, price_per_hour in
+                TutorSkill.objects.values_list('skill_id', 'tutor_id', 'price_per_hour').iterator()
+            ),
+            batch_size=1000,
+        )
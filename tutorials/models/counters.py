@@ -0,0 +1,168 @@
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import Count, F
+from tutorials.query_cache import CachingQuerySet
+
+
+class StatusCount(models.Model):
+    """Running number of rows per (entity, status), kept in step with the rows themselves."""
+
+    entity = models.CharField(max_length=100)
+    status = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity', 'status'], name='unique_entity_status')
+        ]
+
+    def __str__(self):
+        return f"{self.entity}[{self.status}] = {self.count}"
+
+    @classmethod
+    def adjust(cls, model, deltas):
+        """Apply a mapping of status -> change in row count for a counted model."""
+        entity = model._meta.label_lower
+        for status, delta in deltas.items():
+            if not delta:
+                continue
+            updated = cls.objects.filter(entity=entity, status=status).update(count=F('count') + delta)
+            if not updated:
+                cls.objects.get_or_create(entity=entity, status=status)
+                cls.objects.filter(entity=entity, status=status).update(count=F('count') + delta)
+
+    @classmethod
+    def get_counts(cls, *models):
+        """Return {model: Counter(status -> rows)} for the given models in a single query."""
+        entities = {model._meta.label_lower: model for model in models}
+        counts = {model: Counter() for model in models}
+        for entity, status, count in cls.objects.filter(entity__in=entities).values_list('entity', 'status', 'count'):
+            counts[entities[entity]][status] = count
+        return counts
+
+    @classmethod
+    def tally(cls, model):
+        """Count the rows of a counted model per status straight from its table."""
+        fields = model.counter_fields
+        totals = Counter()
+        groups = model._base_manager.order_by().values_list(*fields).annotate(rows=Count('pk'))
+        for *values, count in groups:
+            totals[model.counter_key(dict(zip(fields, values)))] += count
+        return totals
+
+    @classmethod
+    def recount(cls, model):
+        """Rebuild the counters of a model from its table. Returns the corrected counts."""
+        entity = model._meta.label_lower
+        totals = cls.tally(model)
+        with transaction.atomic(savepoint=False):
+            cls.objects.filter(entity=entity).delete()
+            cls.objects.bulk_create(
+                cls(entity=entity, status=status, count=count) for status, count in totals.items() if count
+            )
+        return totals
+
+
+class StatusCountedQuerySet(CachingQuerySet):
+    """QuerySet whose bulk writes keep StatusCount in step within the same transaction."""
+
+    def _counter_changes(self, values):
+        return {field: values[field] for field in self.model.counter_fields if field in values}
+
+    def update(self, **kwargs):
+        changes = self._counter_changes(kwargs)
+        if not changes:
+            return super().update(**kwargs)
+
+        fields = self.model.counter_fields
+        with transaction.atomic(using=self.db, savepoint=False):
+            if any(hasattr(value, 'resolve_expression') for value in changes.values()):
+                # The new values are only known to the database; count again afterwards
+                rows = super().update(**kwargs)
+                StatusCount.recount(self.model)
+                return rows
+
+            deltas = Counter()
+            groups = self.order_by().values_list(*fields).annotate(rows=Count('pk'))
+            for *values, count in groups:
+                before = dict(zip(fields, values))
+                deltas[self.model.counter_key(before)] -= count
+                deltas[self.model.counter_key({**before, **changes})] += count
+            rows = super().update(**kwargs)
+            StatusCount.adjust(self.model, deltas)
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # Some rows may not have been inserted
+                StatusCount.recount(self.model)
+            else:
+                StatusCount.adjust(self.model, Counter(obj.get_counter_key() for obj in objs))
+        for obj in objs:
+            obj._counted_key = obj.get_counter_key()
+        return objs
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if not set(fields) & set(self.model.counter_fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            # A plain QuerySet, so the UPDATE issued by bulk_update() isn't counted twice
+            plain = models.QuerySet(self.model, using=self.db)
+            rows = plain.bulk_update(objs, fields, *args, **kwargs)
+            if all(hasattr(obj, '_counted_key') for obj in objs):
+                deltas = Counter()
+                for obj in objs:
+                    deltas[obj._counted_key] -= 1
+                    deltas[obj.get_counter_key()] += 1
+                StatusCount.adjust(self.model, deltas)
+            else:
+                StatusCount.recount(self.model)
+        for obj in objs:
+            obj._counted_key = obj.get_counter_key()
+        return rows
+
+    bulk_update.alters_data = True
+
+
+class StatusCountedModel(models.Model):
+    """Abstract base for models whose rows are tallied per status in StatusCount.
+
+    Subclasses name the fields that make up the status in ``counter_fields``
+    and may override ``counter_key`` to turn those values into a status label.
+    Single-row saves and deletes are counted by the signal handlers in
+    ``tutorials.signals``; bulk writes by StatusCountedQuerySet.
+    """
+
+    counter_fields = ('status',)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def counter_key(cls, values):
+        """Return the status label for a mapping of counter field values."""
+        return str(values[cls.counter_fields[0]])
+
+    def get_counter_key(self):
+        return self.counter_key({field: getattr(self, field) for field in self.counter_fields})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not set(cls.counter_fields) & instance.get_deferred_fields():
+            instance._counted_key = instance.get_counter_key()
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save the row and its counter change in one transaction."""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
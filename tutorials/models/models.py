@@ -1,10 +1,14 @@
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import F, Q, Case, When, Value, ExpressionWrapper, OuterRef, Subquery, FilteredRelation, Func
+from django.db.models.functions import Cast, Coalesce, Round
 from django.utils import timezone
 from libgravatar import Gravatar
 from django.core.exceptions import ValidationError
+from tutorials.query_cache import CachingQuerySet
+from .counters import StatusCountedModel, StatusCountedQuerySet
 
 class UserType(models.TextChoices):
     TUTOR = 'Tutor', 'Tutor'
@@ -12,9 +16,15 @@ class UserType(models.TextChoices):
     STUDENT = 'Student', 'Student'
     PENDING = 'Pending', 'Pending'
 
-class User(AbstractUser):
+class StatusCountedUserManager(UserManager.from_queryset(StatusCountedQuerySet)):
+    """User manager whose bulk writes keep the per-type user counters up to date."""
+
+
+class User(StatusCountedModel, AbstractUser):
     """Model used for user authentication, and team member related information."""
 
+    counter_fields = ('user_type', 'is_active')
+
     username = models.CharField(
         max_length=30,
         unique=True,
@@ -39,9 +49,22 @@ class User(AbstractUser):
         help_text='Select the type of user.'
     )
 
+    objects = StatusCountedUserManager()
+
     class Meta:
         """Model options."""
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['user_type', 'last_name', 'first_name'], name='user_type_name_idx'),
+            models.Index(fields=['user_type', 'is_active', 'last_name', 'first_name'], name='user_type_active_name_idx'),
+        ]
+
+    @classmethod
+    def counter_key(cls, values):
+        """Count users by type, with inactive users under a separate label."""
+        if values['is_active']:
+            return str(values['user_type'])
+        return f"{values['user_type']}:inactive"
 
     def full_name(self):
         """Return a string containing the user's full name."""
@@ -68,6 +91,8 @@ class Skill(models.Model):
     language = models.CharField(max_length=150, blank=False)
     level = models.CharField(max_length=15, choices=SkillLevel.choices)
 
+    objects = CachingQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.language} ({self.level})"
 
@@ -107,10 +132,22 @@ class Frequency(models.TextChoices):
     WEEKLY = 'weekly'
     BI_WEEKLY = 'bi-weekly'
 
+# Lessons per week for each frequency, used when pricing invoices
+FREQUENCY_FACTORS = {
+    Frequency.WEEKLY: Decimal('1'),
+    Frequency.BI_WEEKLY: Decimal('0.5'),
+}
+
+# Subtotals are exact to this many decimal places, both in Python and in SQL
+SUBTOTAL_PLACES = 6
+
+# Frequency factors are whole multiples of 1 / FACTOR_DENOMINATOR, so SQL can price in integers
+FACTOR_DENOMINATOR = 2
+
 class Day(models.Model):
     day_name = models.CharField(max_length=20)
 
-class StudentRequest(models.Model):
+class StudentRequest(StatusCountedModel):
     student = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -129,7 +166,21 @@ class StudentRequest(models.Model):
         default='pending',
     )
 
-class Enrollment(models.Model):
+    objects = StatusCountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='request_created_idx'),
+            models.Index(fields=['duration'], name='request_duration_idx'),
+            models.Index(fields=['status', 'created_at'], name='request_status_created_idx'),
+            models.Index(
+                fields=['created_at'],
+                name='request_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+class Enrollment(StatusCountedModel):
     approved_request = models.ForeignKey(StudentRequest, on_delete=models.CASCADE, related_name='enrollments')
     current_term = models.CharField(max_length=60, choices=Term.choices)
     tutor =models.ForeignKey(
@@ -144,6 +195,14 @@ class Enrollment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at =  models.DateTimeField(auto_now=True)
 
+    objects = StatusCountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='enrollment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='enrollment_status_created_idx'),
+        ]
+
 
 class EnrollmentDays(models.Model):
     day_name =  models.ForeignKey(Day, on_delete=models.CASCADE, related_name='enrollments')
@@ -154,6 +213,96 @@ class EnrollmentDays(models.Model):
             models.UniqueConstraint(fields=['day_name', 'enrollment'], name='unique_day_enrollment')
         ]
 
+class SubtotalUnits(Func):
+    """An integer count of SUBTOTAL_PLACES units, read back as the Decimal amount it stands for."""
+
+    template = '%(expressions)s'
+    output_field = models.DecimalField(max_digits=20, decimal_places=SUBTOTAL_PLACES)
+
+    def convert_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(int(value)).scaleb(-SUBTOTAL_PLACES)
+
+
+class InvoiceQuerySet(models.QuerySet):
+    """QuerySet for invoices, with set-based pricing and batch recomputation of the stored amounts."""
+
+    def with_subtotal(self):
+        """Annotate each invoice with its ``subtotal_amount``, calculated in the same statement.
+
+        The tutor's price is LEFT JOINed on (tutor, skill), so invoices without
+        a price, like those with an unknown frequency, get a subtotal of 0. The
+        arithmetic is all in integers, with the price in pence and the
+        frequency factor in halves, down to a whole number of SUBTOTAL_PLACES
+        units rounded half up, so no float rounding gets in. In SQL the
+        annotation is that number of units; it is read back as the exact
+        Decimal subtotal.
+        """
+        return self._with_pricing_tutor_skill().annotate(
+            subtotal_amount=SubtotalUnits(Coalesce(self._rounded_units(SUBTOTAL_PLACES), Value(0))),
+        )
+
+    def _with_pricing_tutor_skill(self):
+        """Join each invoice to the tutor's price for the requested skill, if there is one."""
+        return self.annotate(
+            pricing_tutor_skill=FilteredRelation(
+                'enrollment__tutor__skills',
+                condition=Q(enrollment__tutor__skills__skill=F('enrollment__approved_request__skill')),
+            ),
+        )
+
+    @staticmethod
+    def _rounded_units(places):
+        """The amount as a whole number of ``places`` decimal units, rounded half up, for rows joined to their price."""
+        factor = Case(
+            *[When(enrollment__approved_request__frequency=frequency, then=Value(int(value * FACTOR_DENOMINATOR)))
+              for frequency, value in FREQUENCY_FACTORS.items()],
+            default=Value(0),
+        )
+        pence = Cast(Round(F('pricing_tutor_skill__price_per_hour') * 100), models.IntegerField())
+        numerator = ExpressionWrapper(
+            F('enrollment__week_count') * factor * F('enrollment__approved_request__duration') * pence,
+            output_field=models.IntegerField(),
+        )
+        # Pounds are numerator / divisor; SQL integer division floors, so half the divisor is added to round half up
+        divisor = FACTOR_DENOMINATOR * 60 * 100
+        return ExpressionWrapper(
+            (numerator * 10 ** places + divisor // 2) / divisor,
+            output_field=models.IntegerField(),
+        )
+
+    def recompute_amounts(self, batch_size=None):
+        """Recalculate and store the amount of every invoice in the queryset.
+
+        One UPDATE sets the amounts from a correlated subquery, rounded to
+        pence in integers like ``with_subtotal()``, writing only those that
+        changed; with a ``batch_size`` there is one per batch of primary keys,
+        so no statement holds the write lock for long. Returns the number of
+        invoices whose amount changed.
+        """
+        pence = Invoice.objects.filter(pk=OuterRef('pk'))._with_pricing_tutor_skill().values(
+            pence=Coalesce(self._rounded_units(2), Value(0)),
+        )
+        amount = Cast(
+            Cast(Subquery(pence), models.FloatField()) / 100,
+            models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        if batch_size is None:
+            return self.exclude(amount=amount).update(amount=amount)
+        queryset = self.order_by('pk').values_list('pk', flat=True)
+        changed_count = 0
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not pks:
+                return changed_count
+            changed_count += Invoice.objects.filter(pk__in=pks).exclude(amount=amount).update(amount=amount)
+            last_pk = pks[-1]
+
+    recompute_amounts.alters_data = True
+
+
 class Invoice(models.Model):
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='invoice')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -161,20 +310,43 @@ class Invoice(models.Model):
     payment_status = models.CharField(max_length=50, choices=[('paid', 'Paid'), ('unpaid', 'Unpaid')])
     due_date = models.DateTimeField()
 
+    objects = InvoiceQuerySet.as_manager()
+
+    @staticmethod
+    def calculate_price(week_count, frequency, duration, price_per_hour):
+        """Return the invoiced amount, rounded to pence, for the given pricing inputs."""
+        factor = FREQUENCY_FACTORS.get(frequency)
+        if factor is None or price_per_hour is None:
+            return Decimal('0.00')
+        amount = Decimal(week_count) * factor * Decimal(duration) / Decimal('60') * Decimal(price_per_hour)
+        return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def calculate_amount(self):
+        """Calculate the amount of this invoice from its enrollment and the tutor's price."""
+        enrollment = self.enrollment
+        request = enrollment.approved_request
+        price_per_hour = TutorSkill.objects.filter(
+            tutor_id=enrollment.tutor_id,
+            skill_id=request.skill_id,
+        ).values_list('price_per_hour', flat=True).first()
+        return self.calculate_price(enrollment.week_count, request.frequency, request.duration, price_per_hour)
+
 
     @property
     def subtotal(self):
+        """Calculate the amount to SUBTOTAL_PLACES live from the related rows. Prefer the stored amount.
+
+        For many invoices use ``Invoice.objects.with_subtotal()``, which gives the same values.
+        """
         try:
             week_count = self.enrollment.week_count
             frequency = self.enrollment.approved_request.frequency
             duration = self.enrollment.approved_request.duration
             tutor_skill = self.enrollment.tutor.skills.get(skill=self.enrollment.approved_request.skill)
             price_per_hour = tutor_skill.price_per_hour
-            frequency_map = {
-                Frequency.WEEKLY: 1,
-                Frequency.BI_WEEKLY: 0.5,
-            }
-            return Decimal(week_count) * Decimal(frequency_map.get(frequency)) * Decimal(duration/Decimal('60')) * Decimal(price_per_hour)
+            factor = FREQUENCY_FACTORS.get(frequency, Decimal('0'))
+            subtotal = Decimal(week_count) * factor * Decimal(duration) * Decimal(price_per_hour) / Decimal('60')
+            return subtotal.quantize(Decimal(1).scaleb(-SUBTOTAL_PLACES), rounding=ROUND_HALF_UP)
         except (Enrollment.DoesNotExist, StudentRequest.DoesNotExist, TutorSkill.DoesNotExist) as e:
             # Handle exceptions
             return Decimal('0.00')
@@ -185,10 +357,13 @@ class Invoice(models.Model):
             raise ValidationError({'due_date': 'Due date should be after the issued date.'})
 
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            # The amount is derived data, calculated once here and kept current by recompute_amounts()
+            self.amount = self.calculate_amount()
         self.full_clean()
         super().save(*args, **kwargs)
 
-class PendingTutor(models.Model):
+class PendingTutor(StatusCountedModel):
     """Model to store pending tutor applications before admin approval."""
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -204,6 +379,22 @@ class PendingTutor(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=False)
 
+    counter_fields = ('is_approved',)
+    objects = StatusCountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='pending_tutor_unapproved_idx',
+                condition=models.Q(is_approved=False),
+            ),
+        ]
+
+    @classmethod
+    def counter_key(cls, values):
+        return 'approved' if values['is_approved'] else 'pending'
+
     def __str__(self):
         return f"Pending Tutor: {self.user.full_name()}"
 
@@ -230,9 +421,20 @@ class Ticket(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CachingQuerySet.as_manager()
+
     def __str__(self):
         return f"Ticket submitted by {self.user} - {self.ticket_type}"
 
     class Meta:
         """Ticket options."""
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='ticket_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='ticket_status_created_idx'),
+            models.Index(
+                fields=['created_at'],
+                name='ticket_pending_idx',
+                condition=models.Q(status='Pending'),
+            ),
+        ]
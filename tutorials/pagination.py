@@ -0,0 +1,240 @@
+"""Keyset (cursor) pagination for the list views."""
+import json
+from collections.abc import Sequence
+from datetime import date, datetime, time
+from decimal import Decimal
+from math import ceil
+
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'tutorials.pagination.cursor'
+
+
+class CursorEncoder(json.JSONEncoder):
+    """JSON encoder that keeps datetimes at full precision so keys compare exactly."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, date, time)):
+            return o.isoformat()
+        if isinstance(o, Decimal):
+            return str(o)
+        return super().default(o)
+
+
+class CursorSerializer:
+    """Serializer used by django.core.signing to pack cursor payloads."""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), cls=CursorEncoder).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class KeysetPaginator:
+    """Paginate a queryset by seeking past the last row shown instead of using OFFSET.
+
+    The queryset's ordering, with the primary key appended as a tiebreaker, is
+    the pagination key. Every ordering entry must be a (non-null) field name or
+    annotation name. Pages are addressed with signed, opaque cursors, and the
+    total row count is only queried when ``count``, ``num_pages`` or
+    ``page_range`` is read.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.per_page = int(per_page)
+        self.ordering = self._get_ordering(queryset)
+        self.queryset = queryset.order_by(*self.ordering)
+
+    @staticmethod
+    def _get_ordering(queryset):
+        """Return the queryset's ordering with the primary key appended."""
+        query = queryset.query
+        ordering = list(query.order_by)
+        if not ordering and query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        for field in ordering:
+            if not isinstance(field, str):
+                raise ImproperlyConfigured(
+                    "KeysetPaginator requires orderings given by field name; "
+                    "annotate ordering expressions and order by the annotation."
+                )
+        primary_keys = ('pk', queryset.model._meta.pk.name)
+        if not any(field.lstrip('-') in primary_keys for field in ordering):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    @cached_property
+    def count(self):
+        """Return the total number of rows. Only queried on demand."""
+        return self.queryset.count()
+
+    @cached_property
+    def num_pages(self):
+        """Return the total number of pages."""
+        return max(1, ceil(self.count / self.per_page))
+
+    @property
+    def page_range(self):
+        """Return a 1-based range of page numbers."""
+        return range(1, self.num_pages + 1)
+
+    def get_page(self, cursor=None, number=None):
+        """Return the page for a cursor, falling back to a page number, then the first page."""
+        if cursor:
+            return self.page(cursor)
+        if number:
+            try:
+                return self.page_number(number)
+            except PageNotAnInteger:
+                return self.page()
+            except EmptyPage:
+                return self.page_number(self.num_pages)
+        return self.page()
+
+    def page(self, cursor=None):
+        """Return the page addressed by an opaque cursor, or the first page."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self._build_page(self.queryset, 1, backwards=False, has_before=False)
+        values, backwards, number = position
+        rows = self._seek(values, backwards)
+        page = self._build_page(rows, number, backwards=backwards, has_before=True)
+        if not page.object_list:
+            return self.page()
+        return page
+
+    def page_number(self, number):
+        """Return a page by number using OFFSET, for links that address pages directly."""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage('That page contains no results')
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.queryset[bottom:bottom + self.per_page])
+        return KeysetPage(
+            object_list, number, self,
+            has_previous=number > 1,
+            has_next=number < self.num_pages,
+        )
+
+    def _build_page(self, queryset, number, backwards, has_before):
+        """Fetch one page plus one lookahead row to learn whether more rows follow."""
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            number = number if has_more else 1
+            return KeysetPage(rows, number, self, has_previous=has_more, has_next=has_before)
+        return KeysetPage(rows, number, self, has_previous=has_before, has_next=has_more)
+
+    def _seek(self, values, backwards):
+        """Return the rows strictly after (or before) the given key, nearest first."""
+        names = [field.lstrip('-') for field in self.ordering]
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = 'gt' if field.startswith('-') == backwards else 'lt'
+            equal = dict(zip(names[:index], values[:index]))
+            condition |= Q(**equal, **{f'{names[index]}__{lookup}': values[index]})
+
+        # Repeat the leading comparison on its own so it can be served as an index range.
+        leading = 'gte' if self.ordering[0].startswith('-') == backwards else 'lte'
+        queryset = self.queryset.filter(Q(**{f'{names[0]}__{leading}': values[0]}) & condition)
+        if backwards:
+            queryset = queryset.order_by(*[
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ])
+        return queryset
+
+    def get_key(self, obj):
+        """Return the pagination key values of a row."""
+        key = []
+        for field in self.ordering:
+            value = obj
+            for attribute in field.lstrip('-').split('__'):
+                value = getattr(value, attribute)
+            key.append(value)
+        return key
+
+    def encode_cursor(self, obj, number, backwards=False):
+        """Return an opaque cursor for the page next to ``obj``."""
+        payload = {'o': self.ordering, 'v': self.get_key(obj), 'n': number, 'b': backwards}
+        return signing.dumps(payload, salt=CURSOR_SALT, serializer=CursorSerializer, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Return (values, backwards, number) for a cursor, or None if it is unusable."""
+        if not cursor:
+            return None
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+            values, backwards, number = payload['v'], bool(payload['b']), max(1, int(payload['n']))
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+        if payload.get('o') != self.ordering or len(values) != len(self.ordering):
+            return None
+        return values, backwards, number
+
+
+class KeysetPage(Sequence):
+    """A page of results, compatible with the parts of Django's Page used by templates."""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<Page {self.number}>'
+
+    def __getstate__(self):
+        # Resolve the cursors up front, so a cached page needs neither its paginator nor its queryset
+        state = self.__dict__.copy()
+        state['next_cursor'] = self.next_cursor
+        state['previous_cursor'] = self.previous_cursor
+        state['paginator'] = None
+        return state
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @cached_property
+    def next_cursor(self):
+        """Return the cursor of the following page, or None on the last page."""
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], self.number + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        """Return the cursor of the preceding page, or None on the first page."""
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], self.number - 1, backwards=True)
@@ -0,0 +1,11 @@
+"""Percentiles of latency samples, shared by the load test, the slow query log and the SQLite benchmark."""
+import math
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of the values, as ``fraction`` between 0 and 1."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
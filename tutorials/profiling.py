@@ -0,0 +1,243 @@
+"""Profiles of single requests, captured with cProfile or a stack sampler and stored as JSON files."""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+MODES = (CPROFILE, SAMPLE)
+
+# Functions kept from a cProfile run, slowest cumulative time first
+MAX_FUNCTIONS = 300
+
+# Flamegraph frames narrower than this percentage of the samples are not drawn
+MIN_FRAME_WIDTH = 0.2
+
+SORT_KEYS = ('cumtime', 'tottime', 'calls', 'function')
+
+PROFILE_ID = re.compile(r'^[0-9]{14}-[0-9a-f]{8}$')
+
+
+def frame_label(code):
+    """Return a short name for a function, as its name, file and first line."""
+    filename = code.co_filename
+    for prefix in (str(settings.BASE_DIR), *sys.path):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Record the stack of one thread from a background thread, every ``interval`` seconds.
+
+    Only the sampled thread's frames are read, so the request runs at nearly
+    full speed, unlike under cProfile, which traces every call.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        # Only the code objects are kept here; labelling them is left to labelled_stacks()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def labelled_stacks(self):
+        """Return the sample counts of the stacks, each as its frames' labels joined by semicolons."""
+        labels = {}
+        stacks = Counter()
+        for stack, count in self.stacks.items():
+            for code in stack:
+                if code not in labels:
+                    labels[code] = frame_label(code)
+            stacks[';'.join(labels[code] for code in stack)] += count
+        return stacks
+
+
+class Capture:
+    """Profile the code run in a with block, in one of the MODES."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.duration = 0.0
+        if mode == CPROFILE:
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        if self.mode == CPROFILE:
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == CPROFILE:
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def result(self):
+        """Return the profile as {'functions': [...]} for cProfile or {'stacks': {...}} for the sampler."""
+        if self.mode == SAMPLE:
+            return {'stacks': dict(self.profiler.labelled_stacks())}
+        functions = [
+            {
+                'function': f'{name} ({filename}:{line})',
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'tottime': round(tottime * 1000, 3),
+                'cumtime': round(cumtime * 1000, 3),
+            }
+            for (filename, line, name), (primitive_calls, calls, tottime, cumtime, _callers)
+            in pstats.Stats(self.profiler).stats.items()
+        ]
+        functions.sort(key=lambda function: function['cumtime'], reverse=True)
+        return {'functions': functions[:MAX_FUNCTIONS]}
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+_prune_due = False
+
+
+def save_profile(capture, request, response, sampled):
+    """Store the profile of a request, returning its id.
+
+    Only the newest PROFILE_MAX_STORED are kept, but the older ones are
+    removed by prune_profiles() once the response has been sent.
+    """
+    global _prune_due
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    user = getattr(request, 'user', None)
+    profile = {
+        'id': profile_id,
+        'mode': capture.mode,
+        'sampled': sampled,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'user': user.username if user is not None and user.is_authenticated else None,
+        'created': timezone.now().isoformat(),
+        'duration_ms': round(capture.duration * 1000, 2),
+        **capture.result(),
+    }
+    (directory / f'{profile_id}.json').write_text(json.dumps(profile))
+    _prune_due = True
+    return profile_id
+
+
+def prune_profiles(**kwargs):
+    """Remove all but the newest PROFILE_MAX_STORED profiles, if one was saved since (a request_finished receiver)."""
+    global _prune_due
+    if not _prune_due:
+        return
+    _prune_due = False
+    for stale in sorted(profile_dir().glob('*.json'), reverse=True)[settings.PROFILE_MAX_STORED:]:
+        stale.unlink(missing_ok=True)
+
+
+def load_profile(profile_id):
+    """Return the stored profile with this id, or None if there is none."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        return json.loads((profile_dir() / f'{profile_id}.json').read_text())
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """Return the stored profiles, newest first."""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (FileNotFoundError, ValueError):
+            # Removed or still being written by another worker
+            continue
+    return profiles
+
+
+def sort_functions(functions, key):
+    """Return the cProfile functions sorted by one of SORT_KEYS, names ascending and numbers descending."""
+    if key == 'function':
+        return sorted(functions, key=lambda function: function['function'])
+    return sorted(functions, key=lambda function: function[key], reverse=True)
+
+
+def merge_stacks(profiles):
+    """Return the sampled stacks of the profiles added together."""
+    stacks = Counter()
+    for profile in profiles:
+        stacks.update(profile.get('stacks', {}))
+    return stacks
+
+
+def flame_rows(stacks):
+    """Lay out sampled stacks as a flamegraph.
+
+    Returns rows of frames from the outermost call down, each frame a dict of
+    its name, samples and left offset and width as percentages of all samples.
+    """
+    total = sum(stacks.values())
+    if not total:
+        return []
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for name in stack.split(';'):
+            entry = node.setdefault(name, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    rows = []
+    level = [(tree, 0)]
+    while level:
+        row, below = [], []
+        for node, offset in level:
+            for name, (count, children) in sorted(node.items()):
+                width = count * 100 / total
+                if width >= MIN_FRAME_WIDTH:
+                    row.append({'name': name, 'samples': count, 'left': round(offset * 100 / total, 3), 'width': round(width, 3)})
+                    below.append((children, offset))
+                offset += count
+        if row:
+            rows.append(row)
+        level = below
+    return rows
@@ -0,0 +1,203 @@
+"""Opt-in caching of queryset results, invalidated per table on every write.
+
+``CachingQuerySet.cached()`` marks a queryset whose results are looked up in
+the cache (see ``tutorials.caching``) by its SQL and parameters. The key also
+embeds a version for every table the SQL reads from. Every INSERT, UPDATE or
+DELETE run through the database connection on the table of an app model with
+a CachingQuerySet bumps that table's version, whether it comes from save(),
+update(), bulk_create() or raw SQL. Writes to any other table, such as the
+session, counter and database cache tables, are not tracked, so querysets
+reading them are never cached. Nor are the writes of migrations, which run
+before the cache (or its table) may exist.
+
+Writes inside a transaction bump their tables only once it commits, and
+until then cached querysets reading those tables go straight to the database,
+so uncommitted rows are never stored in or hidden by the cache. A statement
+returning rows (INSERT ... RETURNING) is only done once they are fetched, and a
+database cache cannot commit on the same connection before then, so with one
+its tables are bumped just before the connection's next statement instead.
+"""
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.db import connections, models, router, transaction
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.core.exceptions import EmptyResultSet
+
+from tutorials import caching
+
+WRITE_PATTERN = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM'
+    r'|(?:DROP|ALTER)\s+TABLE(?:\s+IF\s+EXISTS)?)\s+["`\[]?(\w+)',
+    re.IGNORECASE,
+)
+READ_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?(\w+)', re.IGNORECASE)
+RETURNING_PATTERN = re.compile(r'\bRETURNING\b', re.IGNORECASE)
+
+
+_tracking_suspended = False
+
+
+@lru_cache(maxsize=None)
+def tracked_tables():
+    """Return the tables whose writes are tracked: those of the app's models whose querysets can be cached."""
+    return frozenset(
+        model._meta.db_table for model in apps.get_app_config('tutorials').get_models()
+        if isinstance(model._default_manager.all(), CachingQuerySet)
+    )
+
+
+def table_entity(table):
+    return f'table:{table}'
+
+
+def written_table(sql):
+    """Return the table a statement writes to, or None if it only reads."""
+    match = WRITE_PATTERN.match(sql)
+    return match.group(1) if match else None
+
+
+def invalidate_tables(tables):
+    """Invalidate the cached querysets that read from any of the given tables."""
+    if tables:
+        caching.bump_version(*(table_entity(table) for table in sorted(tables)))
+
+
+class _PendingInvalidation:
+    """The tables written in the current transaction, invalidated once it commits."""
+
+    def __init__(self):
+        self.tables = set()
+
+    def __call__(self):
+        invalidate_tables(self.tables)
+
+
+def pending_invalidation(connection):
+    """Return the tables written in the connection's current transaction, if any are."""
+    # The callback is dropped along with the transaction (or savepoint) that registered it if it rolls back
+    for _savepoints, callback, _robust in connection.run_on_commit:
+        if isinstance(callback, _PendingInvalidation):
+            return callback
+    return None
+
+
+def cache_uses(connection):
+    """Return whether the cache stores its entries through the given connection."""
+    cache = caching.get_cache()
+    return (
+        isinstance(cache, BaseDatabaseCache)
+        and router.db_for_write(cache.cache_model_class) == connection.alias
+    )
+
+
+def invalidate_finished_writes(connection):
+    """Invalidate the tables written by the connection's statements that returned rows."""
+    tables = connection.__dict__.pop('unfinished_writes', None)
+    if tables:
+        invalidate_tables(tables)
+
+
+def record_writes(execute, sql, params, many, context):
+    """Execute wrapper that invalidates the tracked table a statement writes to."""
+    connection = context['connection']
+    # The previous statement is done by now, and the cache's own statements are never tracked
+    invalidate_finished_writes(connection)
+    table = written_table(sql)
+    if table is None or _tracking_suspended or table not in tracked_tables():
+        return execute(sql, params, many, context)
+    if connection.in_atomic_block:
+        pending = pending_invalidation(connection)
+        if pending is None:
+            pending = _PendingInvalidation()
+            transaction.on_commit(pending, using=connection.alias)
+        pending.tables.add(table)
+        return execute(sql, params, many, context)
+    if RETURNING_PATTERN.search(sql) and cache_uses(connection):
+        connection.__dict__.setdefault('unfinished_writes', set()).add(table)
+        return execute(sql, params, many, context)
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        invalidate_tables({table})
+
+
+def install_write_tracking(connection, **kwargs):
+    """Track the writes made through a database connection."""
+    if record_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_writes)
+
+
+def invalidate_unfinished_writes(**kwargs):
+    """Invalidate the tables still awaiting a statement after a write (a request_finished receiver)."""
+    for connection in connections.all(initialized_only=True):
+        invalidate_finished_writes(connection)
+
+
+def suspend_write_tracking(**kwargs):
+    """Stop tracking writes while migrations run (a pre_migrate receiver)."""
+    global _tracking_suspended
+    _tracking_suspended = True
+
+
+def resume_write_tracking(**kwargs):
+    """Track writes again once migrations have run (a post_migrate receiver)."""
+    global _tracking_suspended
+    _tracking_suspended = False
+
+
+def read_tables(query, sql):
+    """Return the tables a query reads from, including those of its subqueries."""
+    tables = {join.table_name for join in query.alias_map.values()}
+    tables.update(READ_PATTERN.findall(sql))
+    return tables
+
+
+class CachingQuerySet(models.QuerySet):
+    """QuerySet whose results can be served from the cache with ``.cached()``."""
+
+    _cache_results = False
+
+    def cached(self):
+        """Return a copy of this queryset whose results are cached until a table it reads is written."""
+        clone = self._chain()
+        clone._cache_results = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_results = self._cache_results
+        return clone
+
+    def _fetch_all(self):
+        if self._cache_results and self._result_cache is None:
+            self._result_cache = self._fetch_cached()
+        super()._fetch_all()
+
+    def _fetch_cached(self):
+        compute = lambda: list(self._iterable_class(self))
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return compute()
+        tables = read_tables(self.query, sql)
+        if not tables <= tracked_tables():
+            # Writes to some of these tables are not tracked, so a cached result would never be invalidated
+            return compute()
+
+        connection = connections[self.db]
+        invalidate_finished_writes(connection)
+        pending = pending_invalidation(connection)
+        if pending is not None and tables & pending.tables:
+            # This transaction has written to the tables; its rows must not be cached or hidden
+            return compute()
+
+        return caching.cached(
+            'querysets',
+            [table_entity(table) for table in tables],
+            compute,
+            vary_on=[self.db, sql, params, self._iterable_class.__name__, self._fields],
+            local=False,
+            serve_previous=False,
+        )
@@ -0,0 +1,208 @@
+"""Measure how each page's render time and size grow with the size of the tables behind it."""
+import math
+import statistics
+import time
+from decimal import Decimal
+from django.apps import apps
+from django.test import Client
+from django.utils import timezone
+from tutorials.loadtest import ROUTES, ANONYMOUS, ADMIN, STUDENT, TUTOR, route_arguments, routes_for
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, TutorSkill, PendingTutor, StudentRequest, Term, Frequency,
+    Enrollment, Invoice, Ticket, TicketStatus, StatusCount, TutorCandidate
+)
+from tutorials.models.counters import StatusCountedModel
+
+BATCH_SIZE = 1000
+
+# Growth exponents below this are treated as measurement noise around constant
+NOISE = 0.1
+
+# Rows each measured user owns, whatever the table size
+OWN_ROWS = 5
+
+
+def create_users(password='Password123'):
+    """Create the admin, student and tutor the pages are measured as, with a few rows of their own."""
+    users = {
+        role: User.objects.create_user(
+            username=f'@scaling_{role}', email=f'scaling_{role}@example.com', password=password, user_type=user_type,
+        )
+        for role, user_type in ((ADMIN, UserType.ADMIN), (STUDENT, UserType.STUDENT), (TUTOR, UserType.TUTOR))
+    }
+    skill = Skill.objects.create(language='Scaling', level=SkillLevel.BEGINNER)
+    TutorSkill.objects.create(tutor=users[TUTOR], skill=skill, price_per_hour=Decimal('40.00'))
+    for _ in range(OWN_ROWS):
+        request = StudentRequest.objects.create(
+            student=users[STUDENT], skill=skill, duration=60, first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY, status='approved',
+        )
+        enrollment = Enrollment.objects.create(
+            approved_request=request, tutor=users[TUTOR], current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10, start_time=timezone.now(), status='ongoing',
+        )
+        Invoice.objects.create(
+            enrollment=enrollment, amount=Decimal('400.00'), issued_date=timezone.now(),
+            due_date=timezone.now(), payment_status='unpaid',
+        )
+        Ticket.objects.create(user=users[STUDENT], enrollment=enrollment, description='Change of time')
+    return users
+
+
+def grow(start, end):
+    """Add rows numbered ``start`` to ``end`` to the tables, so each holds about ``end`` rows.
+
+    The rows belong to other users, so the measured users' own pages show a
+    fixed number of rows while the admin pages list more and more.
+    """
+    numbers = range(start, end)
+    groups = range(start // 10, max(end // 10, start // 10 + 1))
+    students = User.objects.bulk_create([
+        User(username=f'@scaling_student{i}', email=f'scaling_student{i}@example.com', user_type=UserType.STUDENT)
+        for i in numbers
+    ], batch_size=BATCH_SIZE)
+    tutors = User.objects.bulk_create([
+        User(username=f'@scaling_tutor{i}', email=f'scaling_tutor{i}@example.com', user_type=UserType.TUTOR)
+        for i in groups
+    ], batch_size=BATCH_SIZE)
+    applicants = User.objects.bulk_create([
+        User(username=f'@scaling_applicant{i}', email=f'scaling_applicant{i}@example.com', user_type=UserType.TUTOR)
+        for i in groups
+    ], batch_size=BATCH_SIZE)
+    skills = Skill.objects.bulk_create(
+        [Skill(language=f'Language{i}', level=SkillLevel.BEGINNER) for i in groups], batch_size=BATCH_SIZE,
+    )
+    TutorSkill.objects.bulk_create([
+        TutorSkill(tutor=tutor, skill=skill, price_per_hour=Decimal('30.00')) for tutor, skill in zip(tutors, skills)
+    ], batch_size=BATCH_SIZE)
+    PendingTutor.objects.bulk_create([PendingTutor(user=applicant) for applicant in applicants], batch_size=BATCH_SIZE)
+    requests = StudentRequest.objects.bulk_create([
+        StudentRequest(
+            student=student,
+            skill=skills[i % len(skills)],
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+            status='approved' if i % 2 else 'pending',
+        ) for i, student in enumerate(students)
+    ], batch_size=BATCH_SIZE)
+    enrollments = Enrollment.objects.bulk_create([
+        Enrollment(
+            approved_request=request,
+            tutor=tutors[i % len(tutors)],
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now(),
+            status='ongoing',
+        ) for i, request in enumerate(requests) if request.status == 'approved'
+    ], batch_size=BATCH_SIZE)
+    Invoice.objects.bulk_create([
+        Invoice(
+            enrollment=enrollment,
+            amount=Decimal('400.00'),
+            issued_date=timezone.now(),
+            due_date=timezone.now(),
+            payment_status='unpaid',
+        ) for enrollment in enrollments
+    ], batch_size=BATCH_SIZE)
+    Ticket.objects.bulk_create([
+        Ticket(
+            user=enrollment.approved_request.student,
+            enrollment=enrollment,
+            description='Change of time',
+            status=TicketStatus.PENDING if i % 2 else TicketStatus.APPROVED,
+        ) for i, enrollment in enumerate(enrollments)
+    ], batch_size=BATCH_SIZE)
+    # Bulk creation sends no signals, so the counters and candidate index are rebuilt
+    for model in apps.get_app_config('tutorials').get_models():
+        if issubclass(model, StatusCountedModel):
+            StatusCount.recount(model)
+    TutorCandidate.rebuild()
+
+
+def measure(client, path, repeat):
+    """Return the median seconds to serve ``path`` over ``repeat`` requests, and the response size."""
+    client.get(path)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(response.content)
+
+
+def growth_exponent(sizes, values):
+    """Return the exponent b of the power law ``value ~ size ** b`` best fitting the values.
+
+    It is the least squares slope of log(value) against log(size): about 0
+    for constant values and 1 for values growing linearly with size.
+    """
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if size > 0 and value > 0]
+    if len(points) < 2:
+        return 0.0
+    mean_x = statistics.fmean(x for x, _y in points)
+    mean_y = statistics.fmean(y for _x, y in points)
+    spread = sum((x - mean_x) ** 2 for x, _y in points)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def logarithmic_exponent(sizes):
+    """Return the growth exponent of a value growing as log(size) over these sizes."""
+    sizes = [size for size in sizes if size > 1]
+    return growth_exponent(sizes, [math.log(size) for size in sizes])
+
+
+def classify(exponent, sizes):
+    """Describe growth at ``exponent`` over these sizes, and whether it is faster than logarithmic."""
+    if exponent <= NOISE:
+        return 'constant', False
+    if exponent <= logarithmic_exponent(sizes) + NOISE:
+        return 'logarithmic', False
+    return f'n^{exponent:.2f}', True
+
+
+def scaling_report(sizes, repeat=3, password='Password123', progress=None):
+    """Grow the tables through ``sizes`` rows, measuring every loaded page at each, and return the report.
+
+    The report maps each route name to its latency in milliseconds and
+    response size in bytes at each size, the growth exponents of both, their
+    descriptions and whether either grows faster than logarithmically.
+    """
+    sizes = sorted(sizes)
+    users = create_users(password)
+    clients = {ANONYMOUS: Client()}
+    for role, user in users.items():
+        clients[role] = Client()
+        clients[role].force_login(user)
+
+    measurements = {route.name: {'latency_ms': [], 'bytes': []} for route in ROUTES}
+    grown = 0
+    for size in sizes:
+        grow(grown, size)
+        grown = size
+        for route, path in routes_for(route_arguments(users)):
+            seconds, size_bytes = measure(clients[route.role], path, repeat)
+            measurements[route.name]['latency_ms'].append(round(seconds * 1000, 2))
+            measurements[route.name]['bytes'].append(size_bytes)
+        if progress:
+            progress(size)
+
+    report = {}
+    for name, values in measurements.items():
+        if len(values['latency_ms']) != len(sizes):
+            continue
+        latency_exponent = growth_exponent(sizes, values['latency_ms'])
+        size_exponent = growth_exponent(sizes, values['bytes'])
+        latency_growth, latency_flagged = classify(latency_exponent, sizes)
+        size_growth, size_flagged = classify(size_exponent, sizes)
+        report[name] = {
+            **values,
+            'latency_exponent': round(latency_exponent, 3),
+            'bytes_exponent': round(size_exponent, 3),
+            'latency_growth': latency_growth,
+            'bytes_growth': size_growth,
+            'flagged': latency_flagged or size_flagged,
+        }
+    return report
@@ -0,0 +1,42 @@
+"""Removal of expired sessions from the session table."""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def session_model():
+    """Return the model the configured session engine stores sessions in, or None if it keeps none."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        # Signed cookie sessions live in the browser
+        return None
+    return store.get_model_class()
+
+
+def sessions_in_cache():
+    """Return whether the configured session engine keeps sessions in the cache, as cache and cached_db do."""
+    return hasattr(import_module(settings.SESSION_ENGINE).SessionStore, 'cache_key_prefix')
+
+
+def purge_expired_sessions(batch_size=1000, pause=0.0, now=None):
+    """Delete expired sessions in chunks of ``batch_size``, pausing ``pause`` seconds between them.
+
+    Each chunk is its own short transaction, so signing in is never held
+    up behind one long DELETE. Returns the number of deleted sessions.
+    """
+    model = session_model()
+    if model is None:
+        return 0
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(model.objects.filter(expire_date__lt=now).values_list('pk', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(pk__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,208 @@
+"""Signal handlers for the tutorials app."""
+from django.apps import apps
+from django.db import connections, transaction
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, pre_migrate, post_migrate
+from tutorials import caching, profiling, sqlite
+from tutorials.middleware import install_query_tracing
+from tutorials.query_cache import (
+    install_write_tracking, invalidate_unfinished_writes, suspend_write_tracking, resume_write_tracking,
+)
+from tutorials.models import StatusCount, Invoice, Skill, TutorSkill, Enrollment, StudentRequest, TutorCandidate, User
+from tutorials.models.counters import StatusCountedModel
+
+_MISSING = object()
+
+
+def remember_counted_status(sender, instance, raw, update_fields, **kwargs):
+    """Record the status a row had in the database before it is saved."""
+    if update_fields is not None and not set(update_fields) & set(sender.counter_fields):
+        instance._previous_counted_key = _MISSING
+        return
+    if not instance._state.adding and hasattr(instance, '_counted_key'):
+        instance._previous_counted_key = instance._counted_key
+    elif instance.pk is None:
+        instance._previous_counted_key = None
+    else:
+        previous = sender._base_manager.filter(pk=instance.pk).values(*sender.counter_fields).first()
+        instance._previous_counted_key = sender.counter_key(previous) if previous else None
+
+
+def count_saved_status(sender, instance, **kwargs):
+    """Move the saved row between status counters if its status changed."""
+    previous = instance.__dict__.pop('_previous_counted_key', _MISSING)
+    if previous is _MISSING:
+        return
+    current = instance.get_counter_key()
+    if previous != current:
+        deltas = {current: 1}
+        if previous is not None:
+            deltas[previous] = -1
+        StatusCount.adjust(sender, deltas)
+    instance._counted_key = current
+
+
+def count_deleted_status(sender, instance, **kwargs):
+    """Remove a deleted row from its status counter."""
+    status = getattr(instance, '_counted_key', None) or instance.get_counter_key()
+    StatusCount.adjust(sender, {status: -1})
+
+
+def connect_status_counters():
+    """Connect the counter handlers to every StatusCountedModel in the app."""
+    for model in apps.get_app_config('tutorials').get_models():
+        if issubclass(model, StatusCountedModel):
+            pre_save.connect(remember_counted_status, sender=model)
+            post_save.connect(count_saved_status, sender=model)
+            post_delete.connect(count_deleted_status, sender=model)
+
+
+def changes_pricing(update_fields, pricing_fields):
+    """Return whether a save could have changed a value invoices are priced from."""
+    return update_fields is None or bool(set(update_fields) & pricing_fields)
+
+
+def remember_tutor_skill_pair(sender, instance, update_fields, **kwargs):
+    """Record the tutor and skill a TutorSkill had before it is saved, in case either changes."""
+    instance._previous_pair = None
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & {'tutor', 'skill'}):
+        return
+    instance._previous_pair = sender._base_manager.filter(pk=instance.pk).values_list('tutor_id', 'skill_id').first()
+
+
+def moved_tutor_skill_pair(instance):
+    """Return the (tutor, skill) a saved TutorSkill was moved from, or None if neither changed."""
+    previous = instance.__dict__.get('_previous_pair')
+    return previous if previous != (instance.tutor_id, instance.skill_id) else None
+
+
+def reprice_tutor_skill_invoices(sender, instance, update_fields=None, **kwargs):
+    """Reprice the invoices billed at a tutor's price for a skill, and at its old pair if that changed."""
+    if changes_pricing(update_fields, {'price_per_hour', 'tutor', 'skill'}):
+        pairs = {(instance.tutor_id, instance.skill_id), moved_tutor_skill_pair(instance)} - {None}
+        for tutor_id, skill_id in pairs:
+            Invoice.objects.filter(
+                enrollment__tutor_id=tutor_id,
+                enrollment__approved_request__skill_id=skill_id,
+            ).recompute_amounts()
+
+
+def reprice_enrollment_invoice(sender, instance, created, update_fields, raw, **kwargs):
+    """Reprice the invoice of an enrollment whose length or tutor changed."""
+    if not created and not raw and changes_pricing(update_fields, {'week_count', 'tutor'}):
+        Invoice.objects.filter(enrollment=instance).recompute_amounts()
+
+
+def reprice_request_invoices(sender, instance, created, update_fields, raw, **kwargs):
+    """Reprice the invoices of a lesson request whose duration, frequency or skill changed."""
+    if not created and not raw and changes_pricing(update_fields, {'duration', 'frequency', 'skill'}):
+        Invoice.objects.filter(enrollment__approved_request=instance).recompute_amounts()
+
+
+def connect_invoice_repricing():
+    """Keep stored invoice amounts in step with the values they are priced from."""
+    pre_save.connect(remember_tutor_skill_pair, sender=TutorSkill)
+    post_save.connect(reprice_tutor_skill_invoices, sender=TutorSkill)
+    post_delete.connect(reprice_tutor_skill_invoices, sender=TutorSkill)
+    post_save.connect(reprice_enrollment_invoice, sender=Enrollment)
+    post_save.connect(reprice_request_invoices, sender=StudentRequest)
+
+
+def index_tutor_skill(sender, instance, **kwargs):
+    """Add or update the candidate index row of a saved TutorSkill, and remove its old pair's if that changed."""
+    TutorCandidate.refresh_tutor_skill(instance, moved_from=moved_tutor_skill_pair(instance))
+
+
+def unindex_tutor_skill(sender, instance, **kwargs):
+    """Remove the candidate index row of a deleted TutorSkill."""
+    TutorCandidate.objects.filter(skill_id=instance.skill_id, tutor_id=instance.tutor_id).delete()
+
+
+def remember_enrollment_tutor(sender, instance, update_fields, **kwargs):
+    """Record the tutor an enrollment had before it is saved, in case it is reassigned."""
+    instance._previous_tutor_id = None
+    if instance._state.adding or (update_fields is not None and 'tutor' not in update_fields):
+        return
+    instance._previous_tutor_id = sender._base_manager.filter(pk=instance.pk).values_list('tutor_id', flat=True).first()
+
+
+def index_enrollment_load(sender, instance, update_fields=None, **kwargs):
+    """Update the candidate index load of the tutors an enrollment was moved between."""
+    if update_fields is not None and not set(update_fields) & {'tutor', 'status'}:
+        return
+    tutor_ids = {instance.tutor_id, instance.__dict__.pop('_previous_tutor_id', None)} - {None}
+    TutorCandidate.refresh_loads(tutor_ids)
+
+
+def connect_candidate_index():
+    """Keep the tutor candidate index in step with tutor skills and enrollments."""
+    pre_save.connect(remember_tutor_skill_pair, sender=TutorSkill)
+    post_save.connect(index_tutor_skill, sender=TutorSkill)
+    post_delete.connect(unindex_tutor_skill, sender=TutorSkill)
+    pre_save.connect(remember_enrollment_tutor, sender=Enrollment)
+    post_save.connect(index_enrollment_load, sender=Enrollment)
+    post_delete.connect(index_enrollment_load, sender=Enrollment)
+
+
+# The fields of each cached entity that cached reads show; saves that touch none of them keep the cache
+CACHED_FIELDS = {
+    Skill: (caching.SKILL, None),
+    StudentRequest: (caching.STUDENT_REQUEST, None),
+    TutorSkill: (caching.TUTOR_SKILL, None),
+    User: (caching.USER, {'username', 'first_name', 'last_name', 'email', 'user_type', 'is_active'}),
+}
+
+
+def invalidate_cached_reads(sender, update_fields=None, **kwargs):
+    """Bump the cache version of a saved or deleted entity, and again once the change is committed."""
+    entity, fields = CACHED_FIELDS[sender]
+    if fields is None or update_fields is None or set(update_fields) & fields:
+        caching.bump_version(entity)
+        # A request may cache the old rows under the new version before the transaction commits
+        transaction.on_commit(lambda: caching.bump_version(entity))
+
+
+def forget_cached_user(sender, instance, **kwargs):
+    """Drop a saved or deleted user from the cache, and again once the change is committed."""
+    pk = instance.pk
+    caching.forget_user(pk)
+    # A request may cache the old row again before the transaction commits
+    transaction.on_commit(lambda: caching.forget_user(pk))
+
+
+def connect_cache_invalidation():
+    """Invalidate cached reads whenever the entities they are computed from change."""
+    for model in CACHED_FIELDS:
+        post_save.connect(invalidate_cached_reads, sender=model)
+        post_delete.connect(invalidate_cached_reads, sender=model)
+    post_save.connect(forget_cached_user, sender=User)
+    post_delete.connect(forget_cached_user, sender=User)
+
+
+def connect_query_cache():
+    """Invalidate cached querysets on every write made through a database connection, except during migrations."""
+    connection_created.connect(install_write_tracking)
+    pre_migrate.connect(suspend_write_tracking)
+    post_migrate.connect(resume_write_tracking)
+    request_finished.connect(invalidate_unfinished_writes)
+    for connection in connections.all(initialized_only=True):
+        install_write_tracking(connection)
+
+
+def connect_query_tracing():
+    """Trace the statements of recorded requests on every database connection."""
+    connection_created.connect(install_query_tracing)
+    for connection in connections.all(initialized_only=True):
+        install_query_tracing(connection)
+
+
+def connect_sqlite_upkeep():
+    """Run PRAGMA optimize periodically on new connections and on those kept between requests."""
+    connection_created.connect(sqlite.optimize_new_connection)
+    request_finished.connect(sqlite.optimize_kept_connections)
+
+
+def connect_profile_pruning():
+    """Remove old request profiles once the response that saved a new one has been sent."""
+    request_finished.connect(profiling.prune_profiles)
@@ -0,0 +1,116 @@
+"""The slow query log: statements over a time threshold, stored as JSON lines with their query plans."""
+import json
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from tutorials.percentiles import percentile
+
+# Parameters of these types are kept, as they reveal nothing about users
+UNREDACTED_TYPES = (bool, type(None))
+
+
+def redact(params):
+    """Return the query parameters with each value replaced by the name of its type."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: redact([value])[0] for name, value in params.items()}
+    return [value if isinstance(value, UNREDACTED_TYPES) else f'<{type(value).__name__}>' for value in params]
+
+
+def explain(connection, sql, params):
+    """Return the lines of the database's plan for a SELECT, or None for other statements or on failure.
+
+    The plan is read with the backend's own cursor, past the execute wrappers,
+    so it is neither timed nor counted as one of the request's queries.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except (DatabaseError, connection.Database.Error):
+        # Past the wrappers, the driver's own errors are not translated into Django's
+        return None
+
+
+def log_path():
+    return Path(settings.SLOW_QUERY_LOG)
+
+
+def rotated_path(path):
+    return path.with_name(path.name + '.1')
+
+
+def entry(shape, params, duration, view, plan):
+    """Return one slow statement as the dict written to the log."""
+    return {
+        'time': timezone.now().isoformat(),
+        'shape': shape,
+        'params': redact(params),
+        'duration_ms': round(duration * 1000, 3),
+        'view': view,
+        'plan': plan,
+    }
+
+
+def append_entries(entries):
+    """Append entries to the log, moving it aside once larger than SLOW_QUERY_LOG_MAX_BYTES.
+
+    Only one moved-aside file is kept, so the log never takes much more than
+    twice that size on disk.
+    """
+    path = log_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('a') as file:
+        file.write(''.join(json.dumps(logged) + '\n' for logged in entries))
+    if path.stat().st_size > settings.SLOW_QUERY_LOG_MAX_BYTES:
+        os.replace(path, rotated_path(path))
+
+
+def read_entries(path=None):
+    """Return the entries of the log and its moved-aside file, oldest first."""
+    path = Path(path) if path else log_path()
+    entries = []
+    for file_path in (rotated_path(path), path):
+        try:
+            lines = file_path.read_text().splitlines()
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Partly written by a worker still appending to it
+                continue
+    return entries
+
+
+def aggregate(entries):
+    """Return one summary per query shape, the most total time first.
+
+    Each summary has the shape's count, p95, maximum and total duration, the
+    views that ran it by how often, and the newest parameters and plan.
+    """
+    groups = defaultdict(list)
+    for logged in entries:
+        groups[logged['shape']].append(logged)
+    summaries = []
+    for shape, logged in groups.items():
+        durations = [each['duration_ms'] for each in logged]
+        summaries.append({
+            'shape': shape,
+            'count': len(logged),
+            'p95_ms': percentile(durations, 0.95),
+            'max_ms': max(durations),
+            'total_ms': round(sum(durations), 3),
+            'views': dict(Counter(each['view'] for each in logged).most_common()),
+            'params': logged[-1]['params'],
+            'plan': logged[-1]['plan'],
+        })
+    summaries.sort(key=lambda summary: summary['total_ms'], reverse=True)
+    return summaries
@@ -0,0 +1,163 @@
+"""Upkeep of the SQLite database, and a benchmark of its read and write throughput under each profile.
+
+``PRAGMA optimize`` refreshes the statistics the query planner chooses
+indexes by. It is run on a connection as it is opened, or at the end of a
+request on a kept connection, at most once every ``SQLITE_OPTIMIZE_INTERVAL``
+seconds in each process, straight on the DB-API connection so that it is not
+counted as one of the request's queries.
+"""
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from tutorials.percentiles import percentile
+
+_last_optimized = None
+_optimize_lock = threading.Lock()
+
+# The alias of the throwaway database the benchmark runs against
+BENCHMARK_ALIAS = 'sqlite_benchmark'
+BENCHMARK_ROWS = 10000
+
+
+def optimize_if_due(connection):
+    """Run PRAGMA optimize on an open SQLite connection if the process has not for the interval.
+
+    Returns whether it was run.
+    """
+    global _last_optimized
+    interval = settings.SQLITE_OPTIMIZE_INTERVAL
+    if interval is None or connection.vendor != 'sqlite' or connection.connection is None:
+        return False
+    now = time.monotonic()
+    with _optimize_lock:
+        if _last_optimized is not None and now - _last_optimized < interval:
+            return False
+        _last_optimized = now
+    try:
+        connection.connection.execute('PRAGMA optimize')
+    except connection.Database.Error:
+        # Such as "database is locked", raised by the driver itself as it is past Django's wrappers;
+        # the next interval will try again
+        return False
+    return True
+
+
+def reset_optimize_interval():
+    global _last_optimized
+    _last_optimized = None
+
+
+def optimize_new_connection(sender, connection, **kwargs):
+    optimize_if_due(connection)
+
+
+def optimize_kept_connections(sender, **kwargs):
+    for connection in connections.all(initialized_only=True):
+        optimize_if_due(connection)
+
+
+class BenchmarkDatabase:
+    """A throwaway SQLite file opened with the options of one of the DATABASE_PROFILES, as a context manager.
+
+    It is reachable as ``connections[BENCHMARK_ALIAS]`` from any thread while
+    the with block runs.
+    """
+
+    def __init__(self, profile):
+        self.options = settings.DATABASE_PROFILES[profile]
+
+    def __enter__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        connections.settings[BENCHMARK_ALIAS] = {
+            **connections.settings['default'],
+            'NAME': str(Path(self.directory.name) / 'benchmark.sqlite3'),
+            'OPTIONS': self.options,
+            'CONN_MAX_AGE': None,
+        }
+        try:
+            with connections[BENCHMARK_ALIAS].cursor() as cursor:
+                cursor.execute('CREATE TABLE benchmark_row (id INTEGER PRIMARY KEY, counter INTEGER NOT NULL, payload TEXT)')
+                cursor.executemany(
+                    'INSERT INTO benchmark_row (id, counter, payload) VALUES (%s, 0, %s)',
+                    [(row, 'x' * 200) for row in range(BENCHMARK_ROWS)],
+                )
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        connections[BENCHMARK_ALIAS].close()
+        del connections[BENCHMARK_ALIAS]
+        del connections.settings[BENCHMARK_ALIAS]
+        self.directory.cleanup()
+
+
+def read_once(rng):
+    with connections[BENCHMARK_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT counter, payload FROM benchmark_row WHERE id = %s', [rng.randrange(BENCHMARK_ROWS)])
+        cursor.fetchone()
+
+
+def write_once(rng):
+    """Read a row and update it in one transaction, as the views' writes do."""
+    row = rng.randrange(BENCHMARK_ROWS)
+    with transaction.atomic(using=BENCHMARK_ALIAS):
+        with connections[BENCHMARK_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT counter FROM benchmark_row WHERE id = %s', [row])
+            [counter] = cursor.fetchone()
+            cursor.execute('UPDATE benchmark_row SET counter = %s WHERE id = %s', [counter + 1, row])
+
+
+def run_clients(operation, count, stop_at, seed, results):
+    """Start ``count`` threads running ``operation`` until ``stop_at``, adding their latencies and errors to ``results``."""
+    lock = threading.Lock()
+
+    def client(number):
+        rng = random.Random(seed + number)
+        latencies, errors = [], 0
+        try:
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections[BENCHMARK_ALIAS].close()
+        with lock:
+            results['latencies'].extend(latencies)
+            results['errors'] += errors
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def benchmark(profile, readers=8, writers=2, duration=5.0, seed=0):
+    """Return the read and write throughput, p95 latency and errors of concurrent clients under a profile."""
+    reads = {'latencies': [], 'errors': 0}
+    writes = {'latencies': [], 'errors': 0}
+    with BenchmarkDatabase(profile):
+        stop_at = time.monotonic() + duration
+        threads = (
+            run_clients(read_once, readers, stop_at, seed, reads)
+            + run_clients(write_once, writers, stop_at, seed + readers, writes)
+        )
+        for thread in threads:
+            thread.join()
+    return {
+        kind: {
+            'per_second': round(len(results['latencies']) / duration, 1),
+            'p95_ms': round(percentile(results['latencies'], 0.95) * 1000, 2),
+            'errors': results['errors'],
+        }
+        for kind, results in (('reads', reads), ('writes', writes))
+    }
@@ -0,0 +1,106 @@
+"""Structured logging: JSON lines written from a queue, so request threads never wait on the disk.
+
+Every line carries the correlation fields of the request being served (its
+id, user id, role and view), read from ``request_context`` as the line is
+logged. The lines are formatted on the logging thread, put on a queue and
+written by a listener thread to a file shared by every worker process and,
+optionally, stderr.
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from django.contrib.messages import DEFAULT_LEVELS
+from django.contrib.messages.storage.fallback import FallbackStorage
+
+# The fields of the request being served, set by AccessLogMiddleware
+request_context = ContextVar('request_context', default=None)
+
+audit_logger = logging.getLogger('tutorials.audit')
+
+# Attributes every log record has, so the others were passed with ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+MESSAGE_LEVELS = {level: name.lower() for name, level in DEFAULT_LEVELS.items()}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one JSON object, with the request's fields and any ``extra`` fields."""
+
+    def format(self, record):
+        line = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **(request_context.get() or {}),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                line[name] = value
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class QueueFileHandler(QueueHandler):
+    """Hand records to a listener thread that appends them to a file, and writes them to stderr if ``console``.
+
+    Records are formatted before they are queued, while the request's fields
+    can still be read. Every process appends to the same file and none
+    rotates it, as one process moving it aside would lose the lines of the
+    others: it is reopened once moved, by logrotate for instance. The listener
+    is started by the first record a process logs, so a worker forked after
+    logging was configured starts its own. Closing the handler, as logging
+    does at exit or when it is configured again, writes out what is left on
+    the queue.
+    """
+
+    def __init__(self, filename, console=False):
+        super().__init__(queue.SimpleQueue())
+        self.setFormatter(JsonFormatter())
+        self.handlers = [WatchedFileHandler(filename, delay=True)]
+        if console:
+            self.handlers.append(logging.StreamHandler(sys.stderr))
+        self.listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def start_listener(self):
+        """Start this process's listener, unless it is running."""
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # A forked process has its parent's queue, but not the thread reading it
+            self.queue = queue.SimpleQueue()
+            for handler in self.handlers:
+                if isinstance(handler, WatchedFileHandler):
+                    handler.close()
+            self.listener = QueueListener(self.queue, *self.handlers)
+            self.listener.start()
+            self._listener_pid = os.getpid()
+
+    def enqueue(self, record):
+        if self._listener_pid != os.getpid():
+            self.start_listener()
+        super().enqueue(record)
+
+    def close(self):
+        if self._listener_pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+class AuditedMessageStorage(FallbackStorage):
+    """Message storage that also writes each message shown to a user to the audit log."""
+
+    def add(self, level, message, extra_tags=''):
+        if level >= self.level:
+            audit_logger.info(str(message), extra={'message_level': MESSAGE_LEVELS.get(level, level)})
+        super().add(level, message, extra_tags)
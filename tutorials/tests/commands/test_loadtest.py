@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from code_tutors.urls import urlpatterns
+from tutorials.loadtest import ROUTES, EXCLUDED, Sample, summarise, compare
+from tutorials.percentiles import percentile
+
+
+class LoadReportTestCase(SimpleTestCase):
+    """Tests of summarising load test samples."""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarise(self):
+        samples = [
+            Sample('home', 200, 0.010, 0, 0.0, 100),
+            Sample('home', 200, 0.030, 0, 0.0, 100),
+            Sample('dashboard', 500, 0.020, 4, 1.5, 50),
+            Sample('dashboard', 0, 0.040, 0, 0.0, 0),
+        ]
+        report = summarise(samples, elapsed=2.0)
+        self.assertEqual(report['home']['requests'], 2)
+        self.assertEqual(report['home']['rps'], 1.0)
+        self.assertEqual(report['home']['p50_ms'], 10.0)
+        self.assertEqual(report['home']['error_rate'], 0)
+        self.assertEqual(report['dashboard']['error_rate'], 1.0)
+        self.assertEqual(report['dashboard']['queries'], 2.0)
+        self.assertEqual(report['total']['requests'], 4)
+        self.assertEqual(report['total']['error_rate'], 0.5)
+
+    def test_compare(self):
+        previous = {'home': {'p95_ms': 10.0, 'rps': 5.0, 'error_rate': 0, 'queries': 0}}
+        current = {
+            'home': {'p95_ms': 12.0, 'rps': 4.0, 'error_rate': 0, 'queries': 1},
+            'dashboard': {'p95_ms': 1.0, 'rps': 1.0, 'error_rate': 0, 'queries': 2},
+        }
+        self.assertEqual(compare(previous, current), {
+            'home': {'p95_ms': (10.0, 12.0), 'rps': (5.0, 4.0), 'error_rate': (0, 0), 'queries': (0, 1)},
+        })
+
+    def test_every_url_is_loaded_or_excluded(self):
+        names = {pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)}
+        loaded = {route.name for route in ROUTES}
+        self.assertEqual(names - loaded - EXCLUDED.keys(), set())
+        self.assertEqual(loaded & EXCLUDED.keys(), set())
+
+
+# The server runs in other threads, so the fixtures are committed for it to see
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class LoadTestCommandTestCase(TransactionTestCase):
+    """Tests of the loadtest command."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.credentials = ['--admin', '@adminuser', '--student', '@studentuser', '--tutor', '@tutoruser']
+
+    def test_command_reports_every_route(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'loadtest.json')
+            call_command(
+                'loadtest', *self.credentials, '--requests', '60', '--concurrency', '3', '--seed', '1',
+                '--output', output, stdout=out,
+            )
+            with open(output) as file:
+                report = json.load(file)
+            call_command(
+                'loadtest', *self.credentials, '--requests', '10', '--concurrency', '2', '--compare', output, stdout=out,
+            )
+        self.assertEqual(report['concurrency'], 3)
+        self.assertEqual(report['endpoints']['total']['requests'], 60)
+        self.assertEqual(report['endpoints']['total']['error_rate'], 0)
+        self.assertIn('dashboard', report['endpoints'])
+        self.assertIn('p99_ms', report['endpoints']['dashboard'])
+        self.assertIn('Change since the earlier run', out.getvalue())
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--admin', '@nobody', '--requests', '1', stdout=StringIO())
+
+    def test_wrong_password(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'loadtest', *self.credentials, '--password', 'Wrong123', '--requests', '1', '--concurrency', '1',
+                stdout=StringIO(),
+            )
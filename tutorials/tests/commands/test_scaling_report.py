@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase, TestCase
+from tutorials.loadtest import ROUTES
+from tutorials.models import User, Ticket
+from tutorials.scaling import growth_exponent, logarithmic_exponent, classify, grow, scaling_report
+
+SIZES = [1000, 10000, 100000]
+
+
+class GrowthFitTestCase(SimpleTestCase):
+    """Tests of fitting growth curves to measurements."""
+
+    def test_growth_exponent(self):
+        self.assertAlmostEqual(growth_exponent(SIZES, [5, 5, 5]), 0.0)
+        self.assertAlmostEqual(growth_exponent(SIZES, [size * 3 for size in SIZES]), 1.0)
+        self.assertAlmostEqual(growth_exponent(SIZES, [size ** 2 for size in SIZES]), 2.0)
+        self.assertEqual(growth_exponent([1000], [5]), 0.0)
+
+    def test_logarithmic_exponent_skips_sizes_of_one(self):
+        self.assertAlmostEqual(logarithmic_exponent([1, *SIZES]), logarithmic_exponent(SIZES))
+
+    def test_classify(self):
+        self.assertEqual(classify(0.02, SIZES), ('constant', False))
+        self.assertEqual(classify(logarithmic_exponent(SIZES), SIZES), ('logarithmic', False))
+        self.assertEqual(classify(0.5, SIZES), ('n^0.50', True))
+        self.assertEqual(classify(1.0, SIZES), ('n^1.00', True))
+
+
+class ScalingReportTestCase(TestCase):
+    """Tests of measuring the pages at growing table sizes."""
+
+    def test_grow_adds_rows_to_each_size(self):
+        grow(0, 20)
+        grow(20, 40)
+        self.assertEqual(User.objects.filter(username__startswith='@scaling_student').count(), 40)
+        self.assertEqual(Ticket.objects.count(), 20)
+
+    def test_report_covers_every_loaded_page(self):
+        report = scaling_report([20, 60], repeat=1)
+        self.assertEqual(set(report), {route.name for route in ROUTES})
+        self.assertEqual(len(report['dashboard']['latency_ms']), 2)
+        # Every ticket is listed, so the page grows with the table
+        tickets = report['manage_tickets']['bytes']
+        self.assertGreater(tickets[1], tickets[0])
+        self.assertFalse(report['your_requests']['bytes_growth'].startswith('n^'))
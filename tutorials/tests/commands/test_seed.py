@@ -0,0 +1,46 @@
+"""Tests for the seed command."""
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from tutorials.models import User, UserType, StudentRequest, TutorSkill, TutorCandidate, Enrollment, StatusCount
+
+
+class SeedCommandTestCase(TestCase):
+    """The seed command must honour its scale arguments and leave derived data consistent."""
+
+    def seed(self, *args):
+        call_command('seed', '--users', '60', '--tutors', '10', '--requests', '200', *args, stdout=StringIO())
+
+    def test_scale_arguments(self):
+        self.seed('--seed', '3')
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(User.objects.filter(user_type=UserType.TUTOR).count(), 10)
+        self.assertEqual(StudentRequest.objects.count(), 200)
+        self.assertEqual(
+            Enrollment.objects.count(),
+            StudentRequest.objects.filter(status='approved', skill__tutors__isnull=False).distinct().count(),
+        )
+
+    def test_students_request_each_skill_once(self):
+        self.seed('--seed', '3', '--requests', '2000')
+        self.assertEqual(
+            StudentRequest.objects.values('student', 'skill').distinct().count(),
+            StudentRequest.objects.count(),
+        )
+
+    def test_users_share_a_working_password(self):
+        self.seed('--seed', '3')
+        self.assertTrue(User.objects.get(username='@johndoe').check_password('Password123'))
+        self.assertEqual(User.objects.values('password').distinct().count(), 1)
+
+    def test_derived_data_is_consistent(self):
+        self.seed('--seed', '3')
+        self.assertEqual(TutorCandidate.objects.count(), TutorSkill.objects.count())
+        for model in (User, StudentRequest, Enrollment):
+            self.assertEqual(+StatusCount.get_counts(model)[model], +StatusCount.tally(model))
+
+    def test_seed_is_reproducible(self):
+        self.seed('--seed', '4')
+        first = list(User.objects.order_by('username').values_list('username', 'user_type'))
+        self.seed('--seed', '4')
+        self.assertEqual(list(User.objects.order_by('username').values_list('username', 'user_type')), first)
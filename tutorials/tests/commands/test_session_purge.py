@@ -0,0 +1,42 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from tutorials.sessions import purge_expired_sessions
+
+
+class SessionPurgeTestCase(TestCase):
+    """Tests of removing expired sessions in batches."""
+
+    def setUp(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key=f'current{i}', session_data='', expire_date=now + timedelta(days=1)) for i in range(2)]
+        )
+
+    def test_expired_sessions_are_deleted_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+        deletes = [query for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), ['current0', 'current1'])
+
+    def test_nothing_to_purge(self):
+        purge_expired_sessions()
+        self.assertEqual(purge_expired_sessions(), 0)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_have_nothing_to_purge(self):
+        self.assertEqual(purge_expired_sessions(), 0)
+        self.assertEqual(Session.objects.count(), 7)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_sessions', '--batch-size', '2', '--pause', '0', stdout=out)
+        self.assertIn('Deleted 5 expired sessions.', out.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
@@ -0,0 +1,108 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from tutorials import slow_queries
+
+
+def logged(shape, duration_ms, view='dashboard'):
+    return {'shape': shape, 'duration_ms': duration_ms, 'view': view, 'params': ['<str>'], 'plan': ['SCAN t']}
+
+
+class TemporaryLogMixin:
+    """Point the slow query log at a file in a temporary directory."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = Path(directory.name) / 'slow.jsonl'
+        settings_override = override_settings(SLOW_QUERY_LOG=self.log)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class SlowQueryLogTestCase(TemporaryLogMixin, SimpleTestCase):
+    """Tests of storing and summarising slow statements."""
+
+    def test_redact(self):
+        self.assertEqual(slow_queries.redact(('@johndoe', 5, None, True)), ['<str>', '<int>', None, True])
+        self.assertEqual(slow_queries.redact({'email': 'a@b.org'}), {'email': '<str>'})
+        self.assertIsNone(slow_queries.redact(None))
+
+    def test_aggregate(self):
+        entries = [logged('SELECT a', ms) for ms in range(1, 21)] + [logged('SELECT b', 500, view='invoice')]
+        first, second = slow_queries.aggregate(entries)
+        self.assertEqual((first['shape'], first['count'], first['max_ms']), ('SELECT b', 1, 500))
+        self.assertEqual(second['count'], 20)
+        self.assertEqual(second['p95_ms'], 19)
+        self.assertEqual(second['total_ms'], 210)
+        self.assertEqual(second['views'], {'dashboard': 20})
+
+    @override_settings(SLOW_QUERY_LOG_MAX_BYTES=500)
+    def test_log_is_bounded(self):
+        for number in range(20):
+            slow_queries.append_entries([logged(f'SELECT {number}', 1)])
+        files = [path for path in (self.log, slow_queries.rotated_path(self.log)) if path.exists()]
+        self.assertIn(slow_queries.rotated_path(self.log), files)
+        # The moved-aside file holds at most one entry over the limit
+        self.assertLess(sum(path.stat().st_size for path in files), 2 * 500)
+        entries = slow_queries.read_entries()
+        self.assertLess(len(entries), 20)
+        self.assertEqual(entries[-1]['shape'], 'SELECT 19')
+
+
+class SlowQueryMiddlewareTestCase(TemporaryLogMixin, TestCase):
+    """Tests of logging the slow statements of requests."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_statements_are_logged_with_plans(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(reverse('dashboard'))
+        self.assertNotIn('@adminuser', self.log.read_text())
+        entries = slow_queries.read_entries()
+        dashboard = [entry for entry in entries if entry['view'] == 'dashboard']
+        self.assertTrue(dashboard)
+        selects = [entry for entry in dashboard if entry['shape'].startswith('SELECT')]
+        self.assertTrue(all(isinstance(entry['plan'], list) for entry in selects))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_plans_are_not_counted_as_queries(self):
+        self.client.login(username='@adminuser', password='Password123')
+        with self.assertNumQueries(2):
+            self.client.get(reverse('dashboard'))
+
+    def test_failed_plans_are_skipped(self):
+        self.assertIsNone(slow_queries.explain(connection, 'SELECT * FROM "missing_table"', []))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_log_can_be_turned_off(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(reverse('dashboard'))
+        self.assertFalse(self.log.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_command_summarises_by_shape(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+
+        output = StringIO()
+        call_command('slow_queries', '--view', 'dashboard', '--plans', stdout=output)
+        self.assertIn('dashboard', output.getvalue())
+        self.assertIn('plan: ', output.getvalue())
+
+        output = StringIO()
+        call_command('slow_queries', '--json', '--view', 'dashboard', stdout=output)
+        summaries = json.loads(output.getvalue())
+        self.assertTrue(all(summary['count'] == 2 for summary in summaries))
+
+    def test_command_with_empty_log(self):
+        output = StringIO()
+        call_command('slow_queries', stdout=output)
+        self.assertIn('No slow queries logged.', output.getvalue())
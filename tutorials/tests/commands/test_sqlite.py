@@ -0,0 +1,87 @@
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from tutorials import sqlite
+
+
+class ProductionProfileTestCase(SimpleTestCase):
+    """Tests of opening SQLite connections with the production profile."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The benchmark's database is not in DATABASES; the tests add and remove it themselves
+        cls.databases = cls.databases | {sqlite.BENCHMARK_ALIAS}
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with sqlite.BenchmarkDatabase('production'):
+            with connections[sqlite.BENCHMARK_ALIAS].cursor() as cursor:
+                pragmas = {}
+                for name in ('journal_mode', 'synchronous', 'temp_store', 'busy_timeout', 'cache_size', 'mmap_size'):
+                    cursor.execute(f'PRAGMA {name}')
+                    pragmas[name] = cursor.fetchone()[0]
+            self.assertEqual(connections[sqlite.BENCHMARK_ALIAS].transaction_mode, 'IMMEDIATE')
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'temp_store': 2,
+            'busy_timeout': settings.SQLITE_BUSY_TIMEOUT,
+            'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+        })
+
+    def test_benchmark_database_is_removed(self):
+        with sqlite.BenchmarkDatabase('default'):
+            pass
+        self.assertNotIn(sqlite.BENCHMARK_ALIAS, connections.settings)
+
+    def test_benchmark(self):
+        result = sqlite.benchmark('production', readers=2, writers=1, duration=0.2)
+        self.assertGreater(result['reads']['per_second'], 0)
+        self.assertGreater(result['writes']['per_second'], 0)
+        self.assertEqual(result['writes']['errors'], 0)
+
+    def test_command_compares_profiles(self):
+        output = StringIO()
+        call_command('sqlite_benchmark', '--duration', '0.2', '--readers', '1', '--writers', '1', stdout=output)
+        self.assertIn('production against default: reads x', output.getvalue())
+
+    def test_command_rejects_unknown_profiles(self):
+        with self.assertRaises(CommandError):
+            call_command('sqlite_benchmark', '--profiles', 'fastest', stdout=StringIO())
+
+
+class OptimizeTestCase(TestCase):
+    """Tests of running PRAGMA optimize periodically."""
+
+    def setUp(self):
+        sqlite.reset_optimize_interval()
+        self.addCleanup(sqlite.reset_optimize_interval)
+
+    def test_optimize_runs_once_per_interval(self):
+        connection.ensure_connection()
+        with mock.patch('tutorials.sqlite.time.monotonic', return_value=1000.0):
+            self.assertTrue(sqlite.optimize_if_due(connection))
+            self.assertFalse(sqlite.optimize_if_due(connection))
+        with mock.patch('tutorials.sqlite.time.monotonic', return_value=1000.0 + settings.SQLITE_OPTIMIZE_INTERVAL):
+            self.assertTrue(sqlite.optimize_if_due(connection))
+
+    def test_optimize_is_not_counted_as_a_query(self):
+        connection.ensure_connection()
+        with self.assertNumQueries(0):
+            self.assertTrue(sqlite.optimize_if_due(connection))
+
+    def test_optimize_failures_are_skipped(self):
+        connection.ensure_connection()
+        raw = mock.Mock(execute=mock.Mock(side_effect=connection.Database.OperationalError('database is locked')))
+        with mock.patch.object(connection, 'connection', raw):
+            self.assertFalse(sqlite.optimize_if_due(connection))
+
+    @override_settings(SQLITE_OPTIMIZE_INTERVAL=None)
+    def test_optimize_can_be_turned_off(self):
+        connection.ensure_connection()
+        self.assertFalse(sqlite.optimize_if_due(connection))
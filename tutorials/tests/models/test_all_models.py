@@ -336,7 +336,8 @@ class InvoiceModelTestCase(TestCase):
         )
     
         self.assertEqual(invoice.enrollment, self.enrollment)
-        self.assertEqual(invoice.amount, 600.00)
+        # The amount is always calculated: 12 weeks of 1.5 hours at 55.00
+        self.assertEqual(invoice.amount, Decimal('990.00'))
         self.assertEqual(invoice.payment_status, 'unpaid')
         self.assertEqual(invoice.due_date, due_date)
         self.assertEqual(invoice.issued_date, issued_date)
@@ -0,0 +1,144 @@
+"""Unit tests for the bulk tutor assignment engine."""
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from tutorials.assignment import AssignmentPlan, plan_assignments
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    TutorSkill, Enrollment, Invoice, TutorCandidate, StatusCount
+)
+
+
+class AssignmentTestCase(TestCase):
+    """Plans must respect skills and capacity, and be written in bulk."""
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='@assigned_student',
+            email='assigned_student@example.com',
+            password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        self.python = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        self.java = Skill.objects.create(language='Java', level=SkillLevel.BEGINNER)
+        self.cheap, self.dear = [
+            User.objects.create_user(
+                username=f'@assigned_tutor{i}',
+                email=f'assigned_tutor{i}@example.com',
+                password='Password123',
+                user_type=UserType.TUTOR,
+            ) for i in range(2)
+        ]
+        TutorSkill.objects.create(tutor=self.cheap, skill=self.python, price_per_hour=Decimal('10.00'))
+        TutorSkill.objects.create(tutor=self.cheap, skill=self.java, price_per_hour=Decimal('10.00'))
+        TutorSkill.objects.create(tutor=self.dear, skill=self.python, price_per_hour=Decimal('30.00'))
+
+    def create_requests(self, skill, count):
+        return [
+            StudentRequest.objects.create(
+                student=self.student,
+                skill=skill,
+                duration=60,
+                first_term=Term.SEPTEMBER_CHRISTMAS,
+                frequency=Frequency.WEEKLY,
+            ) for _ in range(count)
+        ]
+
+    def assigned_tutors(self, plan):
+        return {assignment.request.pk: assignment.tutor_id for assignment in plan.assignments}
+
+    def enroll_elsewhere(self, tutor):
+        request, = self.create_requests(self.python, 1)
+        Enrollment.objects.create(
+            approved_request=request,
+            tutor=tutor,
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=12,
+            start_time=request.created_at,
+            status='ongoing',
+        )
+
+    def test_cheapest_tutor_within_capacity(self):
+        requests = self.create_requests(self.python, 3)
+        plan = plan_assignments(capacity=2)
+        self.assertEqual(sorted(self.assigned_tutors(plan).values()), sorted([self.cheap.pk, self.cheap.pk, self.dear.pk]))
+        self.assertEqual(plan.total_cost, Decimal('120.00') * 2 + Decimal('360.00'))
+        self.assertEqual(len(plan.unassigned), 0)
+        self.assertEqual({request.pk for request in requests}, set(self.assigned_tutors(plan)))
+
+    def test_scarce_skills_are_placed_first(self):
+        python_request, = self.create_requests(self.python, 1)
+        java_request, = self.create_requests(self.java, 1)
+        plan = plan_assignments(capacity=1)
+        self.assertEqual(self.assigned_tutors(plan), {java_request.pk: self.cheap.pk, python_request.pk: self.dear.pk})
+
+    def test_requests_without_capacity_wait(self):
+        self.create_requests(self.java, 2)
+        plan = plan_assignments(capacity=1)
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(len(plan.unassigned), 1)
+
+    def test_load_objective_spreads_lessons(self):
+        self.create_requests(self.python, 4)
+        plan = plan_assignments(objective='load')
+        self.assertEqual(plan.tutor_loads, {self.cheap.pk: 2, self.dear.pk: 2})
+        self.assertEqual(plan.load_spread, 0)
+
+    def test_apply_writes_enrollments_and_invoices(self):
+        self.create_requests(self.python, 3)
+        plan = plan_assignments(capacity=2)
+        plan.apply()
+        self.assertEqual(Enrollment.objects.count(), 3)
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('amount', flat=True)),
+            [Decimal('120.00'), Decimal('120.00'), Decimal('360.00')],
+        )
+        for invoice in Invoice.objects.with_subtotal():
+            self.assertEqual(invoice.amount, invoice.subtotal_amount)
+        self.assertEqual(StatusCount.get_counts(Enrollment)[Enrollment]['ongoing'], 3)
+        self.assertEqual(TutorCandidate.objects.get(tutor=self.cheap, skill=self.python).ongoing_enrollments, 2)
+        self.assertEqual(len(plan_assignments()), 0)
+        self.assertEqual(set(StudentRequest.objects.values_list('status', flat=True)), {'approved'})
+
+    def test_apply_skips_requests_assigned_since_planning(self):
+        request, = self.create_requests(self.python, 1)
+        plan = plan_assignments()
+        plan_assignments().apply()
+        self.assertEqual(plan.apply(), [])
+        self.assertEqual(Enrollment.objects.filter(approved_request=request).count(), 1)
+
+    def test_apply_skips_requests_decided_since_planning(self):
+        request, = self.create_requests(self.python, 1)
+        plan = plan_assignments()
+        StudentRequest.objects.filter(pk=request.pk).update(status='rejected')
+        self.assertEqual(plan.apply(), [])
+
+    def test_apply_rechecks_capacity(self):
+        self.create_requests(self.java, 1)
+        plan = plan_assignments(capacity=1)
+        self.enroll_elsewhere(self.cheap)
+        self.assertEqual(plan.apply(), [])
+        self.assertEqual(StudentRequest.objects.filter(status='pending').count(), 2)
+
+    def test_command_reports_created_enrollments(self):
+        self.create_requests(self.java, 1)
+        out = StringIO()
+        with mock.patch.object(AssignmentPlan, 'apply', return_value=[]):
+            call_command('auto_assign', stdout=out)
+        self.assertIn('0 request(s) assigned, 1 left waiting. Total cost £0.00.', out.getvalue())
+        self.assertIn('1 planned assignment(s) skipped', out.getvalue())
+
+    def test_command_dry_run_writes_nothing(self):
+        self.create_requests(self.python, 2)
+        out = StringIO()
+        call_command('auto_assign', '--dry-run', '--capacity', '1', stdout=out)
+        self.assertIn('@assigned_tutor0 at £10.00/h: £120.00', out.getvalue())
+        self.assertIn('Dry run: 2 request(s) assigned, 0 left waiting. Total cost £480.00', out.getvalue())
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_command_applies_plan(self):
+        self.create_requests(self.python, 2)
+        call_command('auto_assign', '--objective', 'load', stdout=StringIO())
+        self.assertEqual(set(Enrollment.objects.values_list('tutor', flat=True)), {self.cheap.pk, self.dear.pk})
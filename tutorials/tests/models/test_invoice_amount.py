@@ -0,0 +1,139 @@
+"""Unit tests for the stored Invoice amount."""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    TutorSkill, Enrollment, Invoice
+)
+
+
+class InvoiceAmountTestCase(TestCase):
+    """The stored amount must follow the enrollment, request and tutor price."""
+
+    def setUp(self):
+        student = User.objects.create_user(
+            username='@invoiced_student',
+            email='invoiced_student@example.com',
+            password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        self.tutor = User.objects.create_user(
+            username='@invoiced_tutor',
+            email='invoiced_tutor@example.com',
+            password='Password123',
+            user_type=UserType.TUTOR,
+        )
+        self.skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        self.tutor_skill = TutorSkill.objects.create(tutor=self.tutor, skill=self.skill, price_per_hour=Decimal('20.00'))
+        self.student_request = StudentRequest.objects.create(
+            student=student,
+            skill=self.skill,
+            duration=90,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+            status='approved',
+        )
+        self.enrollment = Enrollment.objects.create(
+            approved_request=self.student_request,
+            tutor=self.tutor,
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now() + timedelta(days=2),
+            status='ongoing',
+        )
+        self.invoice = Invoice.objects.create(
+            enrollment=self.enrollment,
+            amount=0,
+            issued_date=timezone.now(),
+            payment_status='unpaid',
+            due_date=self.enrollment.start_time,
+        )
+
+    def assert_amount(self, expected):
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount, Decimal(expected))
+
+    def test_amount_is_calculated_on_create(self):
+        self.assert_amount('300.00')
+        self.assertEqual(self.invoice.amount, self.invoice.subtotal)
+
+    def test_price_change_recomputes_amount(self):
+        self.tutor_skill.price_per_hour = Decimal('30.00')
+        self.tutor_skill.save()
+        self.assert_amount('450.00')
+
+    def test_removed_price_recomputes_amount_to_zero(self):
+        self.tutor_skill.delete()
+        self.assert_amount('0.00')
+
+    def test_moved_price_recomputes_amounts_of_the_old_pair(self):
+        self.tutor_skill.skill = Skill.objects.create(language='Java', level=SkillLevel.BEGINNER)
+        self.tutor_skill.save()
+        self.assert_amount('0.00')
+
+    def test_week_count_change_recomputes_amount(self):
+        self.enrollment.week_count = 4
+        self.enrollment.save()
+        self.assert_amount('120.00')
+
+    def test_request_changes_recompute_amount(self):
+        self.student_request.frequency = Frequency.BI_WEEKLY
+        self.student_request.duration = 30
+        self.student_request.save()
+        self.assert_amount('50.00')
+
+    def test_unrelated_save_does_not_query_invoices(self):
+        self.student_request.status = 'rejected'
+        with CaptureQueriesContext(connection) as queries:
+            self.student_request.save(update_fields=['status'])
+        self.assertFalse([query for query in queries if 'tutorials_invoice' in query['sql']])
+
+    def test_amount_is_rounded_half_up(self):
+        self.assertEqual(Invoice.calculate_price(1, Frequency.BI_WEEKLY, 45, Decimal('0.01')), Decimal('0.00'))
+        self.assertEqual(Invoice.calculate_price(1, Frequency.WEEKLY, 30, Decimal('0.05')), Decimal('0.03'))
+
+    def test_command_repairs_stale_amounts(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(amount=Decimal('1.00'))
+        out = StringIO()
+        call_command('recompute_invoices', '--batch-size', '1', stdout=out)
+        self.assertIn('1 changed', out.getvalue())
+        self.assert_amount('300.00')
+
+    def test_recompute_rounds_half_up_and_skips_unchanged_amounts(self):
+        TutorSkill.objects.filter(pk=self.tutor_skill.pk).update(price_per_hour=Decimal('0.05'))
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(week_count=1)
+        StudentRequest.objects.filter(pk=self.student_request.pk).update(duration=30)
+        self.assertEqual(Invoice.objects.recompute_amounts(), 1)
+        self.assert_amount('0.03')
+        self.assertEqual(Invoice.objects.recompute_amounts(), 0)
+
+    def test_with_subtotal_matches_subtotal(self):
+        self.tutor_skill.price_per_hour = Decimal('55')
+        self.tutor_skill.save()
+        self.student_request.duration = 50
+        self.student_request.frequency = Frequency.BI_WEEKLY
+        self.student_request.save()
+        invoice = Invoice.objects.with_subtotal().get(pk=self.invoice.pk)
+        self.assertEqual(invoice.subtotal_amount, Decimal('229.166667'))
+        self.assertEqual(invoice.subtotal_amount, invoice.subtotal)
+
+    def test_with_subtotal_is_exact_for_large_amounts(self):
+        self.tutor_skill.price_per_hour = Decimal('9999.99')
+        self.tutor_skill.save()
+        self.student_request.duration = 50
+        self.student_request.save()
+        invoice = Invoice.objects.with_subtotal().get(pk=self.invoice.pk)
+        self.assertEqual(invoice.subtotal_amount, Decimal('83333.250000'))
+        self.assertEqual(invoice.subtotal_amount, invoice.subtotal)
+
+    def test_with_subtotal_without_price_is_zero(self):
+        self.tutor_skill.delete()
+        invoice = Invoice.objects.with_subtotal().get(pk=self.invoice.pk)
+        self.assertEqual(invoice.subtotal_amount, Decimal('0'))
+        self.assertEqual(invoice.subtotal_amount, invoice.subtotal)
@@ -0,0 +1,88 @@
+"""Tests for the fast purge used by unseed and seed."""
+from io import StringIO
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency, TutorSkill,
+    Enrollment, EnrollmentDays, Day, Invoice, PendingTutor, Ticket, StatusCount
+)
+from tutorials import caching
+from tutorials.purge import deletion_order, purge, purge_models
+
+
+class PurgeTestCase(TestCase):
+    """Purging must empty every table of the app without loading any rows."""
+
+    def setUp(self):
+        student = User.objects.create_user(
+            username='@purged_student', email='purged_student@example.com', password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        tutor = User.objects.create_user(
+            username='@purged_tutor', email='purged_tutor@example.com', password='Password123',
+            user_type=UserType.TUTOR,
+        )
+        skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        TutorSkill.objects.create(tutor=tutor, skill=skill, price_per_hour=20)
+        request = StudentRequest.objects.create(
+            student=student, skill=skill, duration=60, first_term=Term.MAY_JULY, frequency=Frequency.WEEKLY,
+        )
+        enrollment = Enrollment.objects.create(
+            approved_request=request, tutor=tutor, current_term=Term.MAY_JULY, week_count=4,
+            start_time=timezone.now() + timezone.timedelta(days=1), status='ongoing',
+        )
+        EnrollmentDays.objects.create(day_name=Day.objects.create(day_name='Monday'), enrollment=enrollment)
+        Invoice.objects.create(
+            enrollment=enrollment, amount=0, issued_date=timezone.now(), payment_status='unpaid',
+            due_date=enrollment.start_time,
+        )
+        Ticket.objects.create(user=student, enrollment=enrollment, description='Please change the day')
+        pending = PendingTutor.objects.create(user=student, price_per_hour=10)
+        pending.skills.add(skill)
+
+    def test_unseed_empties_every_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command('unseed', stdout=StringIO())
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+        for model in purge_models():
+            self.assertFalse(model._base_manager.exists(), model._meta.label)
+        self.assertEqual(StatusCount.tally(User), StatusCount.get_counts(User)[User])
+
+    def test_referencing_tables_are_emptied_first(self):
+        order = deletion_order(purge_models())
+        for position, model in enumerate(order):
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.related_model in order and field.related_model is not model:
+                    self.assertGreater(order.index(field.related_model), position, f"{model._meta.label}.{field.name}")
+
+    def test_purge_covers_derived_and_many_to_many_tables(self):
+        labels = {model._meta.label for model in purge_models()}
+        self.assertTrue({
+            'tutorials.Ticket', 'tutorials.PendingTutor', 'tutorials.PendingTutor_skills',
+            'tutorials.StatusCount', 'tutorials.TutorCandidate',
+        } <= labels)
+
+    def test_seed_after_purge_restarts_ids(self):
+        call_command('unseed', stdout=StringIO())
+        self.assertEqual(Skill.objects.create(language='Go', level=SkillLevel.BEGINNER).pk, 1)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'purge-tests'},
+    })
+    def test_purge_signs_everyone_out_and_drops_cached_reads(self):
+        self.client.login(username='@purged_student', password='Password123')
+        student = User.objects.get(username='@purged_student')
+        caching.set_user(student)
+        versions = caching.get_versions(*caching.ENTITIES)
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = purge(vacuum=False)
+        self.assertEqual(deleted[Session], 1)
+        self.assertFalse(Session.objects.exists())
+        new_versions = caching.get_versions(*caching.ENTITIES)
+        for entity in caching.ENTITIES:
+            self.assertNotEqual(new_versions[entity], versions[entity], entity)
+        self.assertIsNone(caching.get_user(student.pk))
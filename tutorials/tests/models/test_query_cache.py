@@ -0,0 +1,195 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from tutorials import caching
+from tutorials.models import User, UserType, Skill, SkillLevel, TutorSkill, StudentRequest, Term, Frequency
+from tutorials.query_cache import (
+    written_table, read_tables, record_writes, table_entity, tracked_tables,
+    suspend_write_tracking, resume_write_tracking,
+)
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'query-cache-tests',
+    },
+}
+
+DATABASE_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'query_cache_tests',
+    },
+}
+
+
+class StatementTablesTestCase(SimpleTestCase):
+    """Tests of finding the tables statements read and write."""
+
+    def test_written_table(self):
+        self.assertEqual(written_table('INSERT INTO "tutorials_skill" ("language") VALUES (%s)'), 'tutorials_skill')
+        self.assertEqual(written_table('INSERT OR IGNORE INTO "tutorials_skill" VALUES (%s)'), 'tutorials_skill')
+        self.assertEqual(written_table('UPDATE "tutorials_user" SET "last_login" = %s'), 'tutorials_user')
+        self.assertEqual(written_table('DELETE FROM "tutorials_ticket"'), 'tutorials_ticket')
+        self.assertIsNone(written_table('SELECT "tutorials_skill"."id" FROM "tutorials_skill"'))
+        self.assertIsNone(written_table('SAVEPOINT "s1"'))
+
+    def test_read_tables_include_joins_and_subqueries(self):
+        queryset = Skill.objects.filter(tutors__price_per_hour__gt=10).exclude(
+            pk__in=User.objects.filter(user_type=UserType.STUDENT).values('pk'),
+        )
+        sql, _params = queryset.query.get_compiler(using='default').as_sql()
+        self.assertEqual(
+            read_tables(queryset.query, sql),
+            {'tutorials_skill', 'tutorials_tutorskill', 'tutorials_user'},
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QueryCacheTestCase(TransactionTestCase):
+    """Tests of cached queryset results and their invalidation.
+
+    These run outside a test transaction, as writes only invalidate the
+    cache once they are committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats(['querysets'])
+        self.skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+
+    def languages(self):
+        return [skill.language for skill in Skill.objects.all().cached()]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.assertEqual(self.languages(), ['Python'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.languages(), ['Python'])
+        self.assertEqual(caching.get_stats(['querysets'])['querysets']['shared']['hits'], 1)
+
+    def test_uncached_queryset_always_queries(self):
+        list(Skill.objects.all())
+        with self.assertNumQueries(1):
+            list(Skill.objects.all())
+
+    def test_parameters_select_different_results(self):
+        Skill.objects.create(language='Rust', level=SkillLevel.ADVANCED)
+        python = Skill.objects.filter(level=SkillLevel.BEGINNER).cached()
+        rust = Skill.objects.filter(level=SkillLevel.ADVANCED).cached()
+        self.assertEqual([skill.language for skill in python], ['Python'])
+        self.assertEqual([skill.language for skill in rust], ['Rust'])
+
+    def test_result_shapes_are_cached_apart(self):
+        self.assertEqual(list(Skill.objects.values_list('language', flat=True).cached()), ['Python'])
+        self.assertEqual(list(Skill.objects.values_list('language').cached()), [('Python',)])
+        self.assertEqual(list(Skill.objects.values('language').cached()), [{'language': 'Python'}])
+
+    def test_save_invalidates(self):
+        self.languages()
+        Skill.objects.create(language='Rust', level=SkillLevel.BEGINNER)
+        self.assertEqual(self.languages(), ['Python', 'Rust'])
+        self.skill.delete()
+        self.assertEqual(self.languages(), ['Rust'])
+
+    def test_update_invalidates(self):
+        self.languages()
+        Skill.objects.filter(pk=self.skill.pk).update(language='Go')
+        self.assertEqual(self.languages(), ['Go'])
+
+    def test_bulk_create_invalidates(self):
+        self.languages()
+        Skill.objects.bulk_create([Skill(language='Rust', level=SkillLevel.BEGINNER)])
+        self.assertEqual(self.languages(), ['Python', 'Rust'])
+
+    def test_write_to_joined_table_invalidates(self):
+        student = User.objects.create_user(
+            username='@cachestudent', email='cachestudent@example.com', password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        request = StudentRequest.objects.create(
+            student=student, skill=self.skill, duration=60, first_term=Term.MAY_JULY, frequency=Frequency.WEEKLY,
+        )
+        requested = lambda: list(Skill.objects.filter(requests__status='pending').cached())
+        self.assertEqual(requested(), [self.skill])
+        request.status = 'approved'
+        request.save()
+        self.assertEqual(requested(), [])
+
+    def test_reads_of_untracked_tables_are_not_cached(self):
+        tutor = User.objects.create_user(
+            username='@cachetutor', email='cachetutor@example.com', password='Password123', user_type=UserType.TUTOR,
+        )
+        TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=20)
+        expensive = lambda: list(Skill.objects.filter(tutors__price_per_hour__gt=10).cached())
+        self.assertEqual(expensive(), [self.skill])
+        with self.assertNumQueries(1):
+            self.assertEqual(expensive(), [self.skill])
+
+    def test_untracked_writes_keep_the_cache(self):
+        versions = caching.get_versions(*(table_entity(table) for table in tracked_tables()))
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM "tutorials_statuscount"')
+            cursor.execute('DELETE FROM "django_session"')
+        self.assertEqual(caching.get_versions(*versions), versions)
+        self.assertNotIn('tutorials_statuscount', tracked_tables())
+
+    def test_uncommitted_writes_are_not_cached(self):
+        self.languages()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Skill.objects.create(language='Rust', level=SkillLevel.BEGINNER)
+                # The transaction sees its own row, bypassing the cache
+                self.assertEqual(self.languages(), ['Python', 'Rust'])
+                raise RuntimeError('roll back')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.languages(), ['Python'])
+
+    def test_committed_writes_invalidate_on_commit(self):
+        self.languages()
+        with transaction.atomic():
+            Skill.objects.create(language='Rust', level=SkillLevel.BEGINNER)
+        self.assertEqual(self.languages(), ['Python', 'Rust'])
+
+    def test_reads_in_transaction_of_unwritten_tables_are_cached(self):
+        self.languages()
+        with transaction.atomic():
+            User.objects.create_user(username='@other', email='other@example.com', password='Password123')
+            with self.assertNumQueries(0):
+                self.assertEqual(self.languages(), ['Python'])
+
+    def test_write_tracking_is_installed(self):
+        self.assertIn(record_writes, connection.execute_wrappers)
+
+
+@override_settings(CACHES=DATABASE_CACHE)
+class DatabaseCacheTestCase(TransactionTestCase):
+    """Tests of the query cache kept in a table of the database it caches."""
+
+    def setUp(self):
+        # Left in place afterwards, as the flush after each test writes to tracked tables
+        call_command('createcachetable', verbosity=0)
+
+    def test_writes_and_cached_reads(self):
+        self.assertEqual(list(Skill.objects.all().cached()), [])
+        # The INSERT returns the new row's id, so the cache cannot commit until it is fetched
+        skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        self.assertEqual(list(Skill.objects.all().cached()), [skill])
+        self.assertEqual(Skill.objects.count(), 1)
+        with self.assertNumQueries(2):
+            # The version and the entry, both read from the cache table
+            self.assertEqual(list(Skill.objects.all().cached()), [skill])
+        skill.delete()
+        self.assertEqual(list(Skill.objects.all().cached()), [])
+
+    def test_writes_are_not_tracked_during_migrations(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE "query_cache_tests"')
+        suspend_write_tracking()
+        try:
+            # Without the signals of save(), which invalidate cached reads by themselves
+            Skill.objects.bulk_create([Skill(language='Python', level=SkillLevel.BEGINNER)])
+        finally:
+            resume_write_tracking()
+            call_command('createcachetable', verbosity=0)
+        self.assertEqual(Skill.objects.count(), 1)
@@ -0,0 +1,157 @@
+"""Unit tests for the StatusCount counters."""
+from io import StringIO
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    Enrollment, PendingTutor, StatusCount
+)
+
+
+class StatusCountTestCase(TestCase):
+    """Counters must agree with the tables after every kind of write."""
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='@counted_student',
+            email='counted_student@example.com',
+            password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        self.tutor = User.objects.create_user(
+            username='@counted_tutor',
+            email='counted_tutor@example.com',
+            password='Password123',
+            user_type=UserType.TUTOR,
+        )
+        self.skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+
+    def create_request(self, status='pending'):
+        return StudentRequest.objects.create(
+            student=self.student,
+            skill=self.skill,
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+            status=status,
+        )
+
+    def assert_counters_match(self, *models):
+        counts = StatusCount.get_counts(*models)
+        for model in models:
+            self.assertEqual(+counts[model], +StatusCount.tally(model), model.__name__)
+
+    def test_create_is_counted(self):
+        self.create_request()
+        self.create_request('approved')
+        counts = StatusCount.get_counts(StudentRequest)[StudentRequest]
+        self.assertEqual(counts['pending'], 1)
+        self.assertEqual(counts['approved'], 1)
+
+    def test_status_change_on_save_moves_counter(self):
+        request = self.create_request()
+        request.status = 'approved'
+        request.save()
+        request = StudentRequest.objects.get(pk=request.pk)
+        request.status = 'rejected'
+        request.save()
+        counts = StatusCount.get_counts(StudentRequest)[StudentRequest]
+        self.assertEqual(counts['pending'], 0)
+        self.assertEqual(counts['approved'], 0)
+        self.assertEqual(counts['rejected'], 1)
+
+    def test_save_with_unrelated_update_fields_is_not_counted(self):
+        request = self.create_request()
+        request.status = 'approved'
+        request.save(update_fields=['duration'])
+        self.assert_counters_match(StudentRequest)
+
+    def test_delete_is_counted(self):
+        self.create_request().delete()
+        self.assertEqual(StatusCount.get_counts(StudentRequest)[StudentRequest]['pending'], 0)
+
+    def test_cascade_delete_is_counted(self):
+        self.create_request()
+        self.create_request('approved')
+        self.student.delete()
+        self.assert_counters_match(StudentRequest, User)
+
+    def test_bulk_update_is_counted(self):
+        for _ in range(3):
+            self.create_request()
+        self.create_request('rejected')
+        StudentRequest.objects.filter(status='pending').update(status='approved')
+        counts = StatusCount.get_counts(StudentRequest)[StudentRequest]
+        self.assertEqual(counts['pending'], 0)
+        self.assertEqual(counts['approved'], 3)
+        self.assertEqual(counts['rejected'], 1)
+
+    def test_bulk_create_and_bulk_update_are_counted(self):
+        requests = StudentRequest.objects.bulk_create([
+            StudentRequest(
+                student=self.student,
+                skill=self.skill,
+                duration=30,
+                first_term=Term.MAY_JULY,
+                frequency=Frequency.BI_WEEKLY,
+            ) for _ in range(4)
+        ])
+        requests = list(StudentRequest.objects.all())
+        for request in requests[:2]:
+            request.status = 'approved'
+        StudentRequest.objects.bulk_update(requests, ['status'])
+        counts = StatusCount.get_counts(StudentRequest)[StudentRequest]
+        self.assertEqual(counts['pending'], 2)
+        self.assertEqual(counts['approved'], 2)
+
+    def test_rolled_back_write_leaves_counters_unchanged(self):
+        try:
+            with transaction.atomic():
+                self.create_request()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(StatusCount.get_counts(StudentRequest)[StudentRequest]['pending'], 0)
+
+    def test_user_counters_track_type_and_activity(self):
+        self.tutor.is_active = False
+        self.tutor.save()
+        User.objects.filter(pk=self.student.pk).update(user_type=UserType.TUTOR)
+        counts = StatusCount.get_counts(User)[User]
+        self.assertEqual(counts[UserType.TUTOR], 1)
+        self.assertEqual(counts[f'{UserType.TUTOR}:inactive'], 1)
+        self.assertEqual(counts[UserType.STUDENT], 0)
+
+    def test_enrollment_and_pending_tutor_counters(self):
+        request = self.create_request('approved')
+        Enrollment.objects.create(
+            approved_request=request,
+            tutor=self.tutor,
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=4,
+            start_time=timezone.now(),
+            status='ongoing',
+        )
+        pending = PendingTutor.objects.create(user=self.student)
+        pending.is_approved = True
+        pending.save()
+        Enrollment.objects.update(status='cancelled')
+        self.assert_counters_match(Enrollment, PendingTutor)
+        self.assertEqual(StatusCount.get_counts(PendingTutor)[PendingTutor]['approved'], 1)
+
+    def test_get_counts_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            StatusCount.get_counts(StudentRequest, Enrollment, PendingTutor, User)
+
+    def test_recount_repairs_drift(self):
+        self.create_request()
+        StatusCount.objects.filter(entity='tutorials.studentrequest').update(count=42)
+        out = StringIO()
+        call_command('recount', '--check', stdout=out)
+        self.assertIn('counter 42, actual 1', out.getvalue())
+        self.assertEqual(StatusCount.get_counts(StudentRequest)[StudentRequest]['pending'], 42)
+
+        call_command('recount', stdout=StringIO())
+        self.assert_counters_match(StudentRequest, Enrollment, PendingTutor, User)
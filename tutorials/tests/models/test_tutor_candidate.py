@@ -0,0 +1,129 @@
+"""Unit tests for the TutorCandidate index and ranking."""
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    TutorSkill, Enrollment, EnrollmentDays, Day, TutorCandidate
+)
+
+
+class TutorCandidateTestCase(TestCase):
+    """The index must follow tutor skills and enrollments, and rank tutors for a request."""
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='@ranked_student',
+            email='ranked_student@example.com',
+            password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        self.skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        self.other_skill = Skill.objects.create(language='Java', level=SkillLevel.BEGINNER)
+        self.tutors = [
+            User.objects.create_user(
+                username=f'@ranked_tutor{i}',
+                email=f'ranked_tutor{i}@example.com',
+                password='Password123',
+                user_type=UserType.TUTOR,
+            ) for i in range(3)
+        ]
+        self.lesson_request = self.create_request()
+
+    def create_request(self):
+        return StudentRequest.objects.create(
+            student=self.student,
+            skill=self.skill,
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+        )
+
+    def enroll(self, tutor, lesson_request=None, days=()):
+        enrollment = Enrollment.objects.create(
+            approved_request=lesson_request or self.create_request(),
+            tutor=tutor,
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now(),
+            status='ongoing',
+        )
+        for day in days:
+            EnrollmentDays.objects.create(day_name=day, enrollment=enrollment)
+        return enrollment
+
+    def ranked_tutors(self):
+        return [candidate.tutor for candidate in TutorCandidate.objects.for_request(self.lesson_request)]
+
+    def test_tutor_skill_changes_are_indexed(self):
+        tutor_skill = TutorSkill.objects.create(tutor=self.tutors[0], skill=self.skill, price_per_hour=Decimal('20.00'))
+        tutor_skill.price_per_hour = Decimal('25.00')
+        tutor_skill.save()
+        self.assertEqual(TutorCandidate.objects.get(skill=self.skill, tutor=self.tutors[0]).price_per_hour, Decimal('25.00'))
+        tutor_skill.delete()
+        self.assertFalse(TutorCandidate.objects.exists())
+
+    def test_moved_tutor_skill_leaves_its_old_pair(self):
+        tutor_skill = TutorSkill.objects.create(tutor=self.tutors[0], skill=self.skill, price_per_hour=Decimal('20.00'))
+        tutor_skill.skill = self.other_skill
+        tutor_skill.save()
+        self.assertEqual(
+            list(TutorCandidate.objects.values_list('tutor_id', 'skill_id')),
+            [(self.tutors[0].pk, self.other_skill.pk)],
+        )
+        self.assertEqual(list(TutorCandidate.objects.for_request(self.lesson_request)), [])
+
+    def test_ranked_by_price(self):
+        for tutor, price in zip(self.tutors, ['30.00', '10.00', '20.00']):
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=Decimal(price))
+        TutorSkill.objects.create(tutor=self.tutors[0], skill=self.other_skill, price_per_hour=Decimal('1.00'))
+        self.assertEqual(self.ranked_tutors(), [self.tutors[1], self.tutors[2], self.tutors[0]])
+
+    def test_ranked_by_load_before_price(self):
+        for tutor, price in zip(self.tutors, ['30.00', '10.00', '20.00']):
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=Decimal(price))
+        self.enroll(self.tutors[1])
+        enrollment = self.enroll(self.tutors[2])
+        self.assertEqual(self.ranked_tutors(), [self.tutors[0], self.tutors[1], self.tutors[2]])
+
+        enrollment.status = 'cancelled'
+        enrollment.save()
+        self.assertEqual(self.ranked_tutors(), [self.tutors[2], self.tutors[0], self.tutors[1]])
+
+    def test_reassigned_enrollment_moves_load(self):
+        for tutor in self.tutors[:2]:
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill)
+        enrollment = self.enroll(self.tutors[0])
+        enrollment.tutor = self.tutors[1]
+        enrollment.save()
+        loads = dict(TutorCandidate.objects.values_list('tutor', 'ongoing_enrollments'))
+        self.assertEqual(loads, {self.tutors[0].pk: 0, self.tutors[1].pk: 1})
+
+    def test_clashing_days_break_ties(self):
+        monday, tuesday = Day.objects.create(day_name='Monday'), Day.objects.create(day_name='Tuesday')
+        for tutor in self.tutors:
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=Decimal('20.00'))
+        self.enroll(self.tutors[0], lesson_request=self.lesson_request, days=[monday])
+        self.enroll(self.tutors[1], days=[monday])
+        self.enroll(self.tutors[2], days=[tuesday])
+        candidates = list(TutorCandidate.objects.for_request(self.lesson_request))
+        self.assertEqual([candidate.clashing_days for candidate in candidates], [0, 0, 1])
+        self.assertEqual(candidates[-1].tutor, self.tutors[1])
+
+    def test_request_without_lessons_has_no_clashes(self):
+        monday = Day.objects.create(day_name='Monday')
+        for tutor, price in zip(self.tutors, ['30.00', '10.00', '20.00']):
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=Decimal(price))
+        self.enroll(self.tutors[1], days=[monday])
+        candidates = list(TutorCandidate.objects.for_request(self.lesson_request))
+        self.assertEqual([candidate.tutor for candidate in candidates], [self.tutors[2], self.tutors[0], self.tutors[1]])
+        self.assertEqual([candidate.clashing_days for candidate in candidates], [0, 0, 0])
+
+    def test_rebuild_matches_incremental_index(self):
+        for tutor in self.tutors:
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=Decimal('15.00'))
+        self.enroll(self.tutors[0])
+        fields = ('skill', 'tutor', 'price_per_hour', 'ongoing_enrollments')
+        indexed = sorted(TutorCandidate.objects.values_list(*fields))
+        TutorCandidate.rebuild()
+        self.assertEqual(sorted(TutorCandidate.objects.values_list(*fields)), indexed)
@@ -0,0 +1,100 @@
+"""Benchmark for ranking tutor candidates on the lesson request page.
+
+Runs over CANDIDATE_BENCHMARK_TUTORS tutors (200 by default). The page is
+only timed against RANKING_BUDGET when the variable is set, to 5000 for
+instance.
+"""
+import os
+import random
+from decimal import Decimal
+from time import perf_counter
+from unittest import skipUnless
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    TutorSkill, Enrollment, EnrollmentDays, Day, TutorCandidate
+)
+
+BENCHMARK_TUTORS = int(os.environ.get('CANDIDATE_BENCHMARK_TUTORS', 200))
+
+# Seconds the lesson request page may take to rank the tutors and render
+RANKING_BUDGET = 0.05
+
+
+class CandidateRankingBenchmark(TestCase):
+    """The lesson request page must rank thousands of tutors quickly, in a fixed number of queries."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(6)
+        student = User.objects.get(username='@studentuser')
+        skills = Skill.objects.bulk_create([Skill(language=f'Language{i}', level=SkillLevel.BEGINNER) for i in range(20)])
+        days = Day.objects.bulk_create([Day(day_name=name) for name in ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')])
+        tutors = User.objects.bulk_create([
+            User(username=f'@benchmark_tutor{i}', email=f'benchmark_tutor{i}@example.com', user_type=UserType.TUTOR)
+            for i in range(BENCHMARK_TUTORS)
+        ], batch_size=1000)
+        TutorSkill.objects.bulk_create([
+            TutorSkill(tutor=tutor, skill=skill, price_per_hour=Decimal(rng.randint(1000, 6000)) / 100)
+            for tutor in tutors for skill in rng.sample(skills, 3)
+        ], batch_size=1000)
+        cls.lesson_request = StudentRequest.objects.create(
+            student=student,
+            skill=skills[0],
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+        )
+        requests = StudentRequest.objects.bulk_create([
+            StudentRequest(
+                student=student,
+                skill=skills[0],
+                duration=60,
+                first_term=Term.SEPTEMBER_CHRISTMAS,
+                frequency=Frequency.WEEKLY,
+                status='approved',
+            ) for _ in range(BENCHMARK_TUTORS)
+        ], batch_size=1000)
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(
+                approved_request=request,
+                tutor=rng.choice(tutors),
+                current_term=Term.SEPTEMBER_CHRISTMAS,
+                week_count=10,
+                start_time=timezone.now(),
+                status='ongoing',
+            ) for request in requests
+        ], batch_size=1000)
+        EnrollmentDays.objects.bulk_create([
+            EnrollmentDays(day_name=rng.choice(days), enrollment=enrollment) for enrollment in enrollments
+        ], batch_size=1000)
+        enrollment = Enrollment.objects.create(
+            approved_request=cls.lesson_request,
+            tutor=tutors[0],
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now(),
+            status='ongoing',
+        )
+        EnrollmentDays.objects.create(day_name=days[0], enrollment=enrollment)
+        TutorCandidate.rebuild()
+
+    def setUp(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.url = reverse('lesson_request_details', args=[self.lesson_request.pk])
+        self.client.get(self.url)
+
+    def test_page_renders_top_candidates_in_fixed_queries(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['candidates']), 20)
+
+    @skipUnless(os.environ.get('CANDIDATE_BENCHMARK_TUTORS'), 'Set CANDIDATE_BENCHMARK_TUTORS to time the page')
+    def test_page_renders_within_budget(self):
+        started = perf_counter()
+        self.client.get(self.url)
+        self.assertLess(perf_counter() - started, RANKING_BUDGET)
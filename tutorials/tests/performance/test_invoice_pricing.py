@@ -0,0 +1,83 @@
+"""Benchmark for pricing invoices in bulk with Invoice.objects.with_subtotal().
+
+Runs over INVOICE_BENCHMARK_ROWS invoices (2000 by default); set it to
+100000 to benchmark at report scale.
+"""
+import os
+import random
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, StudentRequest, Term, Frequency,
+    TutorSkill, Enrollment, Invoice
+)
+
+BENCHMARK_ROWS = int(os.environ.get('INVOICE_BENCHMARK_ROWS', 2000))
+
+
+class InvoicePricingBenchmark(TestCase):
+    """Pricing every invoice must take one query however many invoices there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(5)
+        student = User.objects.create_user(
+            username='@priced_student',
+            email='priced_student@example.com',
+            password='Password123',
+            user_type=UserType.STUDENT,
+        )
+        tutors = User.objects.bulk_create([
+            User(username=f'@priced_tutor{i}', email=f'priced_tutor{i}@example.com', user_type=UserType.TUTOR)
+            for i in range(10)
+        ])
+        skills = Skill.objects.bulk_create([
+            Skill(language=f'Language{i}', level=SkillLevel.BEGINNER) for i in range(10)
+        ])
+        # One skill per tutor is left unpriced, so some invoices have no price
+        TutorSkill.objects.bulk_create([
+            TutorSkill(tutor=tutor, skill=skill, price_per_hour=Decimal(rng.randint(100, 9999)) / 100)
+            for tutor in tutors for skill in skills[:-1]
+        ])
+        requests = StudentRequest.objects.bulk_create([
+            StudentRequest(
+                student=student,
+                skill=rng.choice(skills),
+                duration=rng.choice([30, 45, 50, 60, 90, 120]),
+                first_term=Term.SEPTEMBER_CHRISTMAS,
+                frequency=rng.choice(Frequency.values),
+                status='approved',
+            ) for _ in range(BENCHMARK_ROWS)
+        ], batch_size=1000)
+        start_time = timezone.now() + timezone.timedelta(days=2)
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(
+                approved_request=request,
+                tutor=rng.choice(tutors),
+                current_term=Term.SEPTEMBER_CHRISTMAS,
+                week_count=rng.randint(1, 13),
+                start_time=start_time,
+                status='ongoing',
+            ) for request in requests
+        ], batch_size=1000)
+        Invoice.objects.bulk_create([
+            Invoice(
+                enrollment=enrollment,
+                amount=Decimal('0.00'),
+                issued_date=timezone.now(),
+                payment_status='unpaid',
+                due_date=start_time,
+            ) for enrollment in enrollments
+        ], batch_size=1000)
+
+    def test_with_subtotal_is_one_query(self):
+        with self.assertNumQueries(1):
+            subtotals = list(Invoice.objects.with_subtotal().values_list('subtotal_amount', flat=True))
+        self.assertEqual(len(subtotals), BENCHMARK_ROWS)
+        self.assertTrue(all(isinstance(subtotal, Decimal) for subtotal in subtotals))
+
+    def test_with_subtotal_matches_subtotal_property(self):
+        sample = Invoice.objects.with_subtotal().order_by('pk')[::BENCHMARK_ROWS // 200 or 1]
+        for invoice in sample:
+            self.assertEqual(invoice.subtotal_amount, invoice.subtotal, invoice.pk)
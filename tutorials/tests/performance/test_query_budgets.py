@@ -0,0 +1,212 @@
+"""Query budget regression tests for every URL in code_tutors/urls.py.
+
+Each page is requested with SMALL related rows seeded, then again with
+QUERY_BUDGET_ROWS (1000 by default). The query counts must match, proving a
+page runs a constant number of queries however much data there is, and stay
+within the page's budget in BUDGETS. Failures list the offending query shapes.
+"""
+import os
+from decimal import Decimal
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from code_tutors.urls import urlpatterns
+from tutorials.middleware import QueryStats
+from tutorials.models import (
+    User, UserType, Skill, SkillLevel, TutorSkill, PendingTutor, StudentRequest, Term, Frequency,
+    Enrollment, Invoice, Ticket, TicketStatus, TutorCandidate
+)
+
+SMALL = 10
+LARGE = int(os.environ.get('QUERY_BUDGET_ROWS', 1000))
+
+# URL name: (user requesting it, or None for anonymous, maximum queries, URL arguments)
+# Arguments name objects created in setUpTestData. A budget of None leaves the
+# page unmeasured.
+BUDGETS = {
+    'home': (None, 0, ()),
+    'log_in': (None, 0, ()),
+    'sign_up': (None, 0, ()),
+    'tutor_signup': (None, 0, ()),
+    # Renders tutor_application_success.html, which does not exist
+    'tutor_application_success': (None, None, ()),
+    'dashboard': ('@studentuser', 2, ()),
+    'log_out': ('@studentuser', 4, ()),
+    'password': ('@studentuser', 2, ()),
+    'profile': ('@studentuser', 2, ()),
+    'my_tickets': ('@studentuser', 3, ()),
+    'submit_ticket': ('@studentuser', 3, ('enrollment',)),
+    'manage_tutors': ('@adminuser', 7, ()),
+    'manage_students': ('@adminuser', 4, ()),
+    'manage_applications': ('@adminuser', 4, ()),
+    'manage_tickets': ('@adminuser', 4, ()),
+    'lesson_request_details': ('@adminuser', 5, ('lesson_request',)),
+    'update_request_status': ('@adminuser', 6, ('lesson_request', 'pending')),
+    'auto_assign_requests': ('@adminuser', 2, ()),
+    'manage_lessons': ('@adminuser', 5, ()),
+    'request_profiles': ('@adminuser', 2, ()),
+    'request_profile': ('@adminuser', 2, ('00000000000000-00000000',)),
+    'metrics': ('@adminuser', 2, ()),
+    'offered_skill_list': ('@studentuser', 3, ()),
+    'student_request_form': ('@studentuser', 3, ('skill',)),
+    'your_requests': ('@studentuser', 3, ()),
+    'delete_your_request': ('@studentuser', 2, ('lesson_request',)),
+    'your_enrollments': ('@studentuser', 3, ()),
+    'invoice': ('@studentuser', 3, ('enrollment',)),
+    'tutor_enrollments': ('@tutoruser', 3, ()),
+}
+
+
+def seed(rows, start):
+    """Create ``rows`` of each kind of record the pages list, numbered from ``start``."""
+    student = User.objects.get(username='@studentuser')
+    tutor = User.objects.get(username='@tutoruser')
+    numbers = range(start, start + rows)
+    users = User.objects.bulk_create([
+        User(username=f'@budget_{kind}{i}', email=f'budget_{kind}{i}@example.com', user_type=user_type)
+        for i in numbers
+        for kind, user_type in (('student', UserType.STUDENT), ('tutor', UserType.TUTOR), ('applicant', UserType.TUTOR))
+    ])
+    students, tutors, applicants = users[0::3], users[1::3], users[2::3]
+    skills = Skill.objects.bulk_create([Skill(language=f'Language{i}', level=SkillLevel.BEGINNER) for i in numbers])
+    TutorSkill.objects.bulk_create(
+        [TutorSkill(tutor=other, skill=skill, price_per_hour=Decimal('30.00')) for other, skill in zip(tutors, skills)]
+        + [TutorSkill(tutor=tutor, skill=skill, price_per_hour=Decimal('40.00')) for skill in skills]
+    )
+    pending_tutors = PendingTutor.objects.bulk_create([PendingTutor(user=applicant) for applicant in applicants])
+    PendingTutor.skills.through.objects.bulk_create([
+        PendingTutor.skills.through(pendingtutor=pending_tutor, skill=skill)
+        for pending_tutor, skill in zip(pending_tutors, skills)
+    ])
+    requests = StudentRequest.objects.bulk_create([
+        StudentRequest(
+            student=owner,
+            skill=skill,
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+            status=status,
+        )
+        for skill, other in zip(skills, students)
+        for owner, status in ((student, 'approved'), (student, 'pending'), (other, 'pending'))
+    ])
+    enrollments = Enrollment.objects.bulk_create([
+        Enrollment(
+            approved_request=request,
+            tutor=tutor,
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now(),
+            status='ongoing',
+        ) for request in requests[0::3]
+    ])
+    Invoice.objects.bulk_create([
+        Invoice(
+            enrollment=enrollment,
+            amount=Decimal('400.00'),
+            issued_date=timezone.now(),
+            due_date=timezone.now(),
+            payment_status='unpaid',
+        ) for enrollment in enrollments
+    ])
+    Ticket.objects.bulk_create([
+        Ticket(user=student, enrollment=enrollment, description='Change of time', status=status)
+        for enrollment in enrollments
+        for status in (TicketStatus.PENDING, TicketStatus.APPROVED)
+    ])
+    TutorCandidate.rebuild()
+
+
+def difference(before, after):
+    """Describe the query shapes run a different number of times in ``after`` than ``before``."""
+    shapes = sorted(set(before.shapes) | set(after.shapes), key=lambda shape: before.shapes[shape] - after.shapes[shape])
+    return '\n'.join(
+        f"  {before.shapes[shape]} -> {after.shapes[shape]}: {shape}"
+        for shape in shapes if before.shapes[shape] != after.shapes[shape]
+    )
+
+
+def describe(stats):
+    """List the query shapes run, most repeated first."""
+    return '\n'.join(f"  {runs}x {shape}" for shape, runs in stats.shapes.most_common())
+
+
+# Compared here with a readable report, rather than failing on the first repeat
+@override_settings(SQL_STRICT=False)
+class QueryBudgetTestCase(TestCase):
+    """Every page must run a constant number of queries, within its budget."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(SMALL, 0)
+        student = User.objects.get(username='@studentuser')
+        cls.skill = Skill.objects.create(language='Budget', level=SkillLevel.BEGINNER)
+        cls.lesson_request = StudentRequest.objects.create(
+            student=student,
+            skill=cls.skill,
+            duration=60,
+            first_term=Term.SEPTEMBER_CHRISTMAS,
+            frequency=Frequency.WEEKLY,
+        )
+        cls.enrollment = Enrollment.objects.create(
+            approved_request=cls.lesson_request,
+            tutor=User.objects.get(username='@tutoruser'),
+            current_term=Term.SEPTEMBER_CHRISTMAS,
+            week_count=10,
+            start_time=timezone.now(),
+            status='ongoing',
+        )
+        Invoice.objects.create(
+            enrollment=cls.enrollment,
+            amount=Decimal('400.00'),
+            issued_date=timezone.now(),
+            due_date=timezone.now(),
+            payment_status='unpaid',
+        )
+
+    def measure(self, name):
+        """Request the page named ``name`` as its user, returning the QueryStats of the request."""
+        username, _budget, arguments = BUDGETS[name]
+        client = Client()
+        if username:
+            client.force_login(User.objects.get(username=username))
+        args = [getattr(self, argument).pk if hasattr(self, argument) else argument for argument in arguments]
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = client.get(reverse(name, args=args))
+        self.assertLess(response.status_code, 500)
+        return stats
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)}
+        self.assertEqual(names - BUDGETS.keys(), set(), "Add a query budget for these URLs")
+        self.assertEqual(BUDGETS.keys() - names, set(), "These URLs no longer exist")
+
+    def measured(self):
+        """Return the names of the URLs with a budget."""
+        return [name for name, (_username, budget, _arguments) in BUDGETS.items() if budget is not None]
+
+    def test_pages_stay_within_budget(self):
+        for name in self.measured():
+            budget = BUDGETS[name][1]
+            with self.subTest(name):
+                stats = self.measure(name)
+                self.assertLessEqual(
+                    stats.count, budget,
+                    f"{name} ran {stats.count} queries, over its budget of {budget}:\n{describe(stats)}",
+                )
+
+    def test_queries_do_not_grow_with_data(self):
+        small = {name: self.measure(name) for name in self.measured()}
+        seed(LARGE - SMALL, SMALL)
+        for name in self.measured():
+            with self.subTest(name):
+                large = self.measure(name)
+                self.assertEqual(
+                    small[name].count, large.count,
+                    f"{name} ran {small[name].count} queries with {SMALL} rows but {large.count} with {LARGE}:\n"
+                    f"{difference(small[name], large)}",
+                )
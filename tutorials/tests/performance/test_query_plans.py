@@ -0,0 +1,76 @@
+"""Query plan regression tests for the hot admin and student querysets."""
+import re
+from django.test import TestCase
+from django.utils import timezone
+from tutorials.models import StudentRequest, TicketStatus, TutorCandidate
+from tutorials.pagination import KeysetPaginator
+from tutorials.views import ManageApplications, ManageLessons, ManageStudents, ManageTickets, ManageTutors
+
+FULL_SCAN = re.compile(r'\bSCAN \w+$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+
+class QueryPlanTestCase(TestCase):
+    """Fail if a hot queryset falls back to a full table scan or a temporary sort."""
+
+    def assert_uses_index(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            line = line.strip()
+            self.assertIsNone(FULL_SCAN.search(line), f"Full table scan in plan:\n{plan}")
+            self.assertIsNone(TEMP_SORT.search(line), f"Temporary sort in plan:\n{plan}")
+
+    def test_manage_applications_sorted_by_created_at(self):
+        view = ManageApplications()
+        self.assert_uses_index(view.get_queryset(sort_by='created_at', order='asc')[:view.paginate_by])
+        self.assert_uses_index(view.get_queryset(sort_by='created_at', order='desc')[:view.paginate_by])
+
+    def test_manage_applications_sorted_by_duration(self):
+        view = ManageApplications()
+        self.assert_uses_index(view.get_queryset(sort_by='duration', order='asc')[:view.paginate_by])
+        self.assert_uses_index(view.get_queryset(sort_by='duration', order='desc')[:view.paginate_by])
+
+    def test_pending_student_requests(self):
+        self.assert_uses_index(StudentRequest.objects.filter(status='pending').order_by('created_at'))
+
+    def test_approved_student_requests(self):
+        self.assert_uses_index(StudentRequest.objects.filter(status='approved'))
+
+    def test_manage_lessons(self):
+        view = ManageLessons()
+        self.assert_uses_index(view.get_queryset()[:view.paginate_by])
+
+    def test_manage_lessons_filtered_by_status(self):
+        view = ManageLessons()
+        self.assert_uses_index(view.get_queryset(status_filter='ongoing')[:view.paginate_by])
+        self.assert_uses_index(view.get_queryset(status_filter='cancelled')[:view.paginate_by])
+
+    def test_manage_tickets(self):
+        tickets = ManageTickets().get_queryset()
+        self.assert_uses_index(tickets.filter(status=TicketStatus.PENDING))
+        self.assert_uses_index(tickets.exclude(status=TicketStatus.PENDING))
+
+    def test_manage_tutors_pending(self):
+        view = ManageTutors()
+        self.assert_uses_index(view.get_queryset()[:view.paginate_by])
+
+    def test_manage_tutors_current(self):
+        self.assert_uses_index(ManageTutors().get_current_tutors_queryset())
+
+    def test_manage_students(self):
+        view = ManageStudents()
+        self.assert_uses_index(view.get_queryset()[:view.paginate_by])
+
+    def test_manage_applications_cursor_seek(self):
+        view = ManageApplications()
+        for order in ('asc', 'desc'):
+            paginator = KeysetPaginator(view.get_queryset(sort_by='created_at', order=order), view.paginate_by)
+            seek = paginator._seek([timezone.now().isoformat(), 1], backwards=False)
+            self.assert_uses_index(seek[:view.paginate_by])
+
+    def test_tutor_candidates_for_skill(self):
+        self.assert_uses_index(TutorCandidate.objects.filter(skill=1).order_by('ongoing_enrollments', 'price_per_hour')[:20])
+
+    def test_tutor_candidates_for_request(self):
+        lesson_request = StudentRequest(pk=1, skill_id=1)
+        self.assert_uses_index(TutorCandidate.objects.for_request(lesson_request)[:20])
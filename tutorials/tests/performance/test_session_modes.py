@@ -0,0 +1,50 @@
+"""Benchmark of the session storage modes.
+
+Makes SESSION_BENCHMARK_REQUESTS signed-in requests (50 by default) in each
+mode, and checks the session table queries each request runs.
+"""
+import os
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+BENCHMARK_REQUESTS = int(os.environ.get('SESSION_BENCHMARK_REQUESTS', 50))
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'session-benchmark',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SessionModeBenchmark(TestCase):
+    """Cached and cookie sessions must spare signed-in requests the session table read."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def session_queries(self, mode):
+        """Return the session table queries per request in a session mode."""
+        with self.settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{mode}'):
+            cache.clear()
+            client = Client()
+            client.login(username='@studentuser', password='Password123')
+            url = reverse('dashboard')
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(BENCHMARK_REQUESTS):
+                    self.assertEqual(client.get(url).status_code, 200)
+        session_queries = [query for query in queries if 'django_session' in query['sql']]
+        return len(session_queries) / BENCHMARK_REQUESTS
+
+    def test_db_sessions_read_the_table_every_request(self):
+        self.assertEqual(self.session_queries('db'), 1)
+
+    def test_cached_db_sessions_are_read_from_cache(self):
+        self.assertEqual(self.session_queries('cached_db'), 0)
+
+    def test_signed_cookie_sessions_use_no_table(self):
+        self.assertEqual(self.session_queries('signed_cookies'), 0)
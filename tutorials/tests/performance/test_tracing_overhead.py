@@ -0,0 +1,53 @@
+"""Benchmark for the cost of recording every request's spans while TRACE_SLOW_MS is set.
+
+With TRACE_SLOW_MS set, every request is recorded in full so that a slow one
+can be exported, though most are then dropped. Recording one must add less
+than TRACING_OVERHEAD_BUDGET to its time. Timings this close are only
+compared when TRACING_BENCHMARK is set, on an otherwise idle machine.
+"""
+import gc
+import os
+from statistics import median
+from time import perf_counter
+from unittest import skipUnless
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+# Fraction by which recording a request's spans, without exporting them, may slow it down
+TRACING_OVERHEAD_BUDGET = 0.02
+
+ROUNDS = 40
+REQUESTS_PER_ROUND = 20
+
+
+class TracingOverheadBenchmark(TestCase):
+    """Recording every request for tail sampling must add under 2% to its time."""
+
+    fixtures = ['tutorials/tests/fixtures/default_user.json', 'tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.url = reverse('manage_tutors')
+        self.client.get(self.url)
+
+    def time_round(self, **settings):
+        """Return how long a round of requests to the page takes under these settings."""
+        with override_settings(**settings):
+            gc.disable()
+            try:
+                started = perf_counter()
+                for _ in range(REQUESTS_PER_ROUND):
+                    self.client.get(self.url)
+                return perf_counter() - started
+            finally:
+                gc.enable()
+
+    @skipUnless(os.environ.get('TRACING_BENCHMARK'), 'Set TRACING_BENCHMARK to time the cost of recording')
+    def test_recording_spans_stays_within_budget(self):
+        overheads = []
+        # Each recorded round is compared with an untraced one run just before, so changes in the machine's speed cancel out
+        for _ in range(ROUNDS):
+            untraced = self.time_round(TRACE_SAMPLE_RATE=0, TRACE_SLOW_MS=None)
+            recorded = self.time_round(TRACE_SAMPLE_RATE=0, TRACE_SLOW_MS=float('inf'))
+            overheads.append(recorded / untraced - 1)
+        self.assertLess(median(overheads), TRACING_OVERHEAD_BUDGET)
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.messages import get_messages
+from tutorials.models import User, Skill, StudentRequest, TutorSkill, Enrollment, Invoice
+
+
+class AutoAssignViewTests(TestCase):
+    """Tests for the auto_assign_requests view."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.student = User.objects.get(username='@studentuser')
+        self.tutor = User.objects.get(username='@tutoruser')
+        self.skill = Skill.objects.create(language="Python", level="Beginner")
+        TutorSkill.objects.create(tutor=self.tutor, skill=self.skill, price_per_hour=20)
+        self.student_request = StudentRequest.objects.create(
+            student=self.student,
+            skill=self.skill,
+            duration=60,
+            first_term="January-Easter",
+            frequency="weekly",
+            status="pending",
+        )
+        self.url = reverse('auto_assign_requests')
+
+    def test_post_assigns_waiting_requests(self):
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.post(self.url)
+        self.assertRedirects(response, reverse('manage_applications'))
+        enrollment = Enrollment.objects.get(approved_request=self.student_request)
+        self.assertEqual(enrollment.tutor, self.tutor)
+        self.assertTrue(Invoice.objects.filter(enrollment=enrollment).exists())
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn("1 request(s) assigned.", messages)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auto-assign'}})
+    def test_application_counts_are_refreshed(self):
+        cache.clear()
+        self.client.login(username='@adminuser', password='Password123')
+        applications_url = reverse('manage_applications')
+        response = self.client.get(applications_url)
+        approved = response.context['total_approved_lessons']
+        self.assertEqual(response.context['pending_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url)
+        response = self.client.get(applications_url)
+        self.assertEqual(response.context['pending_count'], 0)
+        self.assertEqual(response.context['total_approved_lessons'], approved + 1)
+
+    def test_get_does_not_assign(self):
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('manage_applications'))
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_non_admin_cannot_assign(self):
+        self.client.login(username='@studentuser', password='Password123')
+        self.client.post(self.url)
+        self.assertFalse(Enrollment.objects.exists())
@@ -140,4 +140,24 @@ class LessonRequestDetailsViewTests(TestCase):
 
         # Check if the enrollment is updated
         existing_enrollment.refresh_from_db()
-        self.assertEqual(existing_enrollment.tutor, new_tutor)
\ No newline at end of file
+        self.assertEqual(existing_enrollment.tutor, new_tutor)
+
+    def test_candidates_are_ranked_in_constant_queries(self):
+        """Test the tutor candidates are listed with a fixed number of queries."""
+        self.login_as_admin()
+        self.client.get(self.url)
+        for i in range(10):
+            tutor = User.objects.create_user(
+                username=f'@rankedtutor{i}',
+                password='Password123',
+                user_type=UserType.TUTOR,
+                email=f'rankedtutor{i}@example.com',
+            )
+            TutorSkill.objects.create(tutor=tutor, skill=self.skill, price_per_hour=i + 1)
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        candidates = list(response.context['candidates'])
+        self.assertEqual(len(candidates), 11)
+        self.assertEqual(candidates[0].tutor, self.tutor)
+        self.assertEqual([candidate.price_per_hour for candidate in candidates[1:]], list(range(1, 11)))
+        self.assertNotIn(self.tutor_without_skill, [candidate.tutor for candidate in candidates])
@@ -0,0 +1,341 @@
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from tutorials import caching, metrics
+from tutorials.models import User, Skill, SkillLevel, StudentRequest, TutorSkill
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cached-reads-tests',
+    },
+}
+
+# The tests run in one process, so its local memory cache is shared by every request
+CACHED_DB_SESSIONS = 'django.contrib.sessions.backends.cached_db'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_SHARED=True, SESSION_ENGINE=CACHED_DB_SESSIONS)
+class CachedReadsTestCase(TestCase):
+    """Tests of the cached skill catalog and current tutor table."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+        self.tutor = User.objects.get(username='@tutoruser')
+        self.skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        self.tutor_skill = TutorSkill.objects.create(tutor=self.tutor, skill=self.skill, price_per_hour=40)
+        self.skill_list_url = reverse('offered_skill_list')
+        self.manage_tutors_url = reverse('manage_tutors')
+
+    def skill_languages(self, **params):
+        response = self.client.get(self.skill_list_url, params)
+        return [skill.language for skill in response.context['skills']]
+
+    def test_skill_catalog_is_served_from_cache(self):
+        self.client.login(username='@studentuser', password='Password123')
+        self.assertEqual(self.skill_languages(), ['Python'])
+        with self.assertNumQueries(0):
+            # The session and the user are cached too
+            self.assertEqual(self.skill_languages(), ['Python'])
+        self.assertEqual(caching.get_stats()['skill_catalog']['shared'], {'hits': 1, 'misses': 1, 'stale': 0})
+
+    def test_skill_catalog_is_invalidated_by_skill_changes(self):
+        self.client.login(username='@studentuser', password='Password123')
+        self.assertEqual(self.skill_languages(), ['Python'])
+        skill = Skill.objects.create(language='Rust', level=SkillLevel.BEGINNER)
+        self.assertEqual(sorted(self.skill_languages()), ['Python', 'Rust'])
+        skill.delete()
+        self.assertEqual(self.skill_languages(), ['Python'])
+
+    def test_skill_catalog_varies_on_filters(self):
+        self.client.login(username='@studentuser', password='Password123')
+        Skill.objects.create(language='Rust', level=SkillLevel.ADVANCED)
+        self.assertEqual(self.skill_languages(q='rust'), ['Rust'])
+        self.assertEqual(self.skill_languages(q='python'), ['Python'])
+        self.assertEqual(self.skill_languages(level=SkillLevel.ADVANCED), ['Rust'])
+
+    def test_cached_page_keeps_its_cursors(self):
+        self.client.login(username='@studentuser', password='Password123')
+        for i in range(12):
+            Skill.objects.create(language=f'Language {i:02}', level=SkillLevel.BEGINNER)
+        first = self.client.get(self.skill_list_url).context['skills']
+        cached = self.client.get(self.skill_list_url).context['skills']
+        self.assertEqual(cached.next_cursor, first.next_cursor)
+        second = self.client.get(self.skill_list_url, {'cursor': cached.next_cursor}).context['skills']
+        self.assertEqual(second.number, 2)
+        self.assertEqual(len(first) + len(second), 13)
+
+    def test_current_tutors_are_served_from_cache(self):
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.get(self.manage_tutors_url)
+        self.assertContains(response, '40.00 USD')
+        with self.assertNumQueries(2):
+            # The pending tutors page and the counters
+            response = self.client.get(self.manage_tutors_url)
+        self.assertIn(self.tutor, response.context['current_tutors'])
+        self.assertEqual(caching.get_stats()['current_tutors']['shared'], {'hits': 1, 'misses': 1, 'stale': 0})
+
+    def test_current_tutors_are_invalidated_by_tutor_skill_changes(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(self.manage_tutors_url)
+        self.tutor_skill.price_per_hour = 55
+        self.tutor_skill.save()
+        self.assertContains(self.client.get(self.manage_tutors_url), '55.00 USD')
+
+    def test_current_tutors_are_invalidated_by_user_changes(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(self.manage_tutors_url)
+        self.tutor.is_active = False
+        self.tutor.save()
+        self.assertNotIn(self.tutor, self.client.get(self.manage_tutors_url).context['current_tutors'])
+
+    def test_application_counts_are_cached_until_a_request_changes(self):
+        self.client.login(username='@adminuser', password='Password123')
+        url = reverse('manage_applications')
+        student = User.objects.get(username='@studentuser')
+        lesson_request = StudentRequest.objects.create(student=student, skill=self.skill, duration=60)
+        self.assertEqual(self.client.get(url).context['pending_count'], 1)
+        self.client.get(url)
+        self.assertEqual(caching.get_stats()['application_counts']['shared']['hits'], 1)
+        lesson_request.status = 'approved'
+        lesson_request.save()
+        response = self.client.get(url)
+        self.assertEqual(response.context['pending_count'], 0)
+        self.assertEqual(response.context['total_approved_lessons'], 1)
+
+    def test_logging_in_keeps_the_cache(self):
+        versions = caching.get_versions(caching.USER)
+        self.client.login(username='@tutoruser', password='Password123')
+        self.assertEqual(caching.get_versions(caching.USER), versions)
+
+    def test_versions_are_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.skill.save()
+        saved = caching.get_versions(caching.SKILL)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(caching.get_versions(caching.SKILL), saved)
+
+    def test_reads_are_counted_without_writing_to_the_cache(self):
+        self.client.get(self.skill_list_url)
+        with mock.patch.object(cache, 'incr') as incr, mock.patch.object(cache, 'add') as add:
+            self.client.get(self.skill_list_url)
+        incr.assert_not_called()
+        add.assert_not_called()
+
+    def count_in_other_process(self, tier, outcome, amount):
+        other = metrics.Registry()
+        other.inc(metrics.CACHE_READS, amount, read='skill_catalog', tier=tier, outcome=outcome)
+        path = metrics.metrics_dir() / '999999999.json'
+        metrics.write_snapshot(path, other.snapshot())
+        # Folded into this process's counts once collected, as no process has that pid
+        self.addCleanup(path.unlink, missing_ok=True)
+
+    def test_stats_add_up_every_process(self):
+        self.count_in_other_process('shared', 'hits', 3)
+        self.assertEqual(caching.get_stats()['skill_catalog']['shared']['hits'], 3)
+
+    def test_command_reports_local_tiers_of_other_processes(self):
+        self.count_in_other_process('local', 'hits', 3)
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('skill_catalog (local): 3 hits, 0 misses (100% hit rate)', out.getvalue())
+        self.assertEqual(caching.get_stats()['skill_catalog']['local'], {'hits': 0, 'misses': 0})
+
+
+class CachingDisabledTestCase(TestCase):
+    """Tests of cached reads with the test suite's dummy cache."""
+
+    def test_cached_computes_every_time(self):
+        calls = []
+        before = caching.get_stats(['test'])['test']['shared']
+        for _ in range(2):
+            self.assertEqual(caching.cached('test', (caching.SKILL,), lambda: calls.append(1) or 'value'), 'value')
+        self.assertEqual(len(calls), 2)
+        caching.bump_version(caching.SKILL)
+        after = caching.get_stats(['test'])['test']['shared']
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'], before['hits'])
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    """Tests of the per-process LRU tier."""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        local = caching.LocalCache(max_entries=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual(len(local), 2)
+        self.assertEqual(local.get('a'), 1)
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('c'), 3)
+
+    def test_entries_expire_after_ttl(self):
+        local = caching.LocalCache(max_entries=2, ttl=5)
+        with mock.patch('tutorials.caching.time.monotonic', return_value=100):
+            local.set('a', 1)
+        with mock.patch('tutorials.caching.time.monotonic', return_value=104):
+            self.assertEqual(local.get('a'), 1)
+        with mock.patch('tutorials.caching.time.monotonic', return_value=105):
+            self.assertIsNone(local.get('a'))
+
+    def test_zero_entries_disables_the_tier(self):
+        local = caching.LocalCache(max_entries=0, ttl=5)
+        local.set('a', 1)
+        self.assertIsNone(local.get('a'))
+
+
+class TwoTierCacheTestCase(SimpleTestCase):
+    """Tests of reads through the local tier in front of the shared cache."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.stamp = os.path.join(directory.name, 'stamp')
+        overrides = override_settings(
+            CACHES=LOCMEM_CACHE,
+            CACHE_LOCAL_MAX_ENTRIES=100,
+            CACHE_LOCAL_TTL=60,
+            CACHE_VERSION_STAMP=self.stamp,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        caching.reset_stats(['test'])
+        self.calls = 0
+
+    def read(self):
+        def compute():
+            self.calls += 1
+            return self.calls
+        return caching.cached('test', (caching.SKILL,), compute)
+
+    def bump_in_other_process(self):
+        """Bump the skill version the way another worker would, leaving this process's local tier alone."""
+        cache.incr(f'{caching.KEY_PREFIX}:version:{caching.SKILL}')
+        stamp = os.stat(self.stamp).st_mtime_ns if os.path.exists(self.stamp) else 0
+        open(self.stamp, 'a').close()
+        os.utime(self.stamp, ns=(stamp + 1000, stamp + 1000))
+
+    def test_repeated_reads_are_served_locally(self):
+        self.assertEqual(self.read(), 1)
+        with mock.patch.object(caching, 'get_cache', side_effect=AssertionError('shared tier used')):
+            self.assertEqual(self.read(), 1)
+        stats = caching.get_stats(['test'])['test']
+        self.assertEqual(stats['local'], {'hits': 1, 'misses': 1})
+        self.assertEqual(stats['shared'], {'hits': 0, 'misses': 1, 'stale': 0})
+
+    def test_other_process_reads_from_shared_tier(self):
+        self.assertEqual(self.read(), 1)
+        caching.clear_local_tier()
+        self.assertEqual(self.read(), 1)
+        self.assertEqual(caching.get_stats(['test'])['test']['shared'], {'hits': 1, 'misses': 1, 'stale': 0})
+
+    def test_bump_invalidates_local_reads(self):
+        self.assertEqual(self.read(), 1)
+        caching.bump_version(caching.SKILL)
+        self.assertEqual(self.read(), 2)
+
+    def test_stamp_change_invalidates_local_reads(self):
+        self.assertEqual(self.read(), 1)
+        self.bump_in_other_process()
+        self.assertEqual(self.read(), 2)
+
+    def test_stale_reads_are_bounded_by_ttl_without_stamp(self):
+        with override_settings(CACHE_VERSION_STAMP=None, CACHE_LOCAL_TTL=5):
+            with mock.patch('tutorials.caching.time.monotonic', return_value=100):
+                self.assertEqual(self.read(), 1)
+                self.bump_in_other_process()
+                self.assertEqual(self.read(), 1)
+            with mock.patch('tutorials.caching.time.monotonic', return_value=105):
+                self.assertEqual(self.read(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StampedeProtectionTestCase(SimpleTestCase):
+    """Tests of single-flight recomputation and serving stale values."""
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats(['test'])
+        self.computes = 0
+        self.lock = threading.Lock()
+
+    def compute(self):
+        with self.lock:
+            self.computes += 1
+            computes = self.computes
+        time.sleep(0.2)
+        return computes
+
+    def read_concurrently(self, readers=50, **kwargs):
+        barrier = threading.Barrier(readers)
+        results = []
+
+        def read():
+            barrier.wait()
+            value = caching.cached('test', (caching.SKILL,), self.compute, **kwargs)
+            with self.lock:
+                results.append(value)
+
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_simultaneous_misses_recompute_once(self):
+        results = self.read_concurrently()
+        self.assertEqual(self.computes, 1)
+        self.assertEqual(results, [1] * 50)
+
+    def test_expired_value_is_served_while_one_caller_recomputes(self):
+        self.assertEqual(caching.cached('test', (caching.SKILL,), self.compute, timeout=0), 1)
+        results = self.read_concurrently(timeout=60)
+        self.assertEqual(self.computes, 2)
+        self.assertEqual(results.count(2), 1)
+        self.assertEqual(results.count(1), 49)
+        self.assertEqual(caching.get_stats(['test'])['test']['shared']['stale'], 49)
+
+    def test_last_value_is_served_across_versions_while_recomputing(self):
+        self.assertEqual(caching.cached('test', (caching.SKILL,), self.compute), 1)
+        caching.bump_version(caching.SKILL)
+        results = self.read_concurrently()
+        self.assertEqual(self.computes, 2)
+        self.assertEqual(sorted(results), [1] * 49 + [2])
+
+    def test_stale_value_is_served_when_database_is_locked(self):
+        self.assertEqual(caching.cached('test', (caching.SKILL,), self.compute, timeout=0), 1)
+
+        def locked():
+            raise OperationalError('database is locked')
+
+        self.assertEqual(caching.cached('test', (caching.SKILL,), locked), 1)
+
+    def test_database_error_without_stale_value_is_raised(self):
+        def locked():
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            caching.cached('test', (caching.SKILL,), locked)
+
+    def test_value_is_refreshed_early_as_expiry_nears(self):
+        entry = ('old', time.time() + 10, 1.0)
+        self.assertFalse(caching._needs_refresh(entry))
+        with mock.patch('tutorials.caching.random.random', return_value=1 - 1e-6):
+            self.assertTrue(caching._needs_refresh(entry))
+        self.assertTrue(caching._needs_refresh(('old', time.time() - 1, 0.0)))
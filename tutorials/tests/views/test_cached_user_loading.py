@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from tutorials import caching
+from tutorials.models import User, UserType
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cached-user-tests',
+    },
+}
+
+# The tests run in one process, so its local memory cache is shared by every request
+CACHED_DB_SESSIONS = 'django.contrib.sessions.backends.cached_db'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_SHARED=True, SESSION_ENGINE=CACHED_DB_SESSIONS)
+class CachedUserLoadingTestCase(TestCase):
+    """Tests of loading the signed-in user from the cache."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats(['users'])
+        self.client.login(username='@studentuser', password='Password123')
+        # Fetched after logging in, which may upgrade the stored password hash
+        self.user = User.objects.get(username='@studentuser')
+        self.url = reverse('dashboard')
+
+    def test_signed_in_user_is_loaded_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            # The session is cached too
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(caching.get_stats(['users'])['users']['shared']['hits'], 1)
+
+    def test_sessions_signed_in_by_model_backend_are_kept(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.user)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_signed_in_user_is_loaded_from_the_table_without_a_shared_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(caching.get_stats(['users'])['users']['shared']['hits'], 0)
+
+    def test_role_change_is_seen_on_next_request(self):
+        admin_url = reverse('manage_tutors')
+        self.assertEqual(self.client.get(admin_url).status_code, 403)
+        self.user.user_type = UserType.ADMIN
+        self.user.save()
+        self.assertEqual(self.client.get(admin_url).status_code, 200)
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.get(self.url)
+        self.user.set_password('NewPassword123')
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, f"{reverse('log_in')}?next={self.url}")
+
+    def test_deactivated_user_is_signed_out(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, f"{reverse('log_in')}?next={self.url}")
+
+    def test_bulk_role_change_is_seen_within_ttl(self):
+        admin_url = reverse('manage_tutors')
+        self.client.get(self.url)
+        User.objects.filter(pk=self.user.pk).update(user_type=UserType.ADMIN)
+        # No signal is sent, so the cached role holds until it expires
+        self.assertEqual(self.client.get(admin_url).status_code, 403)
+        with override_settings(CACHE_USER_TTL=0):
+            cache.delete(caching.user_key(self.user.pk))
+            self.assertEqual(self.client.get(admin_url).status_code, 200)
+            User.objects.filter(pk=self.user.pk).update(user_type=UserType.STUDENT)
+            self.assertEqual(self.client.get(admin_url).status_code, 403)
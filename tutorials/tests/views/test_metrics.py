@@ -0,0 +1,153 @@
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from unittest import skipIf
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from tutorials import caching, metrics
+
+
+class TemporaryMetricsMixin:
+    """Count from zero into files in a temporary directory."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+
+class RegistryTestCase(TemporaryMetricsMixin, SimpleTestCase):
+    """Tests of counting and exposing metrics."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        for seconds in (0.001, 0.02, 0.02, 20):
+            registry.observe(metrics.REQUEST_DURATION, seconds, view='home', method='GET')
+        text = metrics.exposition(registry)
+        labels = 'method="GET",view="home"'
+        self.assertIn(f'{metrics.REQUEST_DURATION}_bucket{{{labels},le="0.005"}} 1', text)
+        self.assertIn(f'{metrics.REQUEST_DURATION}_bucket{{{labels},le="0.025"}} 3', text)
+        self.assertIn(f'{metrics.REQUEST_DURATION}_bucket{{{labels},le="10.0"}} 3', text)
+        self.assertIn(f'{metrics.REQUEST_DURATION}_bucket{{{labels},le="+Inf"}} 4', text)
+        self.assertIn(f'{metrics.REQUEST_DURATION}_count{{{labels}}} 4', text)
+        self.assertIn(f'# TYPE {metrics.REQUEST_DURATION} histogram', text)
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.Registry()
+        registry.inc(metrics.RESPONSES, view='a"b\\c', status='200')
+        self.assertIn(f'{metrics.RESPONSES}{{status="200",view="a\\"b\\\\c"}} 1', metrics.exposition(registry))
+
+    def test_collect_adds_up_every_process(self):
+        other = metrics.Registry()
+        other.inc(metrics.RESPONSES, 2, view='home', status='200')
+        other.observe(metrics.TEMPLATE_DURATION, 0.01, template='home.html')
+        (self.directory / '1.json').write_text(json.dumps(other.snapshot()))
+        metrics.inc(metrics.RESPONSES, view='home', status='200')
+
+        collected = metrics.collect()
+        self.assertEqual(collected.counters[(metrics.RESPONSES, (('status', '200'), ('view', 'home')))], 3)
+        self.assertEqual(sum(collected.histograms[(metrics.TEMPLATE_DURATION, (('template', 'home.html'),))][0]), 1)
+
+    def test_process_resumes_counts_left_under_its_pid(self):
+        earlier = metrics.Registry()
+        earlier.inc(metrics.DB_QUERIES, 5, view='home')
+        metrics.process_file().parent.mkdir(parents=True, exist_ok=True)
+        metrics.process_file().write_text(json.dumps(earlier.snapshot()))
+
+        registry = metrics.Registry()
+        registry.inc(metrics.DB_QUERIES, 1, view='home')
+        registry.flush()
+        self.assertEqual(registry.counters[(metrics.DB_QUERIES, (('view', 'home'),))], 6)
+
+    def test_threads_can_flush_together(self):
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(20):
+                    metrics.inc(metrics.DB_QUERIES, view='home')
+                    metrics.registry.flush()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=flush) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        snapshot = metrics.read_snapshot(metrics.process_file())
+        self.assertEqual(snapshot['counters'], [[metrics.DB_QUERIES, {'view': 'home'}, 80]])
+
+    @skipIf(metrics.fcntl is None, 'The files of exited processes are kept without fcntl')
+    def test_files_of_exited_processes_are_folded_in(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        exited = metrics.Registry()
+        exited.inc(metrics.RESPONSES, 2, view='home', status='200')
+        (self.directory / f'{process.pid}.json').write_text(json.dumps(exited.snapshot()))
+        metrics.inc(metrics.RESPONSES, view='home', status='200')
+
+        collected = metrics.collect()
+        self.assertEqual(collected.counters[(metrics.RESPONSES, (('status', '200'), ('view', 'home')))], 3)
+        self.assertFalse((self.directory / f'{process.pid}.json').exists())
+        self.assertEqual(
+            metrics.collect().counters[(metrics.RESPONSES, (('status', '200'), ('view', 'home')))], 3
+        )
+
+
+class MetricsViewTestCase(TemporaryMetricsMixin, TestCase):
+    """Tests of the metrics endpoint."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('metrics')
+
+    def test_admin_sees_request_metrics(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.client.get(reverse('dashboard'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn(f'{metrics.RESPONSES}{{status="200",view="dashboard"}} 1', text)
+        self.assertIn(f'{metrics.DB_QUERIES}{{view="dashboard"}} 2', text)
+        self.assertIn(f'{metrics.REQUEST_DURATION}_count{{method="GET",view="dashboard"}} 1', text)
+        self.assertIn(f'{metrics.TEMPLATE_DURATION}_count{{template="dashboard.html"}} 1', text)
+
+    def test_unmatched_paths_share_one_label(self):
+        self.client.get('/no-such-page/')
+        self.client.get('/nor-this-one/')
+        self.assertEqual(metrics.registry.counters[(metrics.RESPONSES, (('status', '404'), ('view', '<unmatched>')))], 2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics'}})
+    def test_cache_reads_are_counted(self):
+        caching.get_cache().clear()
+        for _ in range(2):
+            caching.cached('skill_catalog', [caching.SKILL], lambda: ['Python'])
+        counters = metrics.registry.counters
+        shared = (('read', 'skill_catalog'), ('tier', 'shared'))
+        self.assertEqual(counters[(metrics.CACHE_READS, (('outcome', 'misses'), *shared))], 1)
+        self.assertEqual(counters[(metrics.CACHE_READS, (('outcome', 'hits'), *shared))], 1)
+
+    def test_non_admins_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.login(username='@studentuser', password='Password123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_scraper_token(self):
+        response = self.client.get(self.url, headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,143 @@
+"""Tests for the keyset paginator."""
+from datetime import timedelta
+from urllib.parse import urlencode
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from tutorials.models import User, Skill, SkillLevel, StudentRequest, Term, Frequency
+from tutorials.pagination import KeysetPaginator
+
+
+class KeysetPaginatorTestCase(TestCase):
+    """Unit tests for KeysetPaginator."""
+
+    def setUp(self):
+        # Languages repeat across levels, so the ordering has ties the pk must break
+        for i in range(4):
+            for level in SkillLevel.values:
+                Skill.objects.create(language=f'Lang{i}', level=level)
+
+    def walk_forward(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_first_page_does_not_count(self):
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        with self.assertNumQueries(1):
+            page = paginator.page()
+            self.assertEqual(len(page), 5)
+            self.assertTrue(page.has_next())
+            self.assertFalse(page.has_previous())
+
+    def test_count_is_available_on_demand(self):
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        self.assertEqual(paginator.count, 12)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertEqual(list(paginator.page_range), [1, 2, 3])
+
+    def test_pk_is_appended_as_tiebreaker(self):
+        self.assertEqual(KeysetPaginator(Skill.objects.all(), 5).ordering, ['language', 'pk'])
+        self.assertEqual(KeysetPaginator(Skill.objects.order_by('-language'), 5).ordering, ['-language', '-pk'])
+        self.assertEqual(KeysetPaginator(Skill.objects.order_by('id'), 5).ordering, ['id'])
+
+    def test_forward_walk_matches_queryset_order(self):
+        for ordering in (['language'], ['-language'], ['level', '-language']):
+            queryset = Skill.objects.order_by(*ordering)
+            pages = self.walk_forward(KeysetPaginator(queryset, 5))
+            walked = [skill for page in pages for skill in page]
+            self.assertEqual(walked, list(queryset.order_by(*ordering, 'pk' if not ordering[0].startswith('-') else '-pk')))
+            self.assertEqual([page.number for page in pages], [1, 2, 3])
+
+    def test_backward_walk_returns_same_pages(self):
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        pages = self.walk_forward(paginator)
+        page = pages[-1]
+        while page.has_previous():
+            previous = paginator.page(page.previous_cursor)
+            self.assertEqual(list(previous), list(pages[previous.number - 1]))
+            page = previous
+        self.assertEqual(page.number, 1)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_last_page_has_no_next_cursor(self):
+        pages = self.walk_forward(KeysetPaginator(Skill.objects.all(), 5))
+        self.assertFalse(pages[-1].has_next())
+        self.assertIsNone(pages[-1].next_cursor)
+
+    def test_tampered_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        cursor = paginator.page().next_cursor
+        page = paginator.page(cursor[:-2] + 'xx')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(list(page), list(paginator.page()))
+
+    def test_cursor_from_other_ordering_is_ignored(self):
+        cursor = KeysetPaginator(Skill.objects.order_by('level'), 5).page().next_cursor
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        self.assertEqual(paginator.page(cursor).number, 1)
+
+    def test_page_number_fallback(self):
+        paginator = KeysetPaginator(Skill.objects.all(), 5)
+        self.assertEqual(paginator.get_page(number='abc').number, 1)
+        self.assertEqual(paginator.get_page(number='999').number, 3)
+        self.assertEqual(list(paginator.get_page(number='2')), list(Skill.objects.order_by('language', 'pk')[5:10]))
+
+    def test_expression_ordering_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            KeysetPaginator(Skill.objects.order_by(F('language').desc()), 5)
+
+
+class ManageApplicationsKeysetTestCase(TestCase):
+    """Walk the admin lesson request list page by page using cursors."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.client.login(username='@adminuser', password='Password123')
+        student = User.objects.get(username='@studentuser')
+        skill = Skill.objects.create(language='Python', level=SkillLevel.BEGINNER)
+        created_at = timezone.now()
+        for i in range(40):
+            request = StudentRequest.objects.create(
+                student=student,
+                skill=skill,
+                duration=[30, 60, 90][i % 3],
+                first_term=Term.SEPTEMBER_CHRISTMAS,
+                frequency=Frequency.WEEKLY,
+                status=['pending', 'approved', 'rejected'][i % 3],
+            )
+            # Pairs of requests share a timestamp to exercise the tiebreaker
+            StudentRequest.objects.filter(pk=request.pk).update(created_at=created_at + timedelta(seconds=i // 2))
+        self.url = reverse('manage_applications')
+
+    def walk(self, params):
+        response = self.client.get(self.url, params)
+        pages = [response.context['student_requests']]
+        while pages[-1].has_next():
+            response = self.client.get(self.url, {**params, 'cursor': pages[-1].next_cursor})
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.context['student_requests'])
+        return [request for page in pages for request in page]
+
+    def test_cursor_walk_preserves_visible_ordering(self):
+        status_rank = {'approved': 1, 'pending': 2, 'rejected': 3}
+        for params, key, reverse_order in (
+            ({'sort_by': 'created_at', 'order': 'asc'}, lambda r: r.created_at, False),
+            ({'sort_by': 'created_at', 'order': 'desc'}, lambda r: r.created_at, True),
+            ({'sort_by': 'duration', 'order': 'desc'}, lambda r: r.duration, True),
+            ({'sort_by': 'status', 'order': 'asc_approved'}, lambda r: status_rank[r.status], False),
+        ):
+            walked = self.walk(params)
+            self.assertEqual(len(walked), 40)
+            self.assertEqual(len({request.pk for request in walked}), 40)
+            self.assertEqual([key(r) for r in walked], sorted((key(r) for r in walked), reverse=reverse_order))
+
+    def test_page_links_carry_cursor_and_sort(self):
+        response = self.client.get(self.url, {'sort_by': 'duration', 'order': 'asc'})
+        page = response.context['student_requests']
+        self.assertContains(response, urlencode({'cursor': page.next_cursor}))
+        self.assertContains(response, 'sort_by=duration')
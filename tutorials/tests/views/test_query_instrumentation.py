@@ -0,0 +1,107 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from tutorials.middleware import QueryStats, RepeatedQueryError, query_shape
+from tutorials.models import User, Skill, StudentRequest, Enrollment, Ticket, Term, Frequency
+
+# Comfortably more rows than the strict repeated query limit
+ROWS = 15
+
+
+def execute(sql, params, many, context):
+    return None
+
+
+class QueryStatsTestCase(SimpleTestCase):
+    """Tests of counting a request's queries by shape."""
+
+    def test_query_shape_normalises_whitespace_and_in_lists(self):
+        self.assertEqual(
+            query_shape('SELECT "id"\n  FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            query_shape('SELECT "id" FROM "t" WHERE "id" IN (%s)'),
+        )
+
+    def test_counts_queries_and_repeated_shapes(self):
+        stats = QueryStats()
+        for sql in ['SELECT 1 FROM "a" WHERE "id" = %s'] * 3 + ['SELECT 1 FROM "b"', 'SAVEPOINT "s1"']:
+            stats(execute, sql, (), False, {})
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.repeated(), {'SELECT 1 FROM "a" WHERE "id" = %s': 3})
+
+    def test_limit_raises_on_repeated_shape(self):
+        stats = QueryStats(limit=2)
+        stats(execute, 'SELECT 1 FROM "a"', (), False, {})
+        stats(execute, 'SELECT 1 FROM "a"', (), False, {})
+        with self.assertRaises(RepeatedQueryError):
+            stats(execute, 'SELECT 1 FROM "a"', (), False, {})
+
+
+class QueryInstrumentationMiddlewareTestCase(TestCase):
+    """Tests of the per-request SQL instrumentation."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.student = User.objects.get(username='@studentuser')
+        self.tutor = User.objects.get(username='@tutoruser')
+        self.skill = Skill.objects.create(language='Python', level='Beginner')
+
+    def create_enrollments(self):
+        enrollments = []
+        for _ in range(ROWS):
+            student_request = StudentRequest.objects.create(
+                student=self.student,
+                skill=self.skill,
+                duration=60,
+                first_term=Term.JANUARY_EASTER,
+                frequency=Frequency.WEEKLY,
+                status='approved',
+            )
+            enrollments.append(Enrollment.objects.create(
+                approved_request=student_request,
+                tutor=self.tutor,
+                current_term=Term.JANUARY_EASTER,
+                week_count=10,
+                start_time=timezone.now(),
+                status='ongoing',
+            ))
+        return enrollments
+
+    def test_response_has_server_timing_header(self):
+        self.client.login(username='@studentuser', password='Password123')
+        response = self.client.get(reverse('dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d+;desc="\d+ queries"$')
+
+    def test_request_is_logged(self):
+        self.client.login(username='@studentuser', password='Password123')
+        with self.assertLogs('tutorials.sql', 'INFO') as logs:
+            self.client.get(reverse('dashboard'))
+        record = logs.records[-1]
+        self.assertEqual(record.method, 'GET')
+        self.assertEqual(record.path, reverse('dashboard'))
+        self.assertEqual(record.status, 200)
+        self.assertGreater(record.queries, 0)
+        self.assertIsInstance(record.repeated, dict)
+
+    def test_strict_mode_rejects_repeated_queries(self):
+        self.client.login(username='@studentuser', password='Password123')
+        with override_settings(SQL_REPEATED_QUERY_LIMIT=0):
+            with self.assertRaises(RepeatedQueryError):
+                self.client.get(reverse('dashboard'))
+
+    def test_your_enrollments_queries_do_not_grow_with_enrollments(self):
+        self.create_enrollments()
+        self.client.login(username='@studentuser', password='Password123')
+        response = self.client.get(reverse('your_enrollments'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['enrollments']), ROWS)
+
+    def test_manage_tickets_queries_do_not_grow_with_tickets(self):
+        for enrollment in self.create_enrollments():
+            Ticket.objects.create(
+                user=self.student, enrollment=enrollment, ticket_type='cancellation', description='Cancel', status='Pending',
+            )
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.get(reverse('manage_tickets'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.tutor.username)
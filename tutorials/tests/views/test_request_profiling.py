@@ -0,0 +1,144 @@
+import tempfile
+import time
+from collections import Counter
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from tutorials import profiling
+
+
+class FlamegraphTestCase(SimpleTestCase):
+    """Tests of laying out sampled stacks as a flamegraph."""
+
+    def test_flame_rows(self):
+        rows = profiling.flame_rows(Counter({'a;b': 3, 'a;c': 1, 'd': 4}))
+        self.assertEqual(
+            [(frame['name'], frame['left'], frame['width']) for frame in rows[0]],
+            [('a', 0.0, 50.0), ('d', 50.0, 50.0)],
+        )
+        self.assertEqual(
+            [(frame['name'], frame['left'], frame['width']) for frame in rows[1]],
+            [('b', 0.0, 37.5), ('c', 37.5, 12.5)],
+        )
+        self.assertEqual(len(rows), 2)
+
+    def test_no_samples(self):
+        self.assertEqual(profiling.flame_rows(Counter()), [])
+
+    def test_sort_functions(self):
+        functions = [
+            {'function': 'b', 'calls': 1, 'tottime': 5.0, 'cumtime': 5.0},
+            {'function': 'a', 'calls': 9, 'tottime': 1.0, 'cumtime': 8.0},
+        ]
+        self.assertEqual([f['function'] for f in profiling.sort_functions(functions, 'cumtime')], ['a', 'b'])
+        self.assertEqual([f['function'] for f in profiling.sort_functions(functions, 'tottime')], ['b', 'a'])
+        self.assertEqual([f['function'] for f in profiling.sort_functions(functions, 'function')], ['a', 'b'])
+
+
+class CaptureTestCase(SimpleTestCase):
+    """Tests of profiling a block of code."""
+
+    def test_cprofile_records_functions(self):
+        def slow_function():
+            return sum(range(10000))
+
+        with profiling.Capture(profiling.CPROFILE) as capture:
+            slow_function()
+        names = [function['function'] for function in capture.result()['functions']]
+        self.assertTrue(any(name.startswith('slow_function ') for name in names))
+
+    @override_settings(PROFILE_SAMPLE_INTERVAL=0.001)
+    def test_sampler_records_stacks(self):
+        def sleeping_function():
+            time.sleep(0.05)
+
+        with profiling.Capture(profiling.SAMPLE) as capture:
+            sleeping_function()
+        stacks = capture.result()['stacks']
+        self.assertTrue(any('sleeping_function (' in stack for stack in stacks))
+
+    @override_settings(PROFILE_SAMPLE_INTERVAL=0.001)
+    def test_sampler_labels_frames_only_for_the_result(self):
+        with mock.patch('tutorials.profiling.frame_label', wraps=profiling.frame_label) as frame_label:
+            with profiling.Capture(profiling.SAMPLE) as capture:
+                time.sleep(0.05)
+            frame_label.assert_not_called()
+            capture.result()
+        self.assertTrue(frame_label.called)
+
+
+class RequestProfilingTestCase(TestCase):
+    """Tests of profiling requests and viewing the profiles."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = reverse('dashboard')
+
+    def test_admin_profiles_request(self):
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.get(self.url, {'profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        profile_url = response['X-Profile-URL']
+        profile_id = profile_url.rstrip('/').rsplit('/', 1)[-1]
+        profile = profiling.load_profile(profile_id)
+        self.assertEqual(profile['path'], f'{self.url}?profile=cprofile')
+        self.assertEqual(profile['user'], '@adminuser')
+        self.assertFalse(profile['sampled'])
+        self.assertTrue(any(function['function'].startswith('dashboard ') for function in profile['functions']))
+
+        response = self.client.get(profile_url, {'sort': 'tottime'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin/request_profile.html')
+        self.assertEqual(response.context['sort'], 'tottime')
+
+    def test_header_selects_sampling(self):
+        self.client.login(username='@adminuser', password='Password123')
+        response = self.client.get(self.url, headers={'X-Profile': 'sample'})
+        profile_id = response['X-Profile-URL'].rstrip('/').rsplit('/', 1)[-1]
+        self.assertEqual(profiling.load_profile(profile_id)['mode'], profiling.SAMPLE)
+        response = self.client.get(response['X-Profile-URL'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_admins_are_not_profiled(self):
+        self.client.login(username='@studentuser', password='Password123')
+        response = self.client.get(self.url, {'profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-URL', response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_non_admins_cannot_view_profiles(self):
+        self.client.login(username='@studentuser', password='Password123')
+        self.assertEqual(self.client.get(reverse('request_profiles')).status_code, 403)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_random_sampling(self):
+        self.client.login(username='@studentuser', password='Password123')
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Profile-URL', response)
+        [profile] = profiling.list_profiles()
+        self.assertTrue(profile['sampled'])
+        self.assertEqual(profile['mode'], profiling.SAMPLE)
+
+        self.client.login(username='@adminuser', password='Password123')
+        with override_settings(PROFILE_SAMPLE_RATE=0):
+            response = self.client.get(reverse('request_profiles'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sampled_count'], 1)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_STORED=2)
+    def test_only_newest_profiles_are_kept(self):
+        for _ in range(4):
+            self.client.get(reverse('home'))
+        self.assertEqual(len(profiling.list_profiles()), 2)
+
+    def test_unknown_profile(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.assertIsNone(profiling.load_profile('../settings'))
+        self.assertEqual(self.client.get(reverse('request_profile', args=['settings'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('request_profile', args=['20240101000000-00000000'])).status_code, 404)
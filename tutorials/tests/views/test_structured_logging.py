@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from tutorials.models import UserType
+from tutorials.structured_logging import JsonFormatter, QueueFileHandler, request_context
+
+
+class JsonCapture(logging.Handler):
+    """Keep the JSON lines logged on a logger, formatted as they are logged."""
+
+    def __init__(self, logger_name):
+        super().__init__()
+        self.setFormatter(JsonFormatter())
+        self.lines = []
+        self.logger = logging.getLogger(logger_name)
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+    def __enter__(self):
+        self.level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.logger.removeHandler(self)
+        self.logger.setLevel(self.level)
+
+
+class StructuredLoggingTestCase(SimpleTestCase):
+    """Tests of formatting and writing JSON lines."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'app.log'
+
+    def test_lines_carry_the_request_fields_and_extras(self):
+        token = request_context.set({'request_id': 'abc', 'user_id': 7, 'role': 'admin', 'view': 'dashboard'})
+        try:
+            record = logging.makeLogRecord({'name': 'tutorials.test', 'msg': 'hello %s', 'args': ('there',), 'duration_ms': 3})
+            line = json.loads(JsonFormatter().format(record))
+        finally:
+            request_context.reset(token)
+        self.assertEqual(line['message'], 'hello there')
+        self.assertEqual(line['request_id'], 'abc')
+        self.assertEqual(line['role'], 'admin')
+        self.assertEqual(line['duration_ms'], 3)
+        self.assertNotIn('args', line)
+
+    def log_to(self, handler):
+        logger = logging.getLogger('tutorials.test_queue')
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, 'propagate', True)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_queue_handler_writes_the_file(self):
+        handler = QueueFileHandler(self.path)
+        logger = self.log_to(handler)
+        for number in range(20):
+            logger.warning("line %d", number)
+        handler.close()
+        lines = self.path.read_text().splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertEqual(json.loads(lines[-1])['message'], 'line 19')
+
+    def test_file_moved_aside_is_reopened(self):
+        handler = QueueFileHandler(self.path)
+        logger = self.log_to(handler)
+        logger.warning('before')
+        handler.listener.stop()
+        self.path.rename(self.path.with_name('app.log.1'))
+        handler.listener.start()
+        logger.warning('after')
+        handler.close()
+        self.assertEqual(json.loads(self.path.read_text())['message'], 'after')
+        self.assertEqual(json.loads(self.path.with_name('app.log.1').read_text())['message'], 'before')
+
+    def test_listener_starts_in_the_process_that_logs(self):
+        handler = QueueFileHandler(self.path)
+        self.addCleanup(handler.close)
+        logger = self.log_to(handler)
+        self.assertIsNone(handler.listener)
+        logger.warning('parent')
+        parent_listener = handler.listener
+        with mock.patch('tutorials.structured_logging.os.getpid', return_value=os.getpid() + 1):
+            # As in a worker forked after logging was configured
+            logger.warning('child')
+            self.assertIsNot(handler.listener, parent_listener)
+            handler.listener.stop()
+        parent_listener.stop()
+        messages = [json.loads(line)['message'] for line in self.path.read_text().splitlines()]
+        self.assertEqual(sorted(messages), ['child', 'parent'])
+
+    def test_closing_twice(self):
+        handler = QueueFileHandler(self.path)
+        handler.close()
+        handler.close()
+
+
+class AccessLogTestCase(TestCase):
+    """Tests of the access and audit logs."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def test_requests_are_logged_with_user_and_view(self):
+        self.client.login(username='@adminuser', password='Password123')
+        with JsonCapture('tutorials.access') as capture:
+            response = self.client.get(reverse('dashboard'))
+        [line] = capture.lines
+        self.assertEqual(line['request_id'], response['X-Request-ID'])
+        self.assertEqual(line['view'], 'dashboard')
+        self.assertEqual(line['role'], UserType.ADMIN)
+        self.assertEqual(line['status'], 200)
+        self.assertIsInstance(line['user_id'], int)
+        self.assertIn('duration_ms', line)
+
+    def test_request_id_from_proxy(self):
+        response = self.client.get(reverse('home'), headers={'X-Request-ID': 'proxy-123'})
+        self.assertEqual(response['X-Request-ID'], 'proxy-123')
+        response = self.client.get(reverse('home'), headers={'X-Request-ID': 'bad id\n'})
+        self.assertNotEqual(response['X-Request-ID'], 'bad id\n')
+
+    def test_unmatched_paths_are_logged_anonymously(self):
+        with JsonCapture('tutorials.access') as capture:
+            self.client.get('/no-such-page/')
+        [line] = capture.lines
+        self.assertEqual((line['view'], line['user_id'], line['status']), ('<unmatched>', None, 404))
+
+    def test_messages_are_audited(self):
+        with JsonCapture('tutorials.audit') as capture:
+            self.client.post(reverse('log_in'), {'username': '@adminuser', 'password': 'wrong'})
+        [line] = capture.lines
+        self.assertEqual(line['message'], "The credentials provided were invalid!")
+        self.assertEqual(line['message_level'], 'error')
+        self.assertEqual(line['view'], 'log_in')
+
+    def test_rejected_tutor_sign_up_logs_fields_only(self):
+        with JsonCapture('tutorials.views') as capture:
+            self.client.post(reverse('tutor_signup'), {'email': 'not-an-email'})
+        [line] = capture.lines
+        self.assertIn('email', line['invalid_fields'])
+        self.assertNotIn('not-an-email', json.dumps(line))
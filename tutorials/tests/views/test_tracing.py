@@ -0,0 +1,123 @@
+import json
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from tutorials import tracing
+
+
+def exported_spans(logs):
+    """Return the spans of the one trace exported to the captured logs, by name."""
+    [line] = logs.records
+    [resource] = json.loads(line.getMessage())['resourceSpans']
+    [scope] = resource['scopeSpans']
+    return {span['name']: span for span in scope['spans']}
+
+
+def attributes(span):
+    return {attribute['key']: next(iter(attribute['value'].values())) for attribute in span['attributes']}
+
+
+class SpanTestCase(SimpleTestCase):
+    """Tests of recording and encoding spans."""
+
+    def test_spans_nest_within_a_trace(self):
+        trace = tracing.Trace()
+        token = tracing.current_trace.set(trace)
+        try:
+            with tracing.span('outer') as outer:
+                with tracing.span('inner', tracing.SPAN_KIND_CLIENT, rows=3):
+                    pass
+        finally:
+            tracing.current_trace.reset(token)
+        inner, recorded_outer = trace.spans
+        self.assertIs(recorded_outer, outer)
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertIsNone(outer.parent_id)
+        self.assertGreaterEqual(outer.end, inner.end)
+
+    def test_span_ids_are_drawn_once(self):
+        trace = tracing.Trace()
+        token = tracing.current_trace.set(trace)
+        try:
+            with tracing.span('only') as opened:
+                pass
+        finally:
+            tracing.current_trace.reset(token)
+        self.assertEqual(opened.span_id, opened.span_id)
+        self.assertEqual(trace.opened, [])
+
+    def test_spans_outside_a_trace_do_nothing(self):
+        with tracing.span('untraced') as opened:
+            self.assertIsNone(opened)
+
+    def test_errors_mark_the_span(self):
+        trace = tracing.Trace()
+        token = tracing.current_trace.set(trace)
+        try:
+            with self.assertRaises(ValueError):
+                with tracing.span('failing'):
+                    raise ValueError
+        finally:
+            tracing.current_trace.reset(token)
+        encoded = tracing.otlp(trace)['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+        self.assertEqual(encoded['status'], {'code': tracing.STATUS_ERROR})
+        self.assertEqual(len(encoded['traceId']), 32)
+        self.assertEqual(len(encoded['spanId']), 16)
+        self.assertNotIn('parentSpanId', encoded)
+
+    def test_attribute_values(self):
+        self.assertEqual(
+            tracing.encode_attributes({'a': True, 'b': 3, 'c': 0.5, 'd': 'x', 'e': None}),
+            [
+                {'key': 'a', 'value': {'boolValue': True}},
+                {'key': 'b', 'value': {'intValue': '3'}},
+                {'key': 'c', 'value': {'doubleValue': 0.5}},
+                {'key': 'd', 'value': {'stringValue': 'x'}},
+            ],
+        )
+
+
+class TracingMiddlewareTestCase(TestCase):
+    """Tests of tracing requests."""
+
+    fixtures = ['tutorials/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.client.login(username='@adminuser', password='Password123')
+        self.url = reverse('manage_applications')
+
+    @override_settings(TRACE_SAMPLE_RATE=1)
+    def test_trace_covers_middleware_view_queries_and_templates(self):
+        with self.assertLogs('tutorials.traces', 'INFO') as logs:
+            response = self.client.get(self.url)
+        spans = exported_spans(logs)
+
+        root = spans['GET manage_applications/']
+        self.assertEqual(root['kind'], tracing.SPAN_KIND_SERVER)
+        self.assertEqual(attributes(root)['http.response.status_code'], '200')
+        self.assertEqual(attributes(root)['request.id'], response['X-Request-ID'])
+        self.assertIn('middleware SessionMiddleware', spans)
+
+        view = spans['ManageApplications.get']
+        page = spans['render admin/manage_applications.html']
+        sidebar = spans['render partials/sidebar.html']
+        self.assertEqual(page['parentSpanId'], view['spanId'])
+        self.assertEqual(sidebar['parentSpanId'], page['spanId'])
+        self.assertEqual(spans['db SELECT']['parentSpanId'], view['spanId'])
+        self.assertEqual(spans['db SELECT']['kind'], tracing.SPAN_KIND_CLIENT)
+        self.assertNotIn('@adminuser', logs.records[0].getMessage())
+
+    @override_settings(TRACE_SAMPLE_RATE=1)
+    def test_tracing_runs_no_queries(self):
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    @override_settings(TRACE_SAMPLE_RATE=0, TRACE_SLOW_MS=0)
+    def test_slow_requests_are_kept(self):
+        with self.assertLogs('tutorials.traces', 'INFO') as logs:
+            self.client.get(self.url)
+        self.assertIn('ManageApplications.get', exported_spans(logs))
+
+    @override_settings(TRACE_SAMPLE_RATE=0, TRACE_SLOW_MS=60000)
+    def test_fast_requests_are_dropped(self):
+        with self.assertNoLogs('tutorials.traces', 'INFO'):
+            self.client.get(self.url)
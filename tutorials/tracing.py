@@ -0,0 +1,180 @@
+"""Traces of single requests, with spans for the middleware, view, SQL queries and templates.
+
+A trace is recorded while ``current_trace`` is set, by TracingMiddleware;
+outside one, ``span()`` does nothing, so the hooks cost next to nothing on
+requests that are not traced. Kept traces are exported in the OpenTelemetry
+protocol's JSON encoding (OTLP/JSON), one ExportTraceServiceRequest per line,
+as read by the OpenTelemetry Collector's ``otlpjsonfile`` receiver.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from django.template.engine import Engine
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+
+SERVICE_NAME = 'code_tutors'
+
+current_trace = ContextVar('current_trace', default=None)
+
+trace_logger = logging.getLogger('tutorials.traces')
+
+
+class Span:
+    """One timed operation of a trace; times are in nanoseconds since the epoch.
+
+    A span is the context manager timing its own with block. Spans are
+    recorded around every query and template of each recorded request, most
+    of which are never exported, so a span's id is only drawn when asked for.
+    """
+
+    __slots__ = ('name', 'kind', 'parent', 'start', 'end', 'attributes', 'error', 'trace', '_span_id')
+
+    def __init__(self, trace, name, kind, attributes):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.end = None
+        self.error = False
+        self._span_id = None
+
+    @property
+    def span_id(self):
+        if self._span_id is None:
+            self._span_id = os.urandom(8).hex()
+        return self._span_id
+
+    @property
+    def parent_id(self):
+        return self.parent.span_id if self.parent is not None else None
+
+    @property
+    def duration_ms(self):
+        return (self.end - self.start) / 1e6
+
+    def __enter__(self):
+        opened = self.trace.opened
+        self.parent = opened[-1] if opened else None
+        opened.append(self)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.time_ns()
+        if exc_type is not None:
+            self.error = True
+        self.trace.opened.pop()
+        self.trace.spans.append(self)
+
+
+class Trace:
+    """The spans of one request, in the order they ended, and those still open, innermost last."""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.opened = []
+
+
+# What span() returns outside a trace; it yields None and, having no state, is shared
+NOT_RECORDING = nullcontext()
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """Time the with block as a span of the current trace, a child of the current span.
+
+    Yields the span, or None when no trace is being recorded.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return NOT_RECORDING
+    return Span(trace, name, kind, attributes)
+
+
+def traced(name, function, kind=SPAN_KIND_INTERNAL):
+    """Return ``function`` wrapped to run in a span of this name."""
+    def call(*args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return function(*args, **kwargs)
+        with Span(trace, name, kind, {}):
+            return function(*args, **kwargs)
+    return call
+
+
+def attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP/JSON
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def encode_attributes(attributes):
+    return [{'key': key, 'value': attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp(trace):
+    """Return the trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for each in trace.spans:
+        encoded = {
+            'traceId': trace.trace_id,
+            'spanId': each.span_id,
+            'name': each.name,
+            'kind': each.kind,
+            'startTimeUnixNano': str(each.start),
+            'endTimeUnixNano': str(each.end),
+            'attributes': encode_attributes(each.attributes),
+            'status': {'code': STATUS_ERROR} if each.error else {},
+        }
+        if each.parent_id is not None:
+            encoded['parentSpanId'] = each.parent_id
+        spans.append(encoded)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': encode_attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }],
+    }
+
+
+def export(trace):
+    """Write the trace to the ``tutorials.traces`` logger, whose handler puts it in TRACE_FILE."""
+    trace_logger.info(json.dumps(otlp(trace), separators=(',', ':')))
+
+
+class TracedTemplate:
+    """A compiled template whose renders are spans, as are those of the templates it includes."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context):
+        with span(f'render {self.template.name}', **{'template.name': self.template.name}):
+            return self.template.render(context)
+
+
+class TracedEngine(Engine):
+    """The Django template engine, rendering every template it loads in a span.
+
+    ``{% include %}`` loads templates through the engine too, so included
+    templates such as the sidebar get spans of their own.
+    """
+
+    def get_template(self, template_name):
+        return TracedTemplate(super().get_template(template_name))
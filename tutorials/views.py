@@ -1,3 +1,4 @@
+import logging
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout
@@ -11,15 +12,21 @@ from django.views.generic.edit import FormView, UpdateView
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.utils import timezone
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from tutorials.forms import LogInForm, PasswordForm, UserForm, SignUpForm, TutorSignUpForm, StudentRequestForm, TicketForm
 from tutorials.helpers import login_prohibited
-from tutorials.models import User, UserType, Skill, SkillLevel, StudentRequest, PendingTutor, TutorSkill, Enrollment, Ticket, TicketStatus, Invoice
+from tutorials.pagination import KeysetPaginator
+from tutorials.assignment import plan_assignments
+from tutorials import caching, metrics, profiling
+from tutorials.models import User, UserType, Skill, SkillLevel, StudentRequest, PendingTutor, TutorSkill, Enrollment, Ticket, TicketStatus, Invoice, StatusCount, TutorCandidate
 from django.db.models import Q
 from django.db.models import Case, When, Value, IntegerField
 from django.db.models import Prefetch
+from django.db.models import Exists, OuterRef
 from datetime import timedelta
-from django.http import HttpResponseNotFound
+from django.http import Http404, HttpResponse, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
 
 @login_required
 def dashboard(request):
@@ -117,7 +124,7 @@ class PasswordView(LoginRequiredMixin, FormView):
         """Handle valid form by saving the new password."""
 
         form.save()
-        login(self.request, self.request.user)
+        login(self.request, self.request.user, backend=settings.AUTHENTICATION_BACKENDS[0])
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -153,7 +160,7 @@ class SignUpView(LoginProhibitedMixin, FormView):
 
     def form_valid(self, form):
         self.object = form.save()
-        login(self.request, self.object)
+        login(self.request, self.object, backend=settings.AUTHENTICATION_BACKENDS[0])
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -177,20 +184,13 @@ def is_tutor(user):
     raise PermissionDenied
 
 class PaginatorMixin:
-    """A Mixin for adding pagination."""
+    """A Mixin for adding keyset (cursor) pagination."""
     paginate_by = 10
 
     def paginator_queryset(self, request, queryset):
-        """Paginate the queryset."""
-        page = request.GET.get('page', 1)
-        paginator = Paginator(queryset, self.paginate_by)
-        try:
-            items = paginator.page(page)
-        except PageNotAnInteger:
-            items = paginator.page(1)
-        except EmptyPage:
-            items = paginator.page(paginator.num_pages)
-        return items
+        """Paginate the queryset by cursor, falling back to a page number."""
+        paginator = KeysetPaginator(queryset, self.paginate_by)
+        return paginator.get_page(cursor=request.GET.get('cursor'), number=request.GET.get('page'))
 
 
     def get_paginated_context(self, items, object_name):
@@ -205,6 +205,9 @@ class PaginatorMixin:
 Admin View Functions
 """
 
+# Seconds admin aggregates are cached for; bulk writes, which send no signals, show up within it
+AGGREGATE_TIMEOUT = 60
+
 @method_decorator(login_required, name='dispatch')
 @method_decorator(user_passes_test(is_admin), name='dispatch')
 class ManageTutors(PaginatorMixin, View):
@@ -213,45 +216,45 @@ class ManageTutors(PaginatorMixin, View):
 
     def get_queryset(self):
         """Filter for pending tutors and order by ID."""
-        return PendingTutor.objects.filter(is_approved=False).order_by('id')
+        return PendingTutor.objects.filter(is_approved=False).select_related('user').prefetch_related('skills').order_by('id')
 
 
-    def get_current_tutors(self):
-        """Retrieve approved tutors."""
-        # return User.objects.filter(user_type=UserType.TUTOR, is_active=True)
+    def get_current_tutors_queryset(self):
         """Retrieve all active tutors along with their skills."""
         return User.objects.filter(
-            user_type=UserType.TUTOR, 
+            user_type=UserType.TUTOR,
             is_active=True
         ).prefetch_related(
             Prefetch(
                 'skills',  # This matches the related_name on the TutorSkill model
-                queryset=TutorSkill.objects.select_related('skill')
+                queryset=TutorSkill.objects.select_related('skill').order_by('pk')
             )
         )
+
+    def get_current_tutors(self):
+        """Retrieve the active tutors, from the cache unless a tutor or skill has changed."""
+        return caching.cached(
+            'current_tutors',
+            (caching.USER, caching.TUTOR_SKILL, caching.SKILL),
+            lambda: list(self.get_current_tutors_queryset()),
+            timeout=AGGREGATE_TIMEOUT,
+        )
     def get(self, request, *args, **kwargs):
         """Display the list of tutors with pagination."""
         # Pending tutors
         pending_tutors = self.get_queryset()
-        pending_paginator = Paginator(pending_tutors, self.paginate_by)
-        page = request.GET.get('page', 1)
-
-        try:
-            tutors = pending_paginator.page(page)
-        except PageNotAnInteger:
-            tutors = pending_paginator.page(1)
-        except EmptyPage:
-            tutors = pending_paginator.page(pending_paginator.num_pages)
-
-        pending_count = pending_tutors.count()
+        tutors = self.paginator_queryset(request, pending_tutors)
 
         # Approved tutors
         current_tutors = self.get_current_tutors()
-        current_tutors_count = current_tutors.count()
+
+        counts = StatusCount.get_counts(PendingTutor, User)
+        pending_count = counts[PendingTutor]['pending']
+        current_tutors_count = counts[User][UserType.TUTOR]
 
         context = {
             'tutors': tutors,
-            'is_paginated': pending_paginator.num_pages > 1,
+            'is_paginated': tutors.has_other_pages(),
             'tutor_count': pending_count,
             'current_tutors': current_tutors,  # Pass current tutors to the template
             'current_tutors_count': current_tutors_count  # Count of approved tutors
@@ -317,12 +320,13 @@ class ManageStudents(PaginatorMixin, View):
         students_by_type = self.get_queryset()
         paginated_students = self.paginator_queryset(request, students_by_type)
         context = self.get_paginated_context(paginated_students, 'students')
-        context['student_count'] = students_by_type.count()
+        user_counts = StatusCount.get_counts(User)[User]
+        context['student_count'] = user_counts[UserType.STUDENT] + user_counts[f'{UserType.STUDENT}:inactive']
         return render(request, self.template_name, context)
 
 @method_decorator(login_required, name='dispatch')
 @method_decorator(user_passes_test(is_admin), name='dispatch')
-class ManageApplications(View):
+class ManageApplications(PaginatorMixin, View):
     """Display and manage pending student requests for admin approval."""
     template_name = 'admin/manage_applications.html'
     paginate_by = 15
@@ -357,49 +361,46 @@ class ManageApplications(View):
                 else:
                     requests = requests.order_by('-created_at')
             elif sort_by == 'status':
+                # Rank statuses in the selected order; annotated so it can be paginated by key
                 if order == 'asc_pending':
-                    requests = requests.order_by(
-                        Case(
-                            When(status='pending', then=Value(1)),
-                            When(status='approved', then=Value(2)),
-                            When(status='rejected', then=Value(3)),
-                            default=Value(4),
-                            output_field=IntegerField()
-                        )
-                    )
+                    ranking = ['pending', 'approved', 'rejected']
                 elif order == 'asc_approved':
-                    requests = requests.order_by(
-                        Case(
-                            When(status='approved', then=Value(1)),
-                            When(status='pending', then=Value(2)),
-                            When(status='rejected', then=Value(3)),
-                            default=Value(4),
-                            output_field=IntegerField()
-                        )
-                    )
+                    ranking = ['approved', 'pending', 'rejected']
                 elif order == 'asc_rejected':
-                    requests = requests.order_by(
-                        Case(
-                            When(status='rejected', then=Value(1)),
-                            When(status='pending', then=Value(2)),
-                            When(status='approved', then=Value(3)),
-                            default=Value(4),
-                            output_field=IntegerField()
-                        )
-                    )
+                    ranking = ['rejected', 'pending', 'approved']
                 else:
-                    requests = requests.order_by(
-                        Case(
-                            When(status='rejected', then=Value(1)),
-                            When(status='approved', then=Value(2)),
-                            When(status='pending', then=Value(3)),
-                            default=Value(4),
-                            output_field=IntegerField()
-                        )
+                    ranking = ['rejected', 'approved', 'pending']
+                requests = requests.annotate(
+                    status_rank=Case(
+                        *[When(status=status, then=Value(rank)) for rank, status in enumerate(ranking, start=1)],
+                        default=Value(4),
+                        output_field=IntegerField()
                     )
+                ).order_by('status_rank')
 
             return requests
 
+    def get_counts(self, requests, search_query):
+        """Count the lesson requests in the system and those matching the search."""
+        # Totals come from the status counters rather than counting the table
+        status_counts = StatusCount.get_counts(StudentRequest)[StudentRequest]
+        total_lesson_requests = sum(status_counts.values())
+
+        # A search narrows the list, so only then are the matching rows counted
+        if search_query:
+            request_count = requests.count()
+            pending_count = requests.filter(status='pending').count()
+        else:
+            request_count = total_lesson_requests
+            pending_count = status_counts['pending']
+
+        return {
+            'request_count': request_count,  # Total count of student requests
+            'pending_count': pending_count,  # Total count of pending lessons
+            'total_lesson_requests': total_lesson_requests,  # Total count of lesson requests in the system
+            'total_approved_lessons': status_counts['approved'],  # Total count of approved lessons
+        }
+
     def get(self, request, *args, **kwargs):
         """Display the list of student requests with pagination."""
         search_query = request.GET.get('search', '')
@@ -407,33 +408,19 @@ class ManageApplications(View):
         order = request.GET.get('order', 'asc')
 
         requests = self.get_queryset(search_query, sort_by, order)
-
-        # Calculate the total number of pending lessons
-        pending_count = requests.filter(status='pending').count()
-
-        paginator = Paginator(requests, self.paginate_by)
-        page = request.GET.get('page', 1)
-
-        try:
-            student_requests = paginator.page(page)
-        except PageNotAnInteger:
-            student_requests = paginator.page(1)
-        except EmptyPage:
-            student_requests = paginator.page(paginator.num_pages)
-
-        # Calculate the total number of lesson requests in the system
-        total_lesson_requests = StudentRequest.objects.count()
-
-        # Calculate the total number of approved lessons
-        total_approved_lessons = StudentRequest.objects.filter(status='approved').count()
+        student_requests = self.paginator_queryset(request, requests)
+        counts = caching.cached(
+            'application_counts',
+            (caching.STUDENT_REQUEST, caching.USER),
+            lambda: self.get_counts(requests, search_query),
+            vary_on=[search_query],
+            timeout=AGGREGATE_TIMEOUT,
+        )
 
         context = {
             'student_requests': student_requests,
-            'is_paginated': paginator.num_pages > 1,
-            'request_count': requests.count(),  # Total count of student requests
-            'pending_count': pending_count,  # Total count of pending lessons
-            'total_lesson_requests': total_lesson_requests,  # Total count of lesson requests in the system
-            'total_approved_lessons': total_approved_lessons,  # Total count of approved lessons
+            'is_paginated': student_requests.has_other_pages(),
+            **counts,
             'order': order,
             'search': search_query,
             'sort_by': sort_by,
@@ -442,7 +429,7 @@ class ManageApplications(View):
 
 @method_decorator(login_required, name='dispatch')
 @method_decorator(user_passes_test(is_admin), name='dispatch')
-class ManageLessons(View):
+class ManageLessons(PaginatorMixin, View):
     """
     Admin view for managing lessons.
     """
@@ -481,23 +468,16 @@ class ManageLessons(View):
         lessons = self.get_queryset(search_query, status_filter)
 
         # Set up pagination
-        paginator = Paginator(lessons, self.paginate_by) # There might be an error here! Look at this mr GPT
-        page = request.GET.get('page', 1)
-
-        try:
-            student_lessons = paginator.page(page)
-        except PageNotAnInteger:
-            student_lessons = paginator.page(1)
-        except EmptyPage:
-            student_lessons = paginator.page(paginator.num_pages)
+        student_lessons = self.paginator_queryset(request, lessons)
 
         # Add any counts or additional context if needed
-        ongoing_count = Enrollment.objects.filter(status='ongoing').count()
-        cancelled_count = Enrollment.objects.filter(status='cancelled').count()
+        status_counts = StatusCount.get_counts(Enrollment)[Enrollment]
+        ongoing_count = status_counts['ongoing']
+        cancelled_count = status_counts['cancelled']
 
         context = {
             'lessons': student_lessons,
-            'is_paginated': paginator.num_pages > 1,
+            'is_paginated': student_lessons.has_other_pages(),
             'search_query': search_query,
             'status_filter': status_filter,
             'ongoing_count': ongoing_count,
@@ -524,24 +504,14 @@ class ManageLessons(View):
 
         return redirect('manage_lessons')
 
+# Number of ranked tutor candidates shown on the lesson request page
+CANDIDATE_LIMIT = 20
+
 @login_required
 @user_passes_test(is_admin)
 def LessonRequestDetails(request, id):
     """Display the details of a specific lesson request and handle tutor assignment."""
-    lesson_request = get_object_or_404(StudentRequest, id=id)
-
-    # Fetch tutors with requested skill
-    skill_needed = lesson_request.skill
-    tutors = User.objects.filter(user_type=UserType.TUTOR, skills__skill=skill_needed).distinct()
-
-    # Pre-fetch related TutorSkills to reduce query count
-    tutors_with_skills = []
-    for tutor in tutors:
-        tutor_skills = TutorSkill.objects.filter(tutor=tutor)
-        tutors_with_skills.append({
-            'tutor': tutor,
-            'skills': tutor_skills
-        })
+    lesson_request = get_object_or_404(StudentRequest.objects.select_related('student', 'skill'), id=id)
 
     # Handle tutor assignment
     if 'assign_tutor' in request.GET:
@@ -568,7 +538,6 @@ def LessonRequestDetails(request, id):
         else:
             Invoice.objects.create(
                 enrollment=enrollment,
-                amount=0.00,
                 issued_date=timezone.now(),
                 payment_status='unpaid',
                 due_date=enrollment.start_time,
@@ -577,12 +546,17 @@ def LessonRequestDetails(request, id):
         return redirect('lesson_request_details', id=lesson_request.id)
 
     # Get the latest Enrollment associated with this StudentRequest, if any
-    latest_enrollment = lesson_request.enrollments.order_by('-created_at').first()
+    latest_enrollment = lesson_request.enrollments.select_related('tutor').order_by('-created_at').first()
+
+    # Best tutors for the requested skill, ranked from the candidate index
+    candidates = TutorCandidate.objects.for_request(lesson_request).prefetch_related(
+        Prefetch('tutor__skills', queryset=TutorSkill.objects.select_related('skill'))
+    )[:CANDIDATE_LIMIT]
 
     # Ensure the function always renders a response
     context = {
         'lesson_request': lesson_request,
-        'tutors_with_skills': tutors_with_skills,
+        'candidates': candidates,
         'latest_enrollment': latest_enrollment,
     }
     return render(request, 'admin/lesson_request_details.html', context)
@@ -623,6 +597,20 @@ def update_request_status(request, request_id, action):
     # Redirect to a relevant page
     return redirect('manage_applications')
 
+@login_required
+@user_passes_test(is_admin)
+def auto_assign_requests(request):
+    """Assign every waiting lesson request to a tutor in one run."""
+    if request.method != 'POST':
+        return redirect('manage_applications')
+    plan = plan_assignments()
+    plan.apply()
+    if plan.unassigned:
+        messages.warning(request, f"{len(plan)} request(s) assigned. {len(plan.unassigned)} request(s) have no tutor with capacity left.")
+    else:
+        messages.success(request, f"{len(plan)} request(s) assigned.")
+    return redirect('manage_applications')
+
 @method_decorator(login_required, name='dispatch')
 @method_decorator(user_passes_test(is_admin), name='dispatch')
 class ManageTickets(View):
@@ -631,8 +619,8 @@ class ManageTickets(View):
     template_name = 'admin/manage_tickets.html'
 
     def get_queryset(self):
-        """Retrieve all tickets."""
-        return Ticket.objects.all().order_by('-created_at')
+        """Retrieve all tickets with the users and tutors they show."""
+        return Ticket.objects.select_related('user', 'enrollment__tutor').order_by('-created_at')
 
     def get(self, request, *args, **kwargs):
         """Display the list of tickets with pagination."""
@@ -640,7 +628,7 @@ class ManageTickets(View):
 
         # Categorise tickets
         new_tickets = tickets.filter(status=TicketStatus.PENDING)
-        resolved_tickets = tickets.filter(status__in=[TicketStatus.APPROVED, TicketStatus.REJECTED])
+        resolved_tickets = tickets.exclude(status=TicketStatus.PENDING)
 
         context = {
             'new_tickets': new_tickets,
@@ -672,6 +660,61 @@ class ManageTickets(View):
 
         return redirect('manage_tickets')
 
+def metrics_view(request):
+    """Serve the metrics of every worker process in the Prometheus text format.
+
+    Scrapers authenticate with the METRICS_TOKEN bearer token; admins may
+    also look while logged in.
+    """
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    scraper = bool(token) and scheme.lower() == 'bearer' and constant_time_compare(credentials, token)
+    if not scraper and not (request.user.is_authenticated and request.user.user_type == UserType.ADMIN):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.exposition(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+@method_decorator(login_required, name='dispatch')
+@method_decorator(user_passes_test(is_admin), name='dispatch')
+class RequestProfiles(View):
+    """List the stored request profiles, with a flamegraph of the randomly sampled ones."""
+
+    template_name = 'admin/request_profiles.html'
+
+    def get(self, request):
+        profiles = profiling.list_profiles()
+        sampled = [profile for profile in profiles if profile['sampled']]
+        context = {
+            'profiles': profiles,
+            'sampled_count': len(sampled),
+            'flame': profiling.flame_rows(profiling.merge_stacks(sampled)),
+        }
+        return render(request, self.template_name, context)
+
+@method_decorator(login_required, name='dispatch')
+@method_decorator(user_passes_test(is_admin), name='dispatch')
+class RequestProfile(View):
+    """Display one request profile, as a sortable table of functions or a flamegraph of samples."""
+
+    template_name = 'admin/request_profile.html'
+
+    def get(self, request, profile_id):
+        profile = profiling.load_profile(profile_id)
+        if profile is None:
+            raise Http404("No such profile.")
+        sort = request.GET.get('sort')
+        if sort not in profiling.SORT_KEYS:
+            sort = 'cumtime'
+        context = {
+            'profile': profile,
+            'sort': sort,
+            'functions': profiling.sort_functions(profile.get('functions', []), sort),
+            'flame': profiling.flame_rows(profile.get('stacks', {})),
+        }
+        return render(request, self.template_name, context)
+
 @method_decorator(login_required, name='dispatch')
 @method_decorator(user_passes_test(is_student), name='dispatch')
 class InvoiceView(View):
@@ -681,7 +724,10 @@ class InvoiceView(View):
 
     def get(self, request, enrollment_id):
         """Display the invoice details for a student."""
-        enrollment = get_object_or_404(Enrollment, id=enrollment_id)
+        enrollment = get_object_or_404(
+            Enrollment.objects.select_related('approved_request__student', 'approved_request__skill', 'tutor', 'invoice'),
+            id=enrollment_id,
+        )
         if enrollment.approved_request.student != request.user:
             raise PermissionDenied("You do not have permission to view this invoice.")
         try:
@@ -696,8 +742,8 @@ class InvoiceView(View):
             'start_time': enrollment.start_time,
             'term': enrollment.current_term,
             'frequency': enrollment.approved_request.frequency,
-            'amount': invoice.subtotal,
-            'tutor_skill': enrollment.tutor.skills.get(skill=enrollment.approved_request.skill).skill
+            'amount': invoice.amount,
+            'tutor_skill': enrollment.approved_request.skill
         }
         return render(request, self.template_name, context)
 
@@ -729,8 +775,12 @@ class SkillListView(PaginatorMixin, View):
 
     def get(self, request):
         """Display the list of skills with pagination and filtering."""
-        skills = self.get_queryset(request)
-        paginated_skills = self.paginator_queryset(request, skills)
+        paginated_skills = caching.cached(
+            'skill_catalog',
+            (caching.SKILL,),
+            lambda: self.paginator_queryset(request, self.get_queryset(request)),
+            vary_on=[request.GET.get(name, '') for name in ('q', 'level', 'cursor', 'page')],
+        )
         context = self.get_paginated_context(paginated_skills, 'skills')
         context['query'] = request.GET.get('q', '')
         context['current_level'] =  request.GET.get('level', '')
@@ -780,7 +830,7 @@ class YourRequestsView(View):
 
 
     def get(self, request):
-        student_requests = StudentRequest.objects.filter(student=request.user)
+        student_requests = StudentRequest.objects.filter(student=request.user).select_related('skill')
         context = {
             'student_requests': student_requests
         }
@@ -807,9 +857,11 @@ class YourEnrollmentsView(View):
 
     def get(self, request):
         approved_requests = StudentRequest.objects.filter(student=request.user, status='approved')
-        enrollments = Enrollment.objects.filter(approved_request__in=approved_requests)
-        for enrollment in enrollments:
-            enrollment.has_invoice = Invoice.objects.filter(enrollment=enrollment).exists()
+        enrollments = Enrollment.objects.filter(approved_request__in=approved_requests).select_related(
+            'tutor', 'approved_request__skill',
+        ).annotate(
+            has_invoice=Exists(Invoice.objects.filter(enrollment=OuterRef('pk'))),
+        )
         context = {
             'enrollments': enrollments
         }
@@ -826,7 +878,8 @@ class TutorSignUpView(LoginProhibitedMixin, FormView):
         return super().form_valid(form)
 
     def form_invalid(self, form):
-        print(form.errors)
+        # Only the field names, as the errors can repeat what was entered
+        logger.info("Tutor sign up rejected", extra={'invalid_fields': sorted(form.errors)})
         return super().form_invalid(form)
 
     def get_success_url(self):
@@ -846,14 +899,19 @@ class TutorEnrollmentList(View):
 
     def get(self, request):
         
-        enrollments = Enrollment.objects.filter(tutor=request.user)
+        enrollments = Enrollment.objects.filter(tutor=request.user).select_related(
+            'approved_request__student', 'approved_request__skill',
+        )
         context = {
             'enrollments': enrollments
         }
         return render(request, self.template_name, context)
 
 def submit_ticket(request, enrollment_id):
-    enrollment = get_object_or_404(Enrollment, id=enrollment_id)
+    enrollment = get_object_or_404(
+        Enrollment.objects.select_related('approved_request__student', 'approved_request__skill', 'tutor'),
+        id=enrollment_id,
+    )
 
     # Check user is respective tutor or student 
     if request.user not in [enrollment.approved_request.student, enrollment.tutor]:
@@ -883,7 +941,7 @@ def submit_ticket(request, enrollment_id):
 
 def my_tickets(request):
     """Display tickets submitted by the logged-in user."""
-    tickets = Ticket.objects.filter(user=request.user)
+    tickets = Ticket.objects.filter(user=request.user).cached()
         # If no tickets are found, render with a message saying 'No tickets found'
     if not tickets:
         return render(request, 'my_tickets.html', {'tickets': tickets, 'message': 'No tickets found'})